@@ -0,0 +1,304 @@
+import os
+import re
+import csv
+import json
+import sqlite3
+import tempfile
+
+import state_container
+
+# Number of pairs applied with one call of add_states.
+kChunkSize = 10000
+# Number of characters read at once from JSON files.
+kReadSize = 1 << 16
+# Pattern for the beginning of the array of states in exported JSON files.
+kPatternStates = re.compile(r'"states"\s*:\s*\[')
+# Pattern for the separators between the states in exported JSON files.
+kPatternSeparator = re.compile(r'[\s,]*')
+# Columns of the conflict report.
+kReportFields = ('name', 'state', 'existing_state', 'reason')
+
+
+def read_csv(path: str):
+    '''
+    Read the name-state pairs from one CSV file, like the one generated with export.
+    The first two columns are name and state, an optional header "name,state" is skipped.
+
+    Attributes:
+        path: path of the CSV file.
+    Returns:
+        A generator of (name, state).
+    '''
+    with open(path, 'r', newline='') as fs:
+        for index, row in enumerate(csv.reader(fs)):
+            row = tuple(cell.strip() for cell in row)
+            if not any(row):
+                continue
+            if index == 0 and row[:2] == ('name', 'state'):
+                continue
+            assert len(row) >= 2, f'line {index + 1} in {path} has no state'
+            yield row[0], row[1]
+
+
+def read_json(path: str):
+    '''
+    Read the name-state pairs from one JSON file generated with export.
+    The file is parsed incrementally, only the array "states" is read.
+
+    Attributes:
+        path: path of the JSON file.
+    Returns:
+        A generator of (name, state).
+    '''
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as fs:
+        buffer = ''
+        match = None
+        while match is None:
+            text = fs.read(kReadSize)
+            assert bool(text), f'no states found in {path}'
+            buffer += text
+            match = kPatternStates.search(buffer)
+            if match is None:
+                buffer = buffer[-64:]
+        pos = match.end()
+        while True:
+            pos = kPatternSeparator.match(buffer, pos).end()
+            if buffer.startswith(']', pos):
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                text = fs.read(kReadSize)
+                if not bool(text):
+                    raise
+                buffer = buffer[pos:] + text
+                pos = 0
+                continue
+            yield item['name'], item['state']
+
+
+def read_ndjson(path: str):
+    '''
+    Read the name-state pairs from one file with one JSON object per line.
+    Each line is either {"name": name, "state": state} or [name, state].
+
+    Attributes:
+        path: path of the NDJSON file.
+    Returns:
+        A generator of (name, state).
+    '''
+    with open(path, 'r') as fs:
+        for line in fs:
+            if not bool(line.strip()):
+                continue
+            item = json.loads(line)
+            if type(item) == dict:
+                yield item['name'], item['state']
+            else:
+                yield item[0], item[1]
+
+
+def read_pairs(path: str):
+    '''
+    Read the name-state pairs from one file, the format is decided with the extension.
+
+    Attributes:
+        path: path of the *.csv, *.json, *.ndjson or *.jsonl file.
+    Returns:
+        A generator of (name, state).
+    '''
+    readers = {
+        '.csv': read_csv,
+        '.json': read_json,
+        '.ndjson': read_ndjson,
+        '.jsonl': read_ndjson,
+    }
+    extension = os.path.splitext(path)[1].lower()
+    assert extension in readers, f'unknown format {extension} for import'
+    return readers[extension](path)
+
+
+def get_chunks(pairs, chunk_size: int = kChunkSize):
+    '''
+    Group name-state pairs to dicts, names repeated in one chunk are handed out separately.
+
+    Attributes:
+        pairs: an iterable of (name, state).
+        chunk_size: maximal number of names in one chunk.
+    Returns:
+        A generator of (content, repeated): content is a dict with name as key and state as value,
+            repeated is a list of (name, state) which were already in content.
+    '''
+    content = dict()
+    repeated = []
+    for name, state in pairs:
+        assert type(name) == str and type(
+            state) == str, f'wrong pair ({name}, {state}) in import'
+        if name in content:
+            repeated.append((name, state))
+            continue
+        content[name] = state
+        if len(content) >= chunk_size:
+            yield content, repeated
+            content = dict()
+            repeated = []
+    if bool(content) or bool(repeated):
+        yield content, repeated
+
+
+class _Report(object):
+    '''
+    The CSV file for conflicts, it is only created when the first conflict comes.
+    '''
+    def __init__(self, path: str):
+        '''
+        Constructor, the file is not created yet.
+
+        Attributes:
+            path: path of the CSV report.
+        '''
+        self._path = path
+        self._fs = None
+        self._writer = None
+        self.count = 0
+
+    def write(self, name: str, state: str, existing_state: str,
+              reason: str):
+        '''
+        Write one conflict to the report.
+
+        Attributes:
+            name: the name in input.
+            state: the state in input.
+            existing_state: the state which the name already has.
+            reason: "exists" for the database, "repeated" for the input.
+        '''
+        if self._fs is None:
+            self._fs = open(self._path, 'w', newline='')
+            self._writer = csv.DictWriter(self._fs, fieldnames=kReportFields)
+            self._writer.writeheader()
+        self._writer.writerow({
+            'name': name,
+            'state': state,
+            'existing_state': existing_state,
+            'reason': reason,
+        })
+        self.count += 1
+
+    def close(self):
+        '''
+        Close the report file if it is created.
+        '''
+        if self._fs is not None:
+            self._fs.close()
+
+
+def _stage(pairs, container, report: _Report, scratch: sqlite3.Connection,
+           chunk_size: int):
+    '''
+    Check all pairs against the container and copy them to a scratch database.
+    Conflicts with the container and repeated names with other states are reported.
+
+    Attributes:
+        pairs: an iterable of (name, state).
+        container: the StateContainer to import into.
+        report: the report for conflicts.
+        scratch: the connection to an empty scratch database, table "staged" (name, state) is created.
+        chunk_size: maximal number of names checked at once.
+    '''
+    scratch.execute('PRAGMA journal_mode=OFF;')
+    scratch.execute(
+        'CREATE TABLE staged (name text PRIMARY KEY, state text);')
+    for content, repeated in get_chunks(pairs, chunk_size):
+        names = tuple(content.keys())
+        known = dict()
+        for begin in range(0, len(names), state_container.kBatchSize):
+            batch = names[begin:begin + state_container.kBatchSize]
+            known.update(
+                scratch.execute(
+                    'SELECT name, state FROM staged WHERE name IN '
+                    f'({",".join("?" * len(batch))});', batch))
+        for name, existing in zip(names, container.consult(names)):
+            if existing is not None and existing != content[name]:
+                report.write(name, content[name], existing, 'exists')
+            elif name in known and known[name] != content[name]:
+                report.write(name, content[name], known[name], 'repeated')
+        for name, state in repeated:
+            if content[name] != state:
+                report.write(name, state, content[name], 'repeated')
+        scratch.executemany('INSERT OR IGNORE INTO staged VALUES (?, ?);',
+                            content.items())
+    scratch.commit()
+
+
+def import_file(container,
+                path: str,
+                report: str = None,
+                atomic: bool = False,
+                chunk_size: int = kChunkSize) -> dict:
+    '''
+    Import the name-state pairs from one file into the container, chunk by chunk.
+    Conflicting pairs are written to the report instead of breaking the import.
+
+    Attributes:
+        container: the StateContainer to import into.
+        path: path of the *.csv, *.json, *.ndjson or *.jsonl file.
+        report: path of the CSV report for conflicts, by default it is beside the input file.
+        atomic: when it is true, nothing is imported if any conflict is found.
+        chunk_size: maximal number of names added with one operation.
+    Returns:
+        A dict with the count of imported names, the count of conflicts and the path of report.
+    '''
+    report = report if report is not None else path + '.conflicts.csv'
+    if os.path.isfile(report):
+        os.remove(report)
+    conflicts = _Report(report)
+    imported = 0
+    try:
+        if atomic:
+            handle, path_scratch = tempfile.mkstemp(suffix='.db')
+            os.close(handle)
+            scratch = sqlite3.connect(path_scratch)
+            try:
+                _stage(read_pairs(path), container, conflicts, scratch,
+                       chunk_size)
+                if conflicts.count == 0:
+                    cursor = scratch.execute(
+                        'SELECT name, state FROM staged ORDER BY rowid;')
+                    with container.transaction(undo_group='import'):
+                        for content, _ in get_chunks(cursor, chunk_size):
+                            container.add_states(content)
+                            imported += len(content)
+            finally:
+                scratch.close()
+                os.remove(path_scratch)
+        else:
+            # the names added from earlier chunks, they are repeated in the file and not existing before
+            added = set()
+            for content, repeated in get_chunks(read_pairs(path),
+                                                chunk_size):
+                names = tuple(content.keys())
+                accepted = dict()
+                for name, existing in zip(names, container.consult(names)):
+                    if existing is None or existing == content[name]:
+                        accepted[name] = content[name]
+                        if existing is None:
+                            added.add(name)
+                    else:
+                        conflicts.write(name, content[name], existing,
+                                        'repeated' if name in added else
+                                        'exists')
+                for name, state in repeated:
+                    if content[name] != state:
+                        conflicts.write(name, state, content[name],
+                                        'repeated')
+                container.add_states(accepted)
+                imported += len(accepted)
+    finally:
+        conflicts.close()
+    return {
+        'imported': imported,
+        'conflicts': conflicts.count,
+        'report': report if conflicts.count > 0 else None,
+    }
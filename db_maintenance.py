@@ -0,0 +1,421 @@
+import os
+import sys
+import time
+import pathlib
+import sqlite3
+import argparse
+import datetime
+import threading
+
+import state_container
+
+# The name of the table for the runs of the maintenance in the project database.
+kTableRuns = 'maintenance_runs'
+# Maximal number of rows read per index by ANALYZE, so that it stays quick on huge projects.
+kAnalysisLimit = 1000
+# Number of free pages given back to the file system in one transaction of the incremental vacuum.
+kVacuumPages = 1000
+# Number of seconds between two automatic runs of the maintenance.
+kInterval = 24 * 60 * 60
+# Number of seconds without any change of the project before the maintenance runs.
+kIdleSeconds = 60
+# Number of seconds between two checks of the maintainer.
+kPollSeconds = 5
+# Number of seconds a connection of the maintenance waits for the locks of other connections.
+kBusyTimeout = 10.0
+# Number of states in the health report.
+kTopStates = 10
+# Modes of auto_vacuum of sqlite3, by their numbers.
+kAutoVacuumModes = ('none', 'full', 'incremental')
+
+
+def _connect(path: str, read_only: bool = False) -> sqlite3.Connection:
+    '''
+    Open one project database for the maintenance, beside the connections of the program.
+
+    Attributes:
+        path: path for the *.db file of the project.
+        read_only: when it is true, the database is opened with mode "ro".
+    Returns:
+        The connection, in autocommit mode so that no transaction stays open between the steps.
+    '''
+    assert os.path.isfile(path), f'{path} not available'
+    uri = pathlib.Path(os.path.abspath(path)).as_uri()
+    return sqlite3.connect(f'{uri}?mode=ro' if read_only else uri,
+                           uri=True,
+                           timeout=kBusyTimeout,
+                           isolation_level=None)
+
+
+def _pragma(conn: sqlite3.Connection, name: str):
+    '''
+    Read the value of one pragma with one value.
+    '''
+    return conn.execute(f'PRAGMA {name};').fetchone()[0]
+
+
+def _is_available(conn: sqlite3.Connection, table: str) -> bool:
+    '''
+    Check whether one table is available.
+    '''
+    return conn.execute(
+        'SELECT count(*) FROM sqlite_master WHERE type="table" AND name=?;',
+        (table, )).fetchone()[0] > 0
+
+
+def _read_fragmentation(conn: sqlite3.Connection) -> (float, dict):
+    '''
+    Read the fragmentation and the number of pages per table and index, with the virtual table dbstat.
+
+    Attributes:
+        conn: connection to the project database.
+    Returns:
+        (fragmentation, pages): fragmentation is the share of the leaf pages which don't follow
+            the previous leaf page of their table or index in the file, so that reading in order jumps;
+            pages is a dict with the name of each table and index as key and its number of pages as value.
+            Both are None when sqlite3 has no dbstat.
+    '''
+    try:
+        rows = tuple(
+            conn.execute(
+                'SELECT name, COUNT(*), SUM(pagetype="leaf"), '
+                'SUM(pagetype="leaf" AND previous IS NOT NULL AND '
+                'pageno != previous + 1) FROM (SELECT name, pagetype, pageno, '
+                'LAG(pageno) OVER (PARTITION BY name, pagetype="leaf" '
+                'ORDER BY path) AS previous FROM dbstat) GROUP BY name;'))
+    except sqlite3.OperationalError:
+        return None, None
+    leaves = sum(leaf for _, _, leaf, _ in rows)
+    jumps = sum(jump for _, _, _, jump in rows)
+    return (jumps / leaves if leaves > 0 else 0.0), {
+        name: count
+        for name, count, _, _ in rows
+    }
+
+
+def _read_indexes(conn: sqlite3.Connection, pages: dict) -> list:
+    '''
+    Read the indexes with their sizes and the statistics of the query planner from ANALYZE.
+
+    Attributes:
+        conn: connection to the project database.
+        pages: a dict with the name of each index as key and its number of pages as value, None without dbstat.
+    Returns:
+        An array of dicts with index, table, pages, rows (None before ANALYZE) and
+            rows_per_key, the average number of rows per value of the whole index, 1 for unique indexes.
+    '''
+    stats = dict()
+    if _is_available(conn, 'sqlite_stat1'):
+        stats = {
+            index: tuple(int(n) for n in stat.split(' ') if n.isdigit())
+            for index, stat in conn.execute(
+                'SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL;')
+        }
+    indexes = []
+    for index, table in conn.execute(
+            'SELECT name, tbl_name FROM sqlite_master WHERE type="index" '
+            'ORDER BY tbl_name, name;'):
+        stat = stats.get(index, tuple())
+        indexes.append({
+            'index': index,
+            'table': table,
+            'pages': pages.get(index) if pages is not None else None,
+            'rows': stat[0] if len(stat) > 0 else None,
+            'rows_per_key': stat[-1] if len(stat) > 1 else None,
+        })
+    return indexes
+
+
+def read_last_run(conn: sqlite3.Connection) -> dict:
+    '''
+    Read the last run of the maintenance.
+
+    Attributes:
+        conn: connection to the project database.
+    Returns:
+        A dict as from maintain, None when the maintenance never ran.
+    '''
+    if not _is_available(conn, kTableRuns):
+        return None
+    row = conn.execute(
+        f'SELECT time, seconds, analyzed, vacuumed, integrity FROM {kTableRuns} '
+        'ORDER BY time DESC LIMIT 1;').fetchone()
+    if row is None:
+        return None
+    return dict(
+        zip(('time', 'seconds', 'analyzed', 'vacuumed', 'integrity'), row))
+
+
+def health_report(path: str, top: int = kTopStates) -> dict:
+    '''
+    Collect the health of one project database, it is opened for reading only.
+
+    Attributes:
+        path: path for the *.db file of the project.
+        top: number of the largest states.
+    Returns:
+        A dict with the size of the file in bytes, page size, page count, free pages and their share,
+            the mode of auto_vacuum, fragmentation and pages per table and index (None without dbstat),
+            the indexes (see _read_indexes), the largest states as pairs of state and count
+            and the last run of the maintenance (see read_last_run).
+    '''
+    conn = _connect(path, read_only=True)
+    try:
+        page_count = _pragma(conn, 'page_count')
+        free_pages = _pragma(conn, 'freelist_count')
+        fragmentation, pages = _read_fragmentation(conn)
+        largest = tuple()
+        if _is_available(conn, state_container.kTableDict):
+            largest = tuple(
+                conn.execute(
+                    f'SELECT state, count FROM {state_container.kTableDict} '
+                    'WHERE count > 0 ORDER BY count DESC, state LIMIT ?;',
+                    (top, )))
+        return {
+            'size': os.path.getsize(path),
+            'page_size': _pragma(conn, 'page_size'),
+            'page_count': page_count,
+            'free_pages': free_pages,
+            'free_ratio': free_pages / page_count if page_count > 0 else 0.0,
+            'auto_vacuum': kAutoVacuumModes[_pragma(conn, 'auto_vacuum')],
+            'fragmentation': fragmentation,
+            'pages': pages,
+            'indexes': _read_indexes(conn, pages),
+            'largest_states': largest,
+            'last_maintenance': read_last_run(conn),
+        }
+    finally:
+        conn.close()
+
+
+def format_report(report: dict) -> str:
+    '''
+    Format the health report for reading.
+
+    Attributes:
+        report: one dict from health_report.
+    Returns:
+        The text with one value per line.
+    '''
+    lines = [
+        f'size: {report["size"]} bytes, {report["page_count"]} pages of {report["page_size"]} bytes',
+        f'free pages: {report["free_pages"]} ({report["free_ratio"]:.1%}), '
+        f'auto vacuum: {report["auto_vacuum"]}',
+        'fragmentation: ' + ('not available' if report['fragmentation'] is None
+                             else f'{report["fragmentation"]:.1%}'),
+        'indexes:',
+    ]
+    for index in report['indexes']:
+        lines.append(
+            f'  {index["index"]} on {index["table"]}: ' +
+            ('' if index['pages'] is None else f'{index["pages"]} pages, ') +
+            ('not analyzed' if index['rows'] is None else
+             f'{index["rows"]} rows, {index["rows_per_key"]} rows per key'))
+    lines.append('largest states:')
+    lines += [f'  {state}: {count}' for state, count in report['largest_states']]
+    last = report['last_maintenance']
+    lines.append('last maintenance: ' + (
+        'never' if last is None else
+        f'{last["time"]}, {last["vacuumed"]} pages freed, integrity {last["integrity"]}'
+    ))
+    return '\n'.join(lines)
+
+
+def maintain(path: str,
+             check: str = 'quick',
+             full_vacuum: bool = False,
+             vacuum_pages: int = kVacuumPages) -> dict:
+    '''
+    Maintain one project database beside the connections of the program: update the statistics of the query planner,
+    give the free pages back to the file system and check the integrity; the run is recorded in the database.
+    Each step is one short transaction, so that the program waits for the locks for a short time only.
+
+    Attributes:
+        path: path for the *.db file of the project.
+        check: "quick" for PRAGMA quick_check, "full" for PRAGMA integrity_check which also compares
+            the indexes with their tables, None for no check.
+        full_vacuum: when it is true and the database can't be vacuumed incrementally, e.g. it was created
+            by an older version, it is rebuilt with VACUUM once, which locks it for the whole time.
+        vacuum_pages: number of free pages given back in one transaction.
+    Returns:
+        A dict with the time, the duration in seconds, whether it is analyzed, the number of freed pages
+            and the result of the integrity check ("ok", the problems, or None without check).
+    '''
+    assert check in ('quick', 'full', None), f'unknown check {check}'
+    begin = time.time()
+    conn = _connect(path)
+    try:
+        conn.execute(f'PRAGMA analysis_limit={int(kAnalysisLimit)};')
+        conn.execute('ANALYZE;')
+
+        free_pages = _pragma(conn, 'freelist_count')
+        if kAutoVacuumModes[_pragma(conn, 'auto_vacuum')] == 'none' and \
+                full_vacuum:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+            conn.execute('VACUUM;')
+        while kAutoVacuumModes[_pragma(conn, 'auto_vacuum')] == 'incremental' \
+                and _pragma(conn, 'freelist_count') > 0:
+            # one page is freed per step of the statement, execute would step it once only
+            # as it has no result columns, executescript steps it to the end
+            conn.executescript(
+                f'PRAGMA incremental_vacuum({int(vacuum_pages)});')
+        vacuumed = free_pages - _pragma(conn, 'freelist_count')
+
+        integrity = None
+        if check is not None:
+            integrity = '\n'.join(
+                row[0] for row in conn.execute(
+                    'PRAGMA quick_check;' if check ==
+                    'quick' else 'PRAGMA integrity_check;'))
+
+        run = {
+            'time': datetime.datetime.now().isoformat(sep=' '),
+            'seconds': time.time() - begin,
+            'analyzed': True,
+            'vacuumed': vacuumed,
+            'integrity': integrity,
+        }
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {kTableRuns} (time text, '
+                     'seconds real, analyzed integer, vacuumed integer, '
+                     'integrity text);')
+        conn.execute(f'INSERT INTO {kTableRuns} VALUES (?, ?, ?, ?, ?);',
+                     tuple(run.values()))
+        return run
+    finally:
+        conn.close()
+
+
+class Maintainer(object):
+    '''
+    The background thread which maintains one project database when the maintenance is due and
+    the project didn't change for a while, so that neither the program nor the user waits for it.
+    It watches the changes with its own connection, the project is not locked between the checks.
+
+    Attributes:
+        path: path for the *.db file of the project.
+        interval: number of seconds between two runs.
+        idle: number of seconds without any change before the maintenance runs.
+        poll: number of seconds between two checks.
+    '''
+    def __init__(self,
+                 path: str,
+                 interval: float = kInterval,
+                 idle: float = kIdleSeconds,
+                 poll: float = kPollSeconds):
+        '''
+        Constructor, the thread is started with start.
+
+        Attributes:
+            path: path for the *.db file of the project.
+            interval: number of seconds between two runs.
+            idle: number of seconds without any change before the maintenance runs.
+            poll: number of seconds between two checks.
+        '''
+        self._path = path
+        self._interval = interval
+        self._idle = idle
+        self._poll = poll
+        self._stop = threading.Event()
+        self._requested = threading.Event()
+        # set after each run, for waiting on it
+        self.finished = threading.Event()
+        # the result of the last run from this maintainer and the last error
+        self.result = None
+        self.error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        '''
+        Start the thread.
+        '''
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop the thread, a running maintenance is finished first.
+        '''
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def request(self):
+        '''
+        Run the maintenance as soon as the project is idle, even when it is not due yet.
+        '''
+        self.finished.clear()
+        self._requested.set()
+
+    def _is_due(self, conn: sqlite3.Connection) -> bool:
+        '''
+        Check whether the last run is older than the interval.
+        '''
+        if self._requested.is_set():
+            return True
+        last = read_last_run(conn)
+        return last is None or datetime.datetime.now(
+        ) - datetime.datetime.fromisoformat(last['time']) >= datetime.timedelta(
+            seconds=self._interval)
+
+    def _run(self):
+        '''
+        Check the project until stop and run the maintenance when it is due and idle, on the thread of the maintainer.
+        '''
+        conn = _connect(self._path, read_only=True)
+        try:
+            version = None
+            idle_since = time.time()
+            while not self._stop.wait(self._poll):
+                try:
+                    # the version changes whenever another connection commits
+                    current = _pragma(conn, 'data_version')
+                    if current != version:
+                        version = current
+                        idle_since = time.time()
+                    if time.time() - idle_since < self._idle or \
+                            not self._is_due(conn):
+                        continue
+                    self._requested.clear()
+                    self.result = maintain(self._path)
+                    self.error = None
+                except sqlite3.Error as ex:
+                    # e.g. locked for longer than the timeout, it is tried again later
+                    self.error = ex
+                self.finished.set()
+        finally:
+            conn.close()
+
+
+def main(argv: list = None) -> int:
+    '''
+    Print the health report of one project database, optionally after maintaining it.
+
+    Attributes:
+        argv: the arguments, by default from the command line.
+    Returns:
+        The exit code, 1 when the integrity check finds problems.
+    '''
+    parser = argparse.ArgumentParser(
+        description='maintain one project database and report its health')
+    parser.add_argument('path', help='database of the project, e.g. projects/foo/states.db')
+    parser.add_argument('--maintain',
+                        action='store_true',
+                        help='analyze, vacuum and check the database first')
+    parser.add_argument('--full-check',
+                        action='store_true',
+                        help='check the indexes against their tables')
+    parser.add_argument('--full-vacuum',
+                        action='store_true',
+                        help='rebuild the database once if it cannot be vacuumed incrementally')
+    args = parser.parse_args(argv)
+
+    run = None
+    if args.maintain:
+        run = maintain(args.path,
+                       check='full' if args.full_check else 'quick',
+                       full_vacuum=args.full_vacuum)
+    print(format_report(health_report(args.path)))
+    return 0 if run is None or run['integrity'] == 'ok' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import re
+import difflib
+
+# Number of suggestions per name.
+kSuggestions = 3
+# Minimal similarity of suggestions, between 0 and 1.
+kMinScore = 0.6
+# Maximal number of entries read from the trigram index for one name, the rarest trigrams are read first.
+kMaxPostings = 10000
+# Number of names sharing the most trigrams which are compared for one name.
+kCandidates = 50
+# Pattern of the characters which are ignored in the keys, e.g. "Issue-12" and "issue 12" have the same key.
+kPatternIgnored = re.compile(r'[\W_]+')
+
+
+def normalize(name: str) -> str:
+    '''
+    Get the key of one name for fuzzy matching: lower case without spaces and punctuation.
+
+    Attributes:
+        name: one name.
+    Returns:
+        The key.
+    '''
+    return kPatternIgnored.sub('', name.lower())
+
+
+def trigrams(key: str) -> set:
+    '''
+    Get the trigrams of one key, as the trigram tokenizer of FTS5 in sqlite3.
+
+    Attributes:
+        key: one key from normalize.
+    Returns:
+        The set of trigrams, empty for keys shorter than 3 characters.
+    '''
+    return set(key[i:i + 3] for i in range(len(key) - 2))
+
+
+def score(key: str, other: str) -> float:
+    '''
+    Get the similarity of two keys.
+
+    Returns:
+        The similarity between 0 and 1, 1 for the same keys.
+    '''
+    return difflib.SequenceMatcher(None, key, other).ratio()
+
+
+def rank(name: str, candidates: list, count: int = kSuggestions) -> tuple:
+    '''
+    Rank the candidates for one name by the similarity of their keys.
+
+    Attributes:
+        name: the name without match.
+        candidates: an array of (name, state) of the candidates.
+        count: maximal number of suggestions.
+    Returns:
+        An array of (name, state, similarity) with similarity from kMinScore, the most similar first;
+            the name itself is not suggested.
+    '''
+    key = normalize(name)
+    scored = sorted(((-score(key, normalize(n)), n, s)
+                     for n, s in set(candidates) if n != name))
+    return tuple((n, s, -negative) for negative, n, s in scored[:count]
+                 if -negative >= kMinScore)
@@ -0,0 +1,193 @@
+import re
+import datetime
+import operator
+
+# Kinds of attributes, dates are strings as "2021-03-31" which are compared in order.
+kKinds = ('text', 'integer', 'real', 'date')
+# Operators of the conditions, "in" takes an array of values.
+kOperators = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, values: value in values,
+}
+# Combinations of conditions, e.g. ("and", ("owner", "=", "thomas"), ("priority", ">=", 2)).
+kCombinators = ('and', 'or')
+# Pattern of the names of attributes.
+kPatternName = re.compile(r'^[A-Za-z_]\w*$')
+# Pattern of one condition or one value in the texts of the gui, e.g. "priority>=2" or "owner=thomas".
+kPatternCondition = re.compile(r'^\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(.*?)\s*$')
+
+
+def check_name(attribute: str):
+    '''
+    Check the name of one attribute, it is an identifier which is not one of kCombinators.
+
+    Attributes:
+        attribute: name of the attribute.
+    '''
+    assert type(attribute) == str and kPatternName.match(attribute) is not None \
+        and attribute not in kCombinators, f'wrong attribute name {attribute}'
+
+
+def check_value(kind: str, value):
+    '''
+    Check one value of an attribute against its kind.
+
+    Attributes:
+        kind: one of kKinds.
+        value: the value, None clears the attribute.
+    Returns:
+        The value as it is stored, e.g. integers of real attributes become floats.
+    '''
+    if value is None:
+        return None
+    if kind == 'real' and type(value) == int:
+        value = float(value)
+    expected = {'text': str, 'integer': int, 'real': float, 'date': str}[kind]
+    assert type(value) == expected, f'{value} is not {kind}'
+    if kind == 'date':
+        try:
+            datetime.date.fromisoformat(value)
+        except ValueError:
+            assert False, f'{value} is not {kind}'
+    return value
+
+
+def check_values(attributes: dict, kinds: dict) -> dict:
+    '''
+    Check the values of several attributes.
+
+    Attributes:
+        attributes: a dict with attribute as key and value as value, None clears the attribute.
+        kinds: a dict with the defined attributes as key and their kinds as value.
+    Returns:
+        The dict of values as they are stored.
+    '''
+    assert type(attributes) == dict, 'wrong attributes'
+    assert all(a in kinds for a in attributes), \
+        f'{tuple(a for a in attributes if a not in kinds)} not defined'
+    return {a: check_value(kinds[a], v) for a, v in attributes.items()}
+
+
+def check_condition(where, kinds: dict) -> tuple:
+    '''
+    Check one condition on attributes.
+
+    Attributes:
+        where: (attribute, operator, value) with one of kOperators, or a combination as
+            ("and", condition, ...) or ("or", condition, ...); lists are also accepted.
+        kinds: a dict with the defined attributes as key and their kinds as value.
+    Returns:
+        The condition as nested tuples with the values as they are stored, it can be a key of a dict.
+    '''
+    assert type(where) in (list, tuple) and len(where) > 1, \
+        f'wrong condition {where}'
+    if where[0] in kCombinators:
+        return (where[0], ) + tuple(
+            check_condition(condition, kinds) for condition in where[1:])
+    assert len(where) == 3 and where[1] in kOperators, f'wrong condition {where}'
+    attribute, op, value = where
+    assert attribute in kinds, f'{attribute} not defined'
+    if op == 'in':
+        assert type(value) in (list, tuple), f'wrong condition {where}'
+        value = tuple(check_value(kinds[attribute], v) for v in value)
+        assert None not in value, f'wrong condition {where}'
+    else:
+        value = check_value(kinds[attribute], value)
+        assert value is not None, f'wrong condition {where}'
+    return (attribute, op, value)
+
+
+def evaluate(where: tuple, values: dict) -> set:
+    '''
+    Get the names which fulfill one condition, names without the attribute of a condition don't fulfill it.
+
+    Attributes:
+        where: one condition from check_condition.
+        values: a dict with attribute as key and a dict of name to value as value.
+    Returns:
+        The set of names.
+    '''
+    if where[0] in kCombinators:
+        found = tuple(evaluate(condition, values) for condition in where[1:])
+        return set.intersection(
+            *found) if where[0] == 'and' else set().union(*found)
+    attribute, op, value = where
+    compare = kOperators[op]
+    return set(n for n, v in values.get(attribute, dict()).items()
+               if compare(v, value))
+
+
+def parse_value(kind: str, text: str):
+    '''
+    Convert one value from a text, empty text clears the attribute.
+
+    Attributes:
+        kind: one of kKinds.
+        text: the text of the value.
+    Returns:
+        The value for check_value.
+    '''
+    if not bool(text):
+        return None
+    try:
+        return {'integer': int, 'real': float}.get(kind, str)(text)
+    except ValueError:
+        assert False, f'{text} is not {kind}'
+
+
+def parse_values(text: str, kinds: dict) -> dict:
+    '''
+    Read the values of attributes from a text as "owner=thomas, priority=2", one value without text clears it.
+
+    Attributes:
+        text: the text, values are separated by commas or new lines.
+        kinds: a dict with the defined attributes as key and their kinds as value.
+    Returns:
+        A dict with attribute as key and value as value, None when the text is empty.
+    '''
+    parts = tuple(p for p in re.split(r'[,\n]', text) if bool(p.strip()))
+    if not bool(parts):
+        return None
+    attributes = dict()
+    for part in parts:
+        match = kPatternCondition.match(part)
+        assert match is not None and match.group(2) == '=', \
+            f'wrong value {part}, it should be as attribute=value'
+        attribute, _, value = match.groups()
+        assert attribute in kinds, f'{attribute} not defined'
+        attributes[attribute] = parse_value(kinds[attribute], value)
+    return attributes
+
+
+def parse_conditions(text: str, kinds: dict) -> tuple:
+    '''
+    Read one condition from a text: the conditions in one line are separated by commas and all fulfilled,
+    at least one of the lines is fulfilled, e.g. "owner=thomas, priority>=2" and "due<2021-03-31" in two lines.
+
+    Attributes:
+        text: the text.
+        kinds: a dict with the defined attributes as key and their kinds as value.
+    Returns:
+        The condition for check_condition, None when the text is empty.
+    '''
+    lines = []
+    for line in text.split('\n'):
+        conditions = []
+        for part in (p for p in line.split(',') if bool(p.strip())):
+            match = kPatternCondition.match(part)
+            assert match is not None and bool(match.group(3)), \
+                f'wrong condition {part}, it should be as attribute>=value'
+            attribute, op, value = match.groups()
+            assert attribute in kinds, f'{attribute} not defined'
+            conditions.append(
+                (attribute, op, parse_value(kinds[attribute], value)))
+        if bool(conditions):
+            lines.append(('and', ) + tuple(conditions))
+    if not bool(lines):
+        return None
+    return ('or', ) + tuple(lines)
@@ -0,0 +1,226 @@
+import os
+import json
+import queue
+import atexit
+import weakref
+import datetime
+import threading
+
+import log_archive
+
+# Durability of the journal: the commits of the database wait until the logs of their actions are
+# written and synced to disk ("fsync"), written to the operating system ("flush"), or don't wait ("async").
+kDurabilities = ('fsync', 'flush', 'async')
+# Maximal number of logs waiting for the writer, adding more waits until it catches up.
+kQueueSize = 10000
+# Maximal number of logs written with one write.
+kGroupSize = 1000
+
+# the open writers, they are closed at exit so that no queued log is lost
+_writers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_writers():
+    for writer in tuple(_writers):
+        writer.close()
+
+
+def _next_timestamp(last: str) -> str:
+    '''
+    Get the timestamp of now, after the last one, so that the timestamps of one writer are unique and ordered.
+
+    Attributes:
+        last: the last timestamp, None for the first.
+    Returns:
+        The timestamp like "2021-01-12T20-01-02.123456".
+    '''
+    now = datetime.datetime.now()
+    if last is not None:
+        previous = datetime.datetime.strptime(last, '%Y-%m-%dT%H-%M-%S.%f')
+        if now <= previous:
+            now = previous + datetime.timedelta(microseconds=1)
+    return now.strftime('%Y-%m-%dT%H-%M-%S.%f')
+
+
+class JournalWriter(object):
+    '''
+    Writer of the logs of actions into one journal file per writer, one JSON object per line,
+    instead of one file per action.
+    The logs are queued and a background thread writes all queued logs with one write and, for "fsync",
+    one sync (group commit). The logs are written in the order they are added.
+
+    Attributes:
+        log_dir: the log directory of one project.
+        durability: one of kDurabilities, see wait_commit.
+        queue_size: maximal number of logs waiting for the writer.
+    '''
+    def __init__(self,
+                 log_dir: str,
+                 durability: str = 'flush',
+                 queue_size: int = kQueueSize):
+        '''
+        Constructor, it starts the thread of the writer; the file is created with the first log.
+
+        Attributes:
+            log_dir: the log directory of one project.
+            durability: one of kDurabilities, see wait_commit.
+            queue_size: maximal number of logs waiting for the writer.
+        '''
+        assert durability in kDurabilities, f'unknown durability {durability}'
+        self._log_dir = log_dir
+        self._durability = durability
+        self._last = None
+        self._path = self._new_path()
+        # number of added and written lines, and the error of the writer
+        self._added = 0
+        self._written = 0
+        self._error = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        _writers.add(self)
+
+    def _new_path(self) -> str:
+        '''
+        Get the path of a new journal file, named after the next timestamp.
+        '''
+        self._last = _next_timestamp(self._last)
+        return os.path.join(self._log_dir,
+                            self._last + log_archive.kJournalExtension)
+
+    def _put(self, item):
+        '''
+        Queue one item for the writer, it waits while the queue is full.
+
+        Attributes:
+            item: ("line", text) for one line, ("rotate", path) for continuing in another file, None for stopping.
+        '''
+        assert not self._closed, 'the journal is closed'
+        with self._condition:
+            self._added += 1
+        self._queue.put(item)
+
+    def append(self, action: dict) -> str:
+        '''
+        Queue the log of one action.
+
+        Attributes:
+            action: one dict which should contain all information one action brings.
+        Returns:
+            The timestamp of the log, it identifies the log for mark_rolled_back.
+        '''
+        self._last = _next_timestamp(self._last)
+        self._put(('line',
+                   json.dumps({
+                       'time': self._last,
+                       'action': action
+                   },
+                              separators=(',', ':'))))
+        return self._last
+
+    def mark_rolled_back(self, timestamps: list):
+        '''
+        Queue the mark of logs whose actions were rolled back, they are read as not doable.
+
+        Attributes:
+            timestamps: an array of timestamps from append.
+        '''
+        if not bool(timestamps):
+            return
+        self._last = _next_timestamp(self._last)
+        self._put(('line',
+                   json.dumps({
+                       'time': self._last,
+                       'rolled_back': list(timestamps)
+                   },
+                              separators=(',', ':'))))
+
+    def rotate(self):
+        '''
+        Write the queued logs and continue in a new file, e.g. before the logs are archived.
+        '''
+        self._put(('rotate', self._new_path()))
+        self.flush()
+
+    def flush(self):
+        '''
+        Wait until the logs added so far are written, the error of the writer is raised here.
+        '''
+        with self._condition:
+            added = self._added
+            self._condition.wait_for(
+                lambda: self._written >= added or self._error is not None)
+            if self._error is not None:
+                raise self._error
+
+    def wait_commit(self):
+        '''
+        Wait as required by the durability before the database commits,
+        so that the logs of committed actions are available unless it is "async".
+        '''
+        if self._durability != 'async':
+            self.flush()
+
+    def close(self):
+        '''
+        Write the queued logs and stop the thread, closing twice does nothing.
+        '''
+        if self._closed:
+            return
+        self._put(None)
+        self._closed = True
+        self._thread.join()
+        _writers.discard(self)
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        '''
+        Write the queued logs in groups until close, on the thread of the writer.
+        '''
+        while True:
+            items = [self._queue.get()]
+            while items[-1] is not None and len(items) < kGroupSize:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in items:
+                if item is not None and item[0] == 'line':
+                    lines.append(item[1])
+                    continue
+                self._write(lines)
+                lines = []
+                if item is not None:
+                    self._path = item[1]
+            self._write(lines)
+            with self._condition:
+                self._written += len(items)
+                self._condition.notify_all()
+            if items[-1] is None:
+                return
+
+    def _write(self, lines: list):
+        '''
+        Append lines to the journal file with one write, the file is opened for each group
+        so that it is created again when it was archived meanwhile.
+        '''
+        if not bool(lines) or self._error is not None:
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        try:
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                         0o644)
+            try:
+                while bool(data):
+                    data = data[os.write(fd, data):]
+                if self._durability == 'fsync':
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as ex:
+            self._error = ex
@@ -0,0 +1,327 @@
+import os
+import gzip
+import json
+import heapq
+import datetime
+
+# Extension of the log files for single actions.
+kLogExtension = '.log.json'
+# Extension of the journal files with the logs of several actions, one JSON object per line.
+kJournalExtension = '.journal.jsonl'
+# Directory for the archive inside the log directory.
+kArchiveDir = 'archive'
+# Filename of the index for the archive.
+kIndexFile = 'index.json'
+# Extension of the segment files in archive.
+kSegmentExtension = '.seg.gz'
+# Number of actions compressed in one block, one block is the unit for reading.
+kBlockSize = 256
+# Size in bytes from which a new segment file is started.
+kSegmentBytes = 1 << 24
+
+
+def to_timestamp(value) -> str:
+    '''
+    Get the timestamp as used in the names of log files.
+
+    Attributes:
+        value: a datetime or a timestamp string, None is kept.
+    Returns:
+        The timestamp like "2021-01-12T20-01-02.123456".
+    '''
+    if value is None or type(value) == str:
+        return value
+    assert isinstance(value, datetime.datetime), f'wrong time {value}'
+    return str(value).replace(' ', 'T').replace(':', '-')
+
+
+def get_log_timestamp(path: str) -> str:
+    '''
+    Get the timestamp of one log file from its name.
+
+    Attributes:
+        path: path of the *.log.json file.
+    Returns:
+        The timestamp in the filename.
+    '''
+    return os.path.basename(path)[:-len(kLogExtension)]
+
+
+def _in_range(timestamp: str, since: str, until: str) -> bool:
+    '''
+    Check whether the timestamp is in the closed range, None means no limit on that side.
+    '''
+    return (since is None or timestamp >= since) and (until is None
+                                                      or timestamp <= until)
+
+
+def _read_index_file(log_dir: str) -> (list, list):
+    '''
+    Read the index of the archive with the files archived by the last archiving.
+
+    Attributes:
+        log_dir: the log directory of one project.
+    Returns:
+        (blocks, files): blocks as from read_index; files is a dict with the filename of each archived log
+            or journal as key and the timestamp of its last archived action as value, the files are left
+            when the archiving was interrupted before removing them, and journals are continued after it.
+    '''
+    path = os.path.join(log_dir, kArchiveDir, kIndexFile)
+    if not os.path.isfile(path):
+        return [], dict()
+    with open(path, 'r') as fs:
+        index = json.load(fs)
+    # older archives have the blocks only
+    if type(index) == list:
+        return index, dict()
+    return index['blocks'], index['files']
+
+
+def read_index(log_dir: str) -> list:
+    '''
+    Read the index of the archive.
+
+    Attributes:
+        log_dir: the log directory of one project.
+    Returns:
+        An array of blocks [first timestamp, last timestamp, segment filename, offset, length], ordered by time.
+    '''
+    return _read_index_file(log_dir)[0]
+
+
+def _write_index(log_dir: str, index: list, files: dict):
+    '''
+    Replace the index of the archive and the archived files at once.
+    '''
+    path = os.path.join(log_dir, kArchiveDir, kIndexFile)
+    with open(path + '.tmp', 'w') as fs:
+        json.dump({'blocks': index, 'files': files}, fs)
+    os.replace(path + '.tmp', path)
+
+
+def get_loose_logs(log_dir: str, since: str = None, until: str = None) -> list:
+    '''
+    Get the log files which are not archived.
+    The filenames out of the range are skipped before sorting and building the paths.
+
+    Attributes:
+        log_dir: the log directory of one project.
+        since: timestamp of the first log, None for no limit.
+        until: timestamp of the last log, None for no limit.
+    Returns:
+        The paths of the *.log.json files ordered by time.
+    '''
+    if not os.path.isdir(log_dir):
+        return []
+    size = len(kLogExtension)
+    return [
+        os.path.join(log_dir, fn) for fn in sorted(
+            fn for fn in os.listdir(log_dir) if fn.endswith(kLogExtension)
+            and _in_range(fn[:-size], since, until))
+    ]
+
+
+def get_journals(log_dir: str) -> list:
+    '''
+    Get the journal files which are not archived.
+
+    Attributes:
+        log_dir: the log directory of one project.
+    Returns:
+        The paths of the journal files ordered by the time they were started.
+    '''
+    if not os.path.isdir(log_dir):
+        return []
+    return [
+        os.path.join(log_dir, fn) for fn in sorted(os.listdir(log_dir))
+        if fn.endswith(kJournalExtension)
+    ]
+
+
+def read_journal(path: str) -> list:
+    '''
+    Read the actions from one journal file of journal_writer.JournalWriter.
+    The actions which are marked as rolled back are not doable, and an incomplete last line
+    left by a crash while writing is skipped.
+
+    Attributes:
+        path: path of the journal file.
+    Returns:
+        An array of (timestamp, action) ordered by time.
+    '''
+    actions = dict()
+    with open(path, 'r') as fs:
+        for line in fs:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if 'rolled_back' in entry:
+                actions.update(
+                    (t, dict(actions[t], doable=False, rolled_back=True))
+                    for t in entry['rolled_back'] if t in actions)
+                continue
+            actions[entry['time']] = entry['action']
+    return sorted(actions.items(), key=lambda entry: entry[0])
+
+
+def archive_logs(log_dir: str, before=None) -> int:
+    '''
+    Move the log files and journal files into compressed segments of the archive and index them by time.
+    The actions are compressed in blocks, so that one range of time can be read without the others.
+    One journal file is archived when all its actions are older than before; when it is not archived,
+    before is moved to its first action, so that the archive stays older than all logs which are not archived.
+
+    Attributes:
+        log_dir: the log directory of one project.
+        before: only the logs older than this datetime or timestamp are archived; by default all are.
+    Returns:
+        The number of archived actions.
+    '''
+    before = to_timestamp(before)
+    dir_archive = os.path.join(log_dir, kArchiveDir)
+    if not os.path.isdir(dir_archive):
+        os.mkdir(dir_archive)
+    index, archived = _read_index_file(log_dir)
+    archived = {
+        fn: last
+        for fn, last in archived.items()
+        if os.path.isfile(os.path.join(log_dir, fn))
+    }
+    # the actions left by an interrupted archiving are already in the archive
+    journals = dict()
+    for journal in get_journals(log_dir):
+        last = archived.get(os.path.basename(journal))
+        journals[journal] = [(t, a) for t, a in read_journal(journal)
+                             if last is None or t > last]
+    if before is not None:
+        # the journals with actions on both sides of before are not archived, nor anything after their first action
+        changed = True
+        while changed:
+            changed = False
+            for actions in journals.values():
+                if bool(actions) and actions[-1][0] >= before and \
+                        actions[0][0] < before:
+                    before = actions[0][0]
+                    changed = True
+        journals = {
+            journal: actions
+            for journal, actions in journals.items()
+            if all(t < before for t, _ in actions)
+        }
+    logs = tuple(log for log in get_loose_logs(log_dir)
+                 if before is None or get_log_timestamp(log) < before
+                 or os.path.basename(log) in archived)
+    # (timestamp, action) of the logs, the log files are read when their block is written
+    entries = [(get_log_timestamp(log), log) for log in logs
+               if os.path.basename(log) not in archived]
+    for actions in journals.values():
+        entries += actions
+    entries.sort(key=lambda entry: entry[0])
+
+    for begin in range(0, len(entries), kBlockSize):
+        block = entries[begin:begin + kBlockSize]
+        lines = []
+        for timestamp, action in block:
+            if type(action) == str:
+                with open(action, 'r') as fs:
+                    action = json.load(fs)
+            lines.append(
+                json.dumps({
+                    'time': timestamp,
+                    'action': action
+                },
+                           separators=(',', ':')))
+        data = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+        segment = index[-1][2] if bool(index) else None
+        if segment is None or os.path.getsize(
+                os.path.join(dir_archive, segment)) >= kSegmentBytes:
+            segment = block[0][0] + kSegmentExtension
+        path_segment = os.path.join(dir_archive, segment)
+        offset = os.path.getsize(path_segment) if os.path.isfile(
+            path_segment) else 0
+        with open(path_segment, 'ab') as fs:
+            fs.write(data)
+        index.append([block[0][0], block[-1][0], segment, offset, len(data)])
+    files = logs + tuple(journals)
+    if bool(files):
+        for log in logs:
+            archived[os.path.basename(log)] = get_log_timestamp(log)
+        for journal, actions in journals.items():
+            if bool(actions):
+                archived[os.path.basename(journal)] = actions[-1][0]
+        _write_index(log_dir, index, archived)
+    for path in files:
+        os.remove(path)
+    return len(entries)
+
+
+def _read_archive(log_dir: str, since: str, until: str):
+    '''
+    Read the archived actions in the range, only the blocks overlapping with the range are read.
+
+    Returns:
+        A generator of (timestamp, action) ordered by time.
+    '''
+    dir_archive = os.path.join(log_dir, kArchiveDir)
+    for first, last, segment, offset, length in read_index(log_dir):
+        if (since is not None and last < since) or (until is not None
+                                                    and first > until):
+            continue
+        with open(os.path.join(dir_archive, segment), 'rb') as fs:
+            fs.seek(offset)
+            data = gzip.decompress(fs.read(length))
+        for line in data.decode('utf-8').splitlines():
+            entry = json.loads(line)
+            if _in_range(entry['time'], since, until):
+                yield entry['time'], entry['action']
+
+
+def _read_loose(log_dir: str, since: str, until: str):
+    '''
+    Read the actions in the range from the log files which are not archived.
+
+    Returns:
+        A generator of (timestamp, action) ordered by time.
+    '''
+    archived = _read_index_file(log_dir)[1]
+    for log in get_loose_logs(log_dir, since=since, until=until):
+        # left by an interrupted archiving
+        if os.path.basename(log) in archived:
+            continue
+        with open(log, 'r') as fs:
+            yield get_log_timestamp(log), json.load(fs)
+
+
+def _read_journals(log_dir: str, since: str, until: str):
+    '''
+    Read the actions in the range from the journal files which are not archived.
+
+    Returns:
+        A generator of (timestamp, action) ordered by time.
+    '''
+    archived = _read_index_file(log_dir)[1]
+    return heapq.merge(*(tuple(
+        (t, a) for t, a in read_journal(journal) if _in_range(t, since, until)
+        and t > archived.get(os.path.basename(journal), ''))
+                         for journal in get_journals(log_dir)),
+                       key=lambda entry: entry[0])
+
+
+def read_actions(log_dir: str, since=None, until=None):
+    '''
+    Read the logged actions from archive, log files and journal files in one range of time.
+
+    Attributes:
+        log_dir: the log directory of one project.
+        since: datetime or timestamp of the first action, None for no limit.
+        until: datetime or timestamp of the last action, None for no limit.
+    Returns:
+        A generator of (timestamp, action) ordered by time.
+    '''
+    since = to_timestamp(since)
+    until = to_timestamp(until)
+    return heapq.merge(_read_archive(log_dir, since, until),
+                       _read_loose(log_dir, since, until),
+                       _read_journals(log_dir, since, until),
+                       key=lambda entry: entry[0])
@@ -2,13 +2,22 @@ import tkinter
 import tkinter.ttk
 import tkinter.messagebox
 import tkinter.filedialog
+import tkinter.simpledialog
 import os
 import shutil
 import json
 import csv
 import datetime
+import collections
+import threading
 
 import state_container
+import bulk_import
+import project_catalog
+import name_input
+import item_attributes
+import transition_analytics
+import db_maintenance
 
 # Base directory for the program.
 kBaseDir = os.path.dirname(os.path.realpath(__file__))
@@ -16,10 +25,18 @@ kBaseDir = os.path.dirname(os.path.realpath(__file__))
 kProjDir = os.path.join(kBaseDir, 'projects')
 # Database filename in projects.
 kFilename = 'states.db'
+# Database for the catalog of projects.
+kCatalogPath = os.path.join(kProjDir, 'catalog.db')
 # Height of buttons and other components.
 kHeightButton = 5
 # Width of buttons and other components.
 kWidthButton = 60
+# Interval in milliseconds for checking the changes in open filter windows.
+kRefreshInterval = 1000
+# Interval in milliseconds for checking whether the health report is collected.
+kReportInterval = 200
+# The operators for combining item sets.
+kSetOperators = {'|': 'union', '&': 'intersection', '-': 'difference'}
 
 
 def get_db_path(name: str) -> str:
@@ -34,6 +51,37 @@ def get_db_path(name: str) -> str:
     return os.path.join(kProjDir, name, kFilename)
 
 
+def parse_combination(text: str, set_names: list) -> tuple:
+    '''
+    Parse the expression for combining item sets, e.g. "result=week1|week2".
+    The set names may contain the operators, the expression is only split where all parts are available sets.
+
+    Attributes:
+        text: the expression, the result set is before the first "=".
+        set_names: the names of the available sets.
+    Returns:
+        (result, operation, names) with operation from state_container.kSetOperations.
+    '''
+    known = set(set_names)
+    result, _, expression = text.partition('=')
+    readings = []
+    for operator, operation in kSetOperators.items():
+        parts = expression.split(operator)
+        # the ways to read the first i parts as set names
+        splits = [[tuple()]] + [[] for _ in parts]
+        for end in range(1, len(parts) + 1):
+            for begin in range(end):
+                name = operator.join(parts[begin:end]).strip()
+                if name in known:
+                    splits[end].extend(s + (name, ) for s in splits[begin])
+        readings.extend((result.strip(), operation, names)
+                        for names in splits[-1] if len(names) > 1)
+    assert bool(readings), \
+        f'available sets should be combined with one of {", ".join(kSetOperators)}'
+    assert len(readings) == 1, f'ambiguous expression {expression.strip()}'
+    return readings[0]
+
+
 class TransitionProject(object):
     '''
     GUI for transitions.
@@ -49,8 +97,55 @@ class TransitionProject(object):
         self._path_db = get_db_path(name)
         self._data = dict()
         self._widgets = dict()
-        self._container = state_container.StateContainer(self._path_db)
+        # the windows opened from the main panel, they are closed with it
+        self._windows = []
+        self._container = state_container.StateContainer(
+            self._path_db, catalog=kCatalogPath)
+        # maintains the database in the background when the project is idle
+        self._maintainer = db_maintenance.Maintainer(self._path_db)
+        self._maintainer.start()
         self._init_gui()
+        self._resume_chunked()
+
+    def _resume_chunked(self):
+        '''
+        Ask whether the chunked operations which were interrupted, e.g. by a crash, should be continued or stopped.
+        '''
+        unfinished = self._container.get_unfinished_chunked()
+        if not bool(unfinished):
+            return
+        text = '\n'.join(f'{u["operation"]}: {u["done"]} of {u["total"]} items'
+                         for u in unfinished)
+        try:
+            if tkinter.messagebox.askyesno(
+                    '', f'unfinished operations:\n{text}\n\n'
+                    'continue them? (no stops them, the done items stay)'):
+                self._container.resume_chunked()
+            else:
+                for u in unfinished:
+                    self._container.cancel_chunked(u['chunked_id'])
+        except Exception as ex:
+            self._on_failure(str(ex))
+
+    def _execute(self, operation: str, parameters: dict):
+        '''
+        Run add, transit or remove; inputs larger than one chunk run in chunks,
+        so that other windows stay responsive and an interrupted operation can be continued.
+
+        Attributes:
+            operation: "add", "transit" or "remove".
+            parameters: the parameters of the operation as dict.
+        '''
+        names = parameters['content'] if operation == 'add' else parameters[
+            'names']
+        if len(names) > state_container.kChunkSize:
+            self._container.run_chunked(operation, parameters)
+            return
+        {
+            'add': self._container.add_states,
+            'transit': self._container.transit,
+            'remove': self._container.remove,
+        }[operation](**parameters)
 
     def _on_failure(self, cause: str = None):
         '''
@@ -63,52 +158,163 @@ class TransitionProject(object):
             '',
             cause if cause is not None else 'cannot execute this operation')
 
-    def _show_items(self, selected: list, deselected: list = None):
+    def _show_items(self,
+                    selected: list,
+                    deselected: list = None,
+                    suggestions: dict = None):
         '''
-        Show the input items or the splitted items for one operation (acceptable and conflicting).
+        Show the counts and a preview of the input items or the splitted items for one operation (acceptable and conflicting).
 
         Attributes:
             selected: acceptable items for one operation.
             deselected: conflicting items for one operation.
+            suggestions: a dict with deselected items as key and the suggested items as value, see StateContainer.suggest.
         '''
         self._widgets['show_in'].config(state='normal')
         self._widgets['show_in'].delete('1.0', tkinter.END)
         self._widgets['show_in'].insert(
             tkinter.END, f'{len(selected)} items added\n' +
-            ','.join(self._data['items']) + '\n')
+            name_input.preview(self._data['items']) + '\n')
         if deselected is not None:
             self._widgets['show_in'].insert(
                 tkinter.END,
-                f'{len(deselected)} items deselected (copy and input again)\n'
-                + ','.join(deselected) + '\n')
+                f'{len(deselected)} items deselected (input deselected to continue with them)\n'
+                + name_input.preview(deselected) + '\n')
+        if suggestions is not None and bool(suggestions):
+            self._widgets['show_in'].insert(
+                tkinter.END, 'items not found, did you mean\n' + '\n'.join(
+                    name_input.quote(name) + ': ' + ','.join(
+                        f'{name_input.quote(n)} ({s})' for n, s, _ in found)
+                    for name, found in suggestions.items() if bool(found)) +
+                '\n')
         self._widgets['show_in'].config(state='disabled')
 
+    def _suggest(self, names: list) -> dict:
+        '''
+        Suggest the meant items for the names which are not in the project, in one call.
+
+        Attributes:
+            names: the deselected items of one split.
+        Returns:
+            A dict with the first missing names as key and the suggested items as value.
+        '''
+        missing = tuple(n for n, s in zip(names, self._container.consult(names))
+                        if s is None)
+        return self._container.suggest(missing[:name_input.kPreviewSize])
+
     @classmethod
     def _get_input_list(cls, widget: tkinter.Text) -> tuple:
         '''
-        Get a list of input objects (item-names or states) separated with ','.
+        Get a list of input objects (item-names or states) separated with ',' or new lines,
+        objects with ',' can be quoted with '"'.
 
         Attributes:
             widget: input text widget.
         Returns:
-            An array of objects from input widget.
+            An array of objects from input widget, without duplicates.
         '''
-        return tuple(i.strip() for i in widget.get('1.0', tkinter.END).replace(
-            '\n', ',').strip().split(',') if bool(i.strip()))
+        return name_input.read_text(widget.get('1.0', tkinter.END))
 
-    def _input(self):
+    def _get_attributes(self, widget: tkinter.Text) -> dict:
+        '''
+        Get the values of attributes separated with ',' or new lines, as "owner=thomas, priority=2".
+
+        Attributes:
+            widget: input text widget.
+        Returns:
+            A dict with attribute as key and value as value, None when nothing is given.
+        '''
+        return item_attributes.parse_values(
+            widget.get('1.0', tkinter.END),
+            self._container.get_attribute_kinds())
+
+    def _set_input(self, elems: tuple):
         '''
-        Get the list of input item-names, save to internal data and show results.
+        Save the list of input item-names to internal data and show results.
+
+        Attributes:
+            elems: the item-names without duplicates.
         '''
-        elems = self._get_input_list(self._widgets['text_in'])
         if not bool(elems):
             self._on_failure('input is empty')
             return
-        elems = tuple(sorted(set(elems), key=elems.index))
-        self._data['items'] = elems[:]
-        self._data['full'] = elems[:]
+        self._data['items'] = elems
+        self._data['full'] = elems
+        self._data['deselected'] = tuple()
         self._show_items(self._data['items'])
 
+    def _input(self):
+        '''
+        Get the list of input item-names from the input widget.
+        '''
+        self._set_input(self._get_input_list(self._widgets['text_in']))
+
+    def _input_file(self):
+        '''
+        Get the list of input item-names from a text file, it is not shown in the input widget.
+        '''
+        filename = tkinter.filedialog.askopenfilename(
+            initialdir=os.path.dirname(self._path_db))
+        if not bool(filename):
+            return
+        self._set_input(name_input.read_file(filename))
+
+    def _input_deselected(self):
+        '''
+        Continue with the items deselected by the last split as input.
+        '''
+        self._set_input(self._data.get('deselected', tuple()))
+
+    def _ask_set(self, title: str) -> str:
+        '''
+        Ask for the name of one item set, the available sets are listed.
+
+        Attributes:
+            title: title of the dialog.
+        Returns:
+            The name, None when nothing is given.
+        '''
+        sets = self._container.get_sets()
+        text = tkinter.simpledialog.askstring(
+            title, 'item set, available:\n' +
+            '\n'.join(f'{n} ({c} items)' for n, c in sets.items()))
+        return text.strip() if text is not None and bool(
+            text.strip()) else None
+
+    def _input_set(self):
+        '''
+        Get the list of input item-names from one item set of the project, it is not shown in the input widget.
+        '''
+        name = self._ask_set('input set')
+        if name is None:
+            return
+        try:
+            self._set_input(self._container.read_set(name))
+        except Exception as ex:
+            self._on_failure(str(ex))
+
+    def _save_set(self):
+        '''
+        Save the input items as one item set of the project;
+        after a split, the accepted and deselected items are also saved as "NAME accepted" and "NAME deselected".
+        '''
+        if 'full' not in self._data:
+            self._on_failure('input is empty')
+            return
+        name = self._ask_set('save set')
+        if name is None:
+            return
+        try:
+            with self._container.transaction():
+                self._container.save_set(name, self._data['full'])
+                if bool(self._data['deselected']):
+                    self._container.save_set(f'{name} accepted',
+                                             self._data['items'])
+                    self._container.save_set(f'{name} deselected',
+                                             self._data['deselected'])
+        except Exception as ex:
+            self._on_failure(str(ex))
+
     def _cb_add(self):
         '''
         Callback function for addition.
@@ -123,9 +329,15 @@ class TransitionProject(object):
             return
         content = {n: states[0] for n in self._data['items']}
         try:
-            self._container.add_states(content=content,
-                                       forced=bool(
-                                           self._widgets['forced_add'].get()))
+            self._execute(
+                'add', {
+                    'content':
+                    content,
+                    'forced':
+                    bool(self._widgets['forced_add'].get()),
+                    'attributes':
+                    self._get_attributes(self._widgets['text_add_attributes'])
+                })
         except Exception as ex:
             self._on_failure(str(ex))
 
@@ -144,6 +356,7 @@ class TransitionProject(object):
         self._data['items'], left = self._container.select_for_addition(
             content={name: states[0]
                      for name in self._data['full']})
+        self._data['deselected'] = left
         self._show_items(self._data['items'], left)
 
     def _cb_transit(self):
@@ -159,11 +372,35 @@ class TransitionProject(object):
             self._on_failure('one state should be given for from and to')
             return
         try:
-            self._container.transit(names=self._data['items'],
-                                    from_state=from_transit[0],
-                                    to_state=to_transit[0],
-                                    forced=bool(
-                                        self._widgets['forced_transit'].get()))
+            self._execute(
+                'transit', {
+                    'names':
+                    self._data['items'],
+                    'from_state':
+                    from_transit[0],
+                    'to_state':
+                    to_transit[0],
+                    'forced':
+                    bool(self._widgets['forced_transit'].get()),
+                    'attributes':
+                    self._get_attributes(
+                        self._widgets['text_transit_attributes'])
+                })
+        except Exception as ex:
+            self._on_failure(str(ex))
+
+    def _cb_rename(self):
+        '''
+        Callback function for renaming the from-state to the to-state for all items.
+        '''
+        from_transit = self._get_input_list(self._widgets['text_from_transit'])
+        to_transit = self._get_input_list(self._widgets['text_to_transit'])
+        if len(from_transit) != 1 or len(to_transit) != 1:
+            self._on_failure('one state should be given for from and to')
+            return
+        try:
+            self._container.rename_state(from_state=from_transit[0],
+                                         to_state=to_transit[0])
         except Exception as ex:
             self._on_failure(str(ex))
 
@@ -181,7 +418,8 @@ class TransitionProject(object):
             return
         self._data['items'], left = self._container.select_for_transition(
             names=self._data['full'], from_state=from_transit[0])
-        self._show_items(self._data['items'], left)
+        self._data['deselected'] = left
+        self._show_items(self._data['items'], left, self._suggest(left))
 
     def _cb_remove(self):
         '''
@@ -191,9 +429,29 @@ class TransitionProject(object):
             self._on_failure('input is empty')
             return
         try:
-            self._container.remove(names=self._data['items'],
-                                   forced=bool(
-                                       self._widgets['forced_remove'].get()))
+            self._execute(
+                'remove', {
+                    'names': self._data['items'],
+                    'forced': bool(self._widgets['forced_remove'].get())
+                })
+        except Exception as ex:
+            self._on_failure(str(ex))
+
+    def _cb_undo(self):
+        '''
+        Callback function for undoing the last operation.
+        '''
+        try:
+            self._container.undo()
+        except Exception as ex:
+            self._on_failure(str(ex))
+
+    def _cb_redo(self):
+        '''
+        Callback function for redoing the last undone operation.
+        '''
+        try:
+            self._container.redo()
         except Exception as ex:
             self._on_failure(str(ex))
 
@@ -208,7 +466,8 @@ class TransitionProject(object):
 
         self._data['items'], left = self._container.select_for_removal(
             names=self._data['full'])
-        self._show_items(self._data['items'], left)
+        self._data['deselected'] = left
+        self._show_items(self._data['items'], left, self._suggest(left))
 
     def _backup_db(self):
         '''
@@ -220,6 +479,8 @@ class TransitionProject(object):
             initialfile=kFilename + '.backup')
         assert bool(filename), 'file not selected'
         shutil.copyfile(self._path_db, filename)
+        if state_container.read_digest(filename) != self._container.digest():
+            self._on_failure(f'digest of {filename} differs from project')
 
     def _export_db(self, states: list = None):
         '''
@@ -235,34 +496,89 @@ class TransitionProject(object):
             initialdir=os.path.dirname(self._path_db),
             initialfile=default_name)
         assert bool(filename), 'file not selected'
+        summary = dict()
         if states is None:
-            states = self._container.get_states()
-        # json file with summary
-        state_list = tuple(state for _, state in states)
-        text = json.dumps(
-            {
-                'states':
-                tuple({
-                    'name': name,
-                    'state': state
-                } for name, state in states),
-                'count_names':
-                len(states),
-                'count_states':
-                len(set(state_list)),
-                'states_in_project':
-                {s: state_list.count(s)
-                 for s in set(state_list)}
-            },
-            indent=' ')
-        with open(filename + '.json', 'w') as fs:
-            fs.write(text)
-        # csv for Excel or Calc
-        with open(filename + '.csv', 'w', newline='') as fs:
-            writer = csv.DictWriter(fs, fieldnames=['name', 'state'])
+            # stream the project page by page instead of loading it
+            states = self._container.iter_states()
+            summary['digest'] = self._container.digest()
+        counts = collections.Counter()
+        with open(filename + '.json', 'w') as fs_json, \
+                open(filename + '.csv', 'w', newline='') as fs_csv:
+            # csv for Excel or Calc
+            writer = csv.DictWriter(fs_csv, fieldnames=['name', 'state'])
             writer.writeheader()
+            # json file with summary
+            fs_json.write('{\n "states": [')
             for name, state in states:
+                fs_json.write((',' if bool(counts) else '') + '\n  ' +
+                              json.dumps({
+                                  'name': name,
+                                  'state': state
+                              }))
                 writer.writerow({'name': name, 'state': state})
+                counts[state] += 1
+            summary.update({
+                'count_names': sum(counts.values()),
+                'count_states': len(counts),
+                'states_in_project': dict(counts),
+            })
+            fs_json.write('\n ],\n' + ',\n'.join(
+                f' {json.dumps(key)}: {json.dumps(value)}'
+                for key, value in summary.items()) + '\n}\n')
+
+    def _import(self):
+        '''
+        Callback function for importing name-state pairs from CSV, JSON or NDJSON files.
+        Conflicts don't break the import, they are written to a report beside the input file.
+        '''
+        filename = tkinter.filedialog.askopenfilename(
+            title='select the file with names and states to import',
+            initialdir=os.path.dirname(self._path_db),
+            filetypes=[('CSV', '*.csv'), ('JSON', '*.json'),
+                       ('NDJSON', '*.ndjson *.jsonl')])
+        if not bool(filename):
+            return
+        atomic = tkinter.messagebox.askyesno(
+            '', 'import nothing when any conflict is found?')
+        try:
+            result = bulk_import.import_file(self._container,
+                                             filename,
+                                             atomic=atomic)
+        except Exception as ex:
+            self._on_failure(str(ex))
+            return
+        tkinter.messagebox.showinfo(
+            '', f'{result["imported"]} items imported, '
+            f'{result["conflicts"]} conflicts' +
+            (f' in {result["report"]}' if result['report'] is not None else
+             ''))
+
+    def _merge(self):
+        '''
+        Callback function for merging the states from another project database, e.g. an offline copy.
+        Conflicts take the other states when confirmed, otherwise they keep the states here and are reported.
+        '''
+        filename = tkinter.filedialog.askopenfilename(
+            title='select the database to merge from',
+            initialdir=os.path.dirname(self._path_db),
+            filetypes=[('Database', '*.db *.backup')])
+        if not bool(filename):
+            return
+        theirs = tkinter.messagebox.askyesno(
+            '', 'take the states from the other database for conflicts?')
+        try:
+            result = self._container.merge(
+                filename, policy='theirs' if theirs else 'ours')
+        except Exception as ex:
+            self._on_failure(str(ex))
+            return
+        conflicts = tuple(name for name, _, _ in result['conflicts'])
+        tkinter.messagebox.showinfo(
+            '', f'{result["added"]} items added, '
+            f'{result["changed"]} items changed, '
+            f'{len(conflicts)} conflicts' +
+            ('' if theirs or not bool(conflicts) else
+             ':\n' + ','.join(conflicts[:100])))
 
     def _filter(self):
         '''
@@ -271,8 +587,21 @@ class TransitionProject(object):
         '''
         win_filter = tkinter.Tk()
         win_filter.title(self._name)
+        self._windows.append(win_filter)
 
-        filtered = {'filtered': None}
+        # the shown result, it is patched with the changes from other windows
+        filtered = {
+            'view': dict(),
+            'lines': dict(),
+            'count_lines': 0,
+            'counts': collections.Counter(),
+            'names': None,
+            'states': None,
+            'where': None,
+            'item_set': None,
+            'seq': 0,
+            'version': None,
+        }
 
         frame_in = tkinter.Frame(win_filter)
         frame_out = tkinter.Frame(win_filter)
@@ -283,38 +612,140 @@ class TransitionProject(object):
         text_filter_states = tkinter.Text(frame_in,
                                           height=kHeightButton,
                                           width=kWidthButton)
+        # conditions on attributes, e.g. "owner=thomas, priority>=2" with one alternative per line
+        text_filter_attributes = tkinter.Text(frame_in,
+                                              height=kHeightButton,
+                                              width=kWidthButton)
+        # name of one item set, only its items are shown
+        text_filter_set = tkinter.Text(frame_in, height=1, width=kWidthButton)
         text_filter_names.pack(side=tkinter.TOP, fill=tkinter.X)
         text_filter_states.pack(side=tkinter.TOP, fill=tkinter.X)
+        text_filter_attributes.pack(side=tkinter.TOP, fill=tkinter.X)
+        text_filter_set.pack(side=tkinter.TOP, fill=tkinter.X)
 
-        def filter():
-            text_display_names.config(state='normal')
-            text_display_states.config(state='normal')
-            text_summary.config(state='normal')
-            names = self._get_input_list(text_filter_names)
-            states = self._get_input_list(text_filter_states)
-            names = names if bool(names) else None
-            states = states if bool(states) else None
-            filtered['filtered'] = self._container.get_states(names=names,
-                                                              states=states)
-            text_display_names.delete('1.0', tkinter.END)
-            text_display_states.delete('1.0', tkinter.END)
+        def set_editable(editable: bool):
+            for widget in (text_display_names, text_display_states,
+                           text_summary):
+                widget.config(state='normal' if editable else 'disabled')
+
+        def show_summary():
             text_summary.delete('1.0', tkinter.END)
-            if bool(filtered['filtered']):
-                names, states = zip(*filtered['filtered'])
-                text_display_names.insert(tkinter.END, '\n'.join(names))
-                text_display_states.insert(tkinter.END, '\n'.join(states))
+            if bool(filtered['lines']):
                 text_summary.insert(
                     tkinter.END,
-                    f'there are {len(set(names))} items with {len(set(states))} states:\n'
-                    + ','.join(sorted(set(states), key=states.index)))
+                    f'there are {len(filtered["lines"])} items with '
+                    f'{len(filtered["counts"])} states:\n' +
+                    ','.join(filtered['counts']))
             else:
                 text_summary.insert(tkinter.END, f'there is no result')
-            text_display_names.config(state='disabled')
-            text_display_states.config(state='disabled')
-            text_summary.config(state='disabled')
+
+        def show(counts: dict = None):
+            # lines of the names in the text, the removed names leave empty lines until the next show
+            filtered['lines'] = {
+                name: line
+                for line, name in enumerate(filtered['view'], 1)
+            }
+            filtered['count_lines'] = len(filtered['lines'])
+            filtered['counts'] = collections.Counter(
+                counts if counts is not None else filtered['view'].values())
+            set_editable(True)
+            text_display_names.delete('1.0', tkinter.END)
+            text_display_states.delete('1.0', tkinter.END)
+            text_display_names.insert(tkinter.END,
+                                      '\n'.join(filtered['view'].keys()))
+            text_display_states.insert(tkinter.END,
+                                       '\n'.join(filtered['view'].values()))
+            show_summary()
+            set_editable(False)
+
+        def patch(patched: dict):
+            # only the lines of the changed names are written
+            set_editable(True)
+            for name, (old_state, state) in patched.items():
+                if old_state is not None:
+                    filtered['counts'][old_state] -= 1
+                    if filtered['counts'][old_state] <= 0:
+                        del filtered['counts'][old_state]
+                if state is not None:
+                    filtered['counts'][state] += 1
+                line = filtered['lines'].get(name)
+                if line is None:
+                    filtered['count_lines'] += 1
+                    filtered['lines'][name] = filtered['count_lines']
+                    prefix = '\n' if filtered['count_lines'] > 1 else ''
+                    text_display_names.insert(tkinter.END, prefix + name)
+                    text_display_states.insert(tkinter.END, prefix + state)
+                    continue
+                if state is None:
+                    del filtered['lines'][name]
+                for widget, text in ((text_display_names,
+                                      name if state is not None else ''),
+                                     (text_display_states, state or '')):
+                    widget.delete(f'{line}.0', f'{line}.end')
+                    widget.insert(f'{line}.0', text)
+            show_summary()
+            set_editable(False)
+
+        def filter():
+            names = self._get_input_list(text_filter_names)
+            states = self._get_input_list(text_filter_states)
+            try:
+                where = item_attributes.parse_conditions(
+                    text_filter_attributes.get('1.0', tkinter.END),
+                    self._container.get_attribute_kinds())
+            except Exception as ex:
+                self._on_failure(str(ex))
+                return
+            item_set = text_filter_set.get('1.0', tkinter.END).strip()
+            if bool(item_set) and item_set not in self._container.get_sets():
+                self._on_failure(f'item set {item_set} not available')
+                return
+            filtered['names'] = names if bool(names) else None
+            filtered['states'] = states if bool(states) else None
+            filtered['where'] = where
+            filtered['item_set'] = item_set if bool(item_set) else None
+            run()
+
+        def run():
+            filtered['version'] = self._container.data_version()
+            filtered['seq'] = self._container.change_sequence()
+            # repeated filters are served from the cache while the project doesn't change
+            pairs, counts = self._container.filter_states(
+                names=filtered['names'],
+                states=filtered['states'],
+                where=filtered['where'],
+                item_set=filtered['item_set'])
+            filtered['view'] = dict(pairs)
+            show(counts)
+
+        def refresh():
+            if filtered['version'] is not None and (
+                    filtered['where'] is not None
+                    or filtered['item_set'] is not None
+            ) and filtered['version'] != self._container.data_version():
+                # the change log has no attributes and sets, so the filter runs again
+                run()
+            elif filtered['version'] is not None and \
+                    filtered['version'] != self._container.data_version():
+                filtered['version'] = self._container.data_version()
+                patched = dict()
+                filtered['seq'], changed = self._container.refresh_view(
+                    filtered['view'],
+                    filtered['seq'],
+                    names=filtered['names'],
+                    states=filtered['states'],
+                    patched=patched)
+                if changed and not bool(patched):
+                    show()
+                elif changed:
+                    patch(patched)
+                    # too many empty lines from removed names
+                    if filtered['count_lines'] > 2 * len(filtered['lines']) + 1:
+                        show()
+            win_filter.after(kRefreshInterval, refresh)
 
         def export():
-            self._export_db(states=filtered['filtered'])
+            self._export_db(states=tuple(filtered['view'].items()))
 
         tkinter.Button(frame_in,
                        text='filter',
@@ -349,6 +780,7 @@ class TransitionProject(object):
 
         frame_in.pack(side=tkinter.LEFT, fill=tkinter.Y)
         frame_out.pack(side=tkinter.RIGHT, fill=tkinter.Y)
+        win_filter.after(kRefreshInterval, refresh)
 
     def _replay(self):
         '''
@@ -357,7 +789,8 @@ class TransitionProject(object):
         logs = tkinter.filedialog.askopenfilenames(
             title='select the log files for operations to replay',
             initialdir=kBaseDir,
-            filetypes=[("Log files in JSON", "*.log.json")])
+            filetypes=[("Log files in JSON", "*.log.json"),
+                       ("Journal files", "*.journal.jsonl")])
         logs = sorted(list(logs))
 
         path_new = tkinter.filedialog.askdirectory(
@@ -367,6 +800,164 @@ class TransitionProject(object):
         state_container.StateContainer(os.path.join(path_new,
                                                     kFilename)).replay(logs)
 
+    def _replay_range(self):
+        '''
+        Callback function for replaying the actions of this project in a range of time,
+        including the archived logs. It will generate another project.
+        '''
+        since = tkinter.simpledialog.askstring(
+            'replay', 'from time (e.g. 2021-01-12T20-01-02), empty for the first')
+        until = tkinter.simpledialog.askstring(
+            'replay', 'until time (e.g. 2021-01-12T20-01-02), empty for the last')
+        if since is None or until is None:
+            return
+        path_new = tkinter.filedialog.askdirectory(
+            title='select/create directory for new project')
+        if not bool(path_new):
+            return
+        if not os.path.isdir(path_new):
+            os.makedirs(path_new)
+        try:
+            state_container.StateContainer(os.path.join(
+                path_new, kFilename)).replay(
+                    source=os.path.join(os.path.dirname(self._path_db),
+                                        'logs'),
+                    since=since.strip() or None,
+                    until=until.strip() or None)
+        except Exception as ex:
+            self._on_failure(str(ex))
+
+    def _define_attribute(self):
+        '''
+        Callback function for defining one attribute of the items, e.g. "owner=text".
+        '''
+        text = tkinter.simpledialog.askstring(
+            'define attribute',
+            f'attribute=kind, kind is one of {",".join(item_attributes.kKinds)}')
+        if text is None:
+            return
+        attribute, _, kind = text.partition('=')
+        try:
+            self._container.define_attribute(attribute.strip(), kind.strip())
+        except Exception as ex:
+            self._on_failure(str(ex))
+
+    def _combine_sets(self):
+        '''
+        Callback function for combining item sets, e.g. "result=week1|week2" for the union,
+        "&" for the intersection and "-" for the difference.
+        '''
+        sets = self._container.get_sets()
+        text = tkinter.simpledialog.askstring(
+            'combine sets',
+            'result=set1|set2 for union, & for intersection, - for difference\n'
+            + '\n'.join(sets))
+        if text is None:
+            return
+        try:
+            result, operation, names = parse_combination(text, sets)
+            count = self._container.combine_sets(result, operation, names)
+        except Exception as ex:
+            self._on_failure(str(ex))
+            return
+        tkinter.messagebox.showinfo('', f'{count} items in {result}')
+
+    def _archive_logs(self):
+        '''
+        Callback function for moving the log files to the compressed archive.
+        '''
+        count = self._container.archive_logs()
+        tkinter.messagebox.showinfo('', f'{count} logs archived')
+
+    def _analytics(self):
+        '''
+        Callback function for exporting the flow between states and the time in states.
+        A dialog for file selection is opened, type in the name without extension and save.
+        '''
+        filename = tkinter.filedialog.asksaveasfilename(
+            initialdir=os.path.dirname(self._path_db), initialfile='analytics')
+        if not bool(filename):
+            return
+        analytics = transition_analytics.TransitionAnalytics(self._path_db)
+        analytics.update()
+        analytics.export_csv(filename, until=datetime.datetime.now())
+
+    def _health_report(self):
+        '''
+        Callback function for showing the health of the project database.
+        The report is collected in the background; "maintain now" runs the maintenance as soon as the project is idle.
+        '''
+        win_report = tkinter.Tk()
+        win_report.title(self._name)
+        self._windows.append(win_report)
+        text_report = tkinter.Text(win_report, width=kWidthButton)
+        collected = dict()
+
+        def show(text: str):
+            text_report.config(state='normal')
+            text_report.delete('1.0', tkinter.END)
+            text_report.insert(tkinter.END, text)
+            text_report.config(state='disabled')
+
+        def collect():
+            try:
+                collected['text'] = db_maintenance.format_report(
+                    db_maintenance.health_report(self._path_db))
+            except Exception as ex:
+                collected['text'] = str(ex)
+
+        def wait():
+            if 'text' not in collected:
+                win_report.after(kReportInterval, wait)
+                return
+            error = self._maintainer.error
+            show(collected.pop('text') + ('' if error is None else
+                                          f'\nlast maintenance failed: {error}'))
+
+        def update():
+            show('collecting...')
+            threading.Thread(target=collect, daemon=True).start()
+            win_report.after(kReportInterval, wait)
+
+        def maintain():
+            self._maintainer.request()
+            tkinter.messagebox.showinfo(
+                '', 'the maintenance runs when the project is idle for '
+                f'{db_maintenance.kIdleSeconds} seconds')
+
+        tkinter.Button(win_report,
+                       text='update',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=update).pack(side=tkinter.TOP, fill=tkinter.X)
+        tkinter.Button(win_report,
+                       text='maintain now',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=maintain).pack(side=tkinter.TOP,
+                                              fill=tkinter.X)
+        text_report.pack(side=tkinter.TOP, fill=tkinter.BOTH)
+        # to allow copy
+        text_report.bind('<1>', lambda event: text_report.focus_set())
+        update()
+
+    def _close(self, control: tkinter.Tk):
+        '''
+        Close the main panel with the windows opened from it, stop the maintainer and close the project.
+
+        Attributes:
+            control: the window of the main panel.
+        '''
+        for window in self._windows:
+            try:
+                window.destroy()
+            except tkinter.TclError:
+                # closed before
+                pass
+        self._maintainer.stop()
+        self._container.close()
+        control.destroy()
+
     def _init_gui(self):
         '''
         Initialize the main panel for one project.
@@ -374,6 +965,7 @@ class TransitionProject(object):
         # gui preparation
         control = tkinter.Tk()
         control.title(self._name)
+        control.protocol('WM_DELETE_WINDOW', lambda: self._close(control))
 
         # input
         self._widgets['scrollbar_in'] = tkinter.Scrollbar(control)
@@ -386,6 +978,26 @@ class TransitionProject(object):
             height=kHeightButton,
             width=kWidthButton,
             command=self._input)
+        self._widgets['button_in_file'] = tkinter.Button(
+            self._widgets['scrollbar_in'],
+            text='input from file',
+            width=kWidthButton,
+            command=self._input_file)
+        self._widgets['button_in_deselected'] = tkinter.Button(
+            self._widgets['scrollbar_in'],
+            text='input deselected',
+            width=kWidthButton,
+            command=self._input_deselected)
+        self._widgets['button_in_set'] = tkinter.Button(
+            self._widgets['scrollbar_in'],
+            text='input set',
+            width=kWidthButton,
+            command=self._input_set)
+        self._widgets['button_save_set'] = tkinter.Button(
+            self._widgets['scrollbar_in'],
+            text='save set',
+            width=kWidthButton,
+            command=self._save_set)
         self._widgets['show_in'] = tkinter.Text(self._widgets['scrollbar_in'],
                                                 width=kWidthButton,
                                                 state=tkinter.DISABLED)
@@ -396,6 +1008,11 @@ class TransitionProject(object):
         self._widgets['scrollbar_in'].pack(side=tkinter.LEFT, fill=tkinter.Y)
         self._widgets['text_in'].pack(side=tkinter.TOP, fill=tkinter.X)
         self._widgets['button_in'].pack(side=tkinter.TOP, fill=tkinter.X)
+        self._widgets['button_in_file'].pack(side=tkinter.TOP, fill=tkinter.X)
+        self._widgets['button_in_deselected'].pack(side=tkinter.TOP,
+                                                   fill=tkinter.X)
+        self._widgets['button_in_set'].pack(side=tkinter.TOP, fill=tkinter.X)
+        self._widgets['button_save_set'].pack(side=tkinter.TOP, fill=tkinter.X)
         self._widgets['show_in'].pack(side=tkinter.TOP, fill=tkinter.X)
 
         self._widgets['tab_container'] = tkinter.ttk.Notebook(control)
@@ -421,6 +1038,10 @@ class TransitionProject(object):
             self._widgets['frame_add'],
             height=kHeightButton,
             width=kWidthButton)
+        self._widgets['text_add_attributes'] = tkinter.Text(
+            self._widgets['frame_add'],
+            height=kHeightButton,
+            width=kWidthButton)
         self._widgets['forced_add'] = tkinter.IntVar()
         self._widgets['check_force_add_state'] = tkinter.Checkbutton(
             self._widgets['frame_add'],
@@ -438,6 +1059,8 @@ class TransitionProject(object):
         self._widgets['button_add_state'].pack(side=tkinter.TOP,
                                                fill=tkinter.X)
         self._widgets['text_add_state'].pack(side=tkinter.TOP, fill=tkinter.X)
+        self._widgets['text_add_attributes'].pack(side=tkinter.TOP,
+                                                  fill=tkinter.X)
         self._widgets['check_force_add_state'].pack(side=tkinter.TOP,
                                                     fill=tkinter.X)
         self._widgets['button_split_add_state'].pack(side=tkinter.TOP,
@@ -458,6 +1081,10 @@ class TransitionProject(object):
             self._widgets['frame_modify'],
             height=kHeightButton,
             width=kWidthButton)
+        self._widgets['text_transit_attributes'] = tkinter.Text(
+            self._widgets['frame_modify'],
+            height=kHeightButton,
+            width=kWidthButton)
         self._widgets['forced_transit'] = tkinter.IntVar()
         self._widgets['check_force_transit'] = tkinter.Checkbutton(
             self._widgets['frame_modify'],
@@ -472,14 +1099,23 @@ class TransitionProject(object):
             height=kHeightButton,
             width=kWidthButton,
             command=self._split_transit)
+        self._widgets['button_rename'] = tkinter.Button(
+            self._widgets['frame_modify'],
+            text='rename state',
+            height=kHeightButton,
+            width=kWidthButton,
+            command=self._cb_rename)
         self._widgets['button_transit'].pack(side=tkinter.TOP, fill=tkinter.X)
         self._widgets['text_from_transit'].pack(side=tkinter.TOP,
                                                 fill=tkinter.X)
         self._widgets['text_to_transit'].pack(side=tkinter.TOP, fill=tkinter.X)
+        self._widgets['text_transit_attributes'].pack(side=tkinter.TOP,
+                                                      fill=tkinter.X)
         self._widgets['check_force_transit'].pack(side=tkinter.TOP,
                                                   fill=tkinter.X)
         self._widgets['button_split_transit'].pack(side=tkinter.TOP,
                                                    fill=tkinter.X)
+        self._widgets['button_rename'].pack(side=tkinter.TOP, fill=tkinter.X)
 
         # parts for remove: button and checkbox
         self._widgets['button_remove'] = tkinter.Button(
@@ -508,7 +1144,19 @@ class TransitionProject(object):
         self._widgets['button_split_remove'].pack(side=tkinter.TOP,
                                                   fill=tkinter.X)
 
-        # others (backup, export)
+        # others (undo, redo, backup, export)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='undo',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._cb_undo).pack(side=tkinter.TOP,
+                                                   fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='redo',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._cb_redo).pack(side=tkinter.TOP,
+                                                   fill=tkinter.X)
         tkinter.Button(self._widgets['frame_others'],
                        text='backup',
                        height=kHeightButton,
@@ -521,6 +1169,30 @@ class TransitionProject(object):
                        width=kWidthButton,
                        command=self._export_db).pack(side=tkinter.TOP,
                                                      fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='import',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._import).pack(side=tkinter.TOP,
+                                                  fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='merge',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._merge).pack(side=tkinter.TOP,
+                                                 fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='define attribute',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._define_attribute).pack(side=tkinter.TOP,
+                                                            fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='combine sets',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._combine_sets).pack(side=tkinter.TOP,
+                                                        fill=tkinter.X)
         tkinter.Button(self._widgets['frame_others'],
                        text='filter',
                        height=kHeightButton,
@@ -533,6 +1205,30 @@ class TransitionProject(object):
                        width=kWidthButton,
                        command=self._replay).pack(side=tkinter.TOP,
                                                   fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='replay range',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._replay_range).pack(side=tkinter.TOP,
+                                                        fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='archive logs',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._archive_logs).pack(side=tkinter.TOP,
+                                                        fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='analytics',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._analytics).pack(side=tkinter.TOP,
+                                                     fill=tkinter.X)
+        tkinter.Button(self._widgets['frame_others'],
+                       text='health report',
+                       height=kHeightButton,
+                       width=kWidthButton,
+                       command=self._health_report).pack(side=tkinter.TOP,
+                                                         fill=tkinter.X)
 
         self._widgets['tab_container'].add(self._widgets['frame_add'],
                                            text='add')
@@ -564,11 +1260,52 @@ def get_project_list() -> tuple:
         The name of projects.
     '''
     if not os.path.isdir(kProjDir):
-        os.mkdir(kProjDir)
+        return tuple()
     return tuple(proj for proj in os.listdir(kProjDir)
                  if os.path.isfile(get_db_path(proj)))
 
 
+def refresh_catalog(catalog: project_catalog.ProjectCatalog):
+    '''
+    Add the projects which are not in catalog yet and forget the deleted ones.
+    Only the projects missing in catalog are opened.
+
+    Attributes:
+        catalog: the catalog of projects.
+    '''
+    projects = set(get_project_list())
+    known = set(catalog.get_names())
+    for name in projects - known:
+        state_container.StateContainer(get_db_path(name),
+                                       catalog=kCatalogPath).update_catalog()
+    catalog.forget(tuple(known - projects))
+
+
+def show_projects(*_):
+    '''
+    List the projects from catalog with the search text and order in launcher.
+    '''
+    projects = catalog.get_projects(search=search_project.get().strip(),
+                                    order=order_project.get())
+    list_project.delete(0, tkinter.END)
+    for project in projects:
+        last_activity = project['last_activity'][:16]
+        list_project.insert(
+            tkinter.END, f'{project["name"]}  |  {project["items"]} items, '
+            f'{project["count_states"]} states, '
+            f'{project["size"] // 1024} KiB, {last_activity}')
+    listed['names'] = tuple(project['name'] for project in projects)
+
+
+def start_selected_project(_):
+    '''
+    Start the project selected in launcher.
+    '''
+    selection = list_project.curselection()
+    if bool(selection):
+        start_project(listed['names'][selection[0]])
+
+
 def start_new_project(_):
     '''
     Creat a new project.
@@ -580,6 +1317,8 @@ def start_new_project(_):
         os.mkdir(os.path.join(kProjDir, name))
     if bool(name):
         start_project(name)
+        refresh_catalog(catalog)
+        show_projects()
 
 
 root = tkinter.Tk()
@@ -589,12 +1328,26 @@ new_project = tkinter.Text(root, height=kHeightButton, width=kWidthButton)
 new_project.pack(side=tkinter.TOP)
 new_project.bind('<Return>', start_new_project)
 
-for project in get_project_list()[::-1]:
-    tkinter.Button(root,
-                   text=project,
-                   height=kHeightButton,
-                   width=kWidthButton,
-                   command=lambda name=project: start_project(name)).pack(
-                       side=tkinter.TOP)
+os.makedirs(kProjDir, exist_ok=True)
+catalog = project_catalog.ProjectCatalog(kCatalogPath)
+refresh_catalog(catalog)
+
+listed = {'names': tuple()}
+search_project = tkinter.StringVar(root)
+search_project.trace_add('write', show_projects)
+tkinter.Entry(root, textvariable=search_project,
+              width=kWidthButton).pack(side=tkinter.TOP, fill=tkinter.X)
+order_project = tkinter.ttk.Combobox(root,
+                                     values=tuple(project_catalog.kOrders),
+                                     state='readonly',
+                                     width=kWidthButton)
+order_project.set('activity')
+order_project.bind('<<ComboboxSelected>>', show_projects)
+order_project.pack(side=tkinter.TOP, fill=tkinter.X)
+list_project = tkinter.Listbox(root, width=kWidthButton * 2, height=30)
+list_project.bind('<Double-1>', start_selected_project)
+list_project.bind('<Return>', start_selected_project)
+list_project.pack(side=tkinter.TOP, fill=tkinter.BOTH, expand=True)
+show_projects()
 
 tkinter.mainloop()
@@ -0,0 +1,710 @@
+import json
+import bisect
+import functools
+import collections
+
+import state_container
+import project_diff
+import query_cache
+import fuzzy_index
+import item_attributes
+
+# Placeholder for the keys which are not in a table, in the journal of a transaction.
+kMissing = object()
+
+
+class MemoryContainer(state_container.StateContainer):
+    '''
+    The container for the states of short sessions, e.g. tests, dry runs and what-if sessions,
+    with the same interface and semantics as StateContainer but all data in dicts.
+    Nothing is written to disk: the actions are logged in a list, undo and the change log are kept in dicts,
+    and a transaction keeps a journal of the replaced values, so that it can be rolled back.
+    A session can start from a project with load and be written back to a project with snapshot.
+    '''
+    def __init__(self):
+        '''
+        Constructor, the container is empty.
+        '''
+        self._path = ':memory:'
+        self._dir = None
+        self._log_dir = None
+        self._read_only = False
+        self._catalog = None
+        self._depth = 0
+        self._writes = 0
+        self._pending_logs = []
+        self._journal_writer = None
+        self._in_chunk = False
+        self._undo_group = None
+        self._last_op = None
+        self._query_cache = query_cache.QueryCache()
+        # the logged actions in order
+        self._logs = []
+        # the journal of the open transaction, None when no transaction is open
+        self._journal = None
+        # the state of each name, and the names of each state
+        self._items = dict()
+        self._names = collections.defaultdict(set)
+        # the names per key and per trigram for fuzzy matching
+        self._fuzzy_keys = collections.defaultdict(set)
+        self._trigrams = collections.defaultdict(set)
+        # the count and digest per state
+        self._stats = dict()
+        # the kind per attribute, and the value per name per attribute
+        self._attribute_kinds = dict()
+        self._attributes = collections.defaultdict(dict)
+        # (action, undone) per id, the changes and the changes of attributes per id of the operations for undo
+        self._undo_ops = dict()
+        self._undo_changes = dict()
+        self._undo_attributes = dict()
+        # the changes per sequence number
+        self._change_log = dict()
+        # (action, done, id of undo) per id of the unfinished chunked operations
+        self._checkpoints = dict()
+        # the names per named set
+        self._sets = dict()
+        # the last id of undo, the first and last sequence number of the change log
+        self._counters = {'op': 0, 'first': 1, 'seq': 0}
+
+    def _put(self, table: dict, key, value):
+        '''
+        Set or delete one value in one table, the replaced value is kept in the journal.
+
+        Attributes:
+            table: the dict to change.
+            key: the key to change.
+            value: the new value, kMissing deletes the key.
+        '''
+        old = table.get(key, kMissing)
+        if value is kMissing:
+            table.pop(key, None)
+        else:
+            table[key] = value
+        if self._journal is not None:
+            self._journal.append(functools.partial(self._put, table, key, old))
+
+    def _extend(self, table: dict, key, values: tuple):
+        '''
+        Append values to the list in one table in place, only the previous length is kept in the journal.
+
+        Attributes:
+            table: the dict with lists as values.
+            key: the key of the list to extend.
+            values: the values to append.
+        '''
+        values_list = table[key]
+        size = len(values_list)
+        values_list.extend(values)
+        if self._journal is not None:
+            self._journal.append(
+                functools.partial(values_list.__delitem__, slice(size, None)))
+
+    def _set_state(self, name: str, state: str):
+        '''
+        Set or delete the state of one name, the replaced state is kept in the journal.
+
+        Attributes:
+            name: the name to change.
+            state: the new state, None deletes the name.
+        '''
+        old = self._items.get(name)
+        if old is not None:
+            self._names[old].discard(name)
+            if not bool(self._names[old]):
+                del self._names[old]
+        if state is None:
+            self._items.pop(name, None)
+        else:
+            self._items[name] = state
+            self._names[state].add(name)
+        if (old is None) != (state is None):
+            self._index_name(name, state is not None)
+        if self._journal is not None:
+            self._journal.append(
+                functools.partial(self._set_state, name, old))
+
+    def _index_name(self, name: str, inserted: bool):
+        '''
+        Update the keys and trigrams for fuzzy matching with one inserted or deleted name.
+        '''
+        key = fuzzy_index.normalize(name)
+        for table, values in ((self._fuzzy_keys, (key, )),
+                              (self._trigrams, fuzzy_index.trigrams(key))):
+            for value in values:
+                if inserted:
+                    table[value].add(name)
+                    continue
+                table[value].discard(name)
+                if not bool(table[value]):
+                    del table[value]
+
+    def _count_trigrams(self, trigrams: list) -> dict:
+        '''
+        Get the number of names per trigram, trigrams without names are left out.
+        '''
+        return {t: len(self._trigrams[t]) for t in trigrams if t in self._trigrams}
+
+    def _read_postings(self, trigram: str) -> list:
+        '''
+        Get the names which have one trigram.
+        '''
+        return tuple(self._trigrams.get(trigram, tuple()))
+
+    def _read_names(self, ids: list) -> list:
+        '''
+        Get the names for the ids from _read_postings, they are the names.
+        '''
+        return tuple(ids)
+
+    def _find_key(self, key: str) -> list:
+        '''
+        Get the names which have one key.
+        '''
+        return tuple(self._fuzzy_keys.get(key, tuple()))
+
+    def log_action(self, action: dict):
+        '''
+        Log one dictionary with the information to one action, in the list of actions.
+
+        Attributes:
+            action: one dict which should contain all information one action brings.
+        '''
+        if self._in_chunk:
+            return
+        # as in the log files, e.g. tuples become lists
+        action = json.loads(json.dumps(action))
+        self._logs.append(action)
+        if action.get('doable', True):
+            self._pending_logs.append((len(self._logs) - 1, action))
+
+    def close(self):
+        '''
+        There is nothing to write or close.
+        '''
+        pass
+
+    def get_actions(self) -> list:
+        '''
+        Get the logged actions, e.g. for replaying them in another container with _replay_actions.
+
+        Returns:
+            An array of dicts as they are logged.
+        '''
+        return tuple(self._logs)
+
+    def _begin(self):
+        '''
+        Start a transaction with an empty journal, unless one is open.
+        '''
+        if self._journal is None:
+            self._journal = []
+
+    def _commit(self):
+        '''
+        Forget the journal of the pending changes, unless they belong to an open transaction.
+        '''
+        if self._depth == 0:
+            self._journal = None
+            self._pending_logs.clear()
+            self._writes += 1
+
+    def _rollback(self):
+        '''
+        Restore the replaced values from the journal in reverse order, the logs of the actions are marked as not doable.
+        '''
+        journal = self._journal or []
+        self._journal = None
+        for restore in reversed(journal):
+            restore()
+        for index, action in self._pending_logs:
+            self._logs[index] = dict(action, doable=False, rolled_back=True)
+        self._pending_logs.clear()
+
+    def _apply_changes(self, changes: list, action: str = None):
+        '''
+        Apply the changes to the dicts without committing, see StateContainer._write_changes.
+        '''
+        changes = tuple((n, self._items.get(n), s) for n, _, s in changes
+                        if self._items.get(n) != s)
+        if action is not None:
+            self._record_undo(action, changes)
+        self._record_change_log(changes)
+        for n, e, s in changes:
+            h = state_container._hash_name(n)
+            for state, sign in ((e, -1), (s, 1)):
+                if state is None:
+                    continue
+                count, digest = self._stats.get(state, (0, 0))
+                self._put(
+                    self._stats, state,
+                    (count + sign, state_container._to_signed(digest + sign * h))
+                    if count + sign > 0 else kMissing)
+            self._set_state(n, s)
+
+    def _record_undo(self, action: str, changes: list):
+        '''
+        Record the changes of one operation for undo, the operations which were undone can't be redone anymore.
+
+        Attributes:
+            action: name of the operation.
+            changes: an array of (name, original state, new state); None as name means
+                the original state is renamed to the new state.
+        '''
+        changes = tuple(changes)
+        if self._undo_group is not None and self._undo_group[1] is not None:
+            op_id = self._undo_group[1]
+            self._last_op = op_id
+            self._extend(self._undo_changes, op_id, changes)
+            self._trim_undo(op_id)
+            return
+        if self._undo_group is not None:
+            action = self._undo_group[0]
+        for op_id, (_, undone) in tuple(self._undo_ops.items()):
+            if undone:
+                self._drop_undo_op(op_id)
+        op_id = self._counters['op'] + 1
+        self._put(self._counters, 'op', op_id)
+        self._last_op = op_id
+        if self._undo_group is not None:
+            self._undo_group[1] = op_id
+        self._put(self._undo_ops, op_id, (action, False))
+        self._put(self._undo_changes, op_id, list(changes))
+        self._put(self._undo_attributes, op_id, [])
+        self._trim_undo(op_id)
+
+    def _trim_undo(self, op_id: int):
+        '''
+        Drop the oldest operations for undo above kUndoDepth and kUndoSize, see StateContainer._insert_undo_changes.
+        '''
+        total = 0
+        for other in sorted(self._undo_ops, reverse=True):
+            total += len(self._undo_changes[other])
+            if other <= op_id - state_container.kUndoDepth or (
+                    total > state_container.kUndoSize and other != op_id):
+                self._drop_undo_op(other)
+
+    def _drop_undo_op(self, op_id: int):
+        '''
+        Delete one operation for undo with its changes.
+        '''
+        for table in (self._undo_ops, self._undo_changes,
+                      self._undo_attributes):
+            self._put(table, op_id, kMissing)
+
+    def _find_undo_op(self, undone: bool) -> tuple:
+        '''
+        Find the operation to undo or redo, see StateContainer._find_undo_op.
+        '''
+        ids = tuple(op_id for op_id, (_, u) in self._undo_ops.items()
+                    if u == undone)
+        if not bool(ids):
+            return None
+        op_id = min(ids) if undone else max(ids)
+        return op_id, self._undo_ops[op_id][0]
+
+    def _read_undo_changes(self, op_id: int) -> list:
+        '''
+        Read the recorded changes of one operation in their order.
+        '''
+        return tuple(self._undo_changes[op_id])
+
+    def _read_undo_attributes(self, op_id: int) -> list:
+        '''
+        Read the recorded changes of attributes of one operation in their order.
+        '''
+        return tuple(self._undo_attributes[op_id])
+
+    def get_attribute_kinds(self) -> dict:
+        '''
+        Get the defined attributes, see StateContainer.get_attribute_kinds.
+        '''
+        return dict(self._attribute_kinds)
+
+    def _write_attribute_kind(self, attribute: str, kind: str):
+        '''
+        Write the definition of one attribute, in the open transaction.
+        '''
+        self._put(self._attribute_kinds, attribute, kind)
+
+    def get_attributes(self, names: list) -> dict:
+        '''
+        Get the attributes of names, see StateContainer.get_attributes.
+        '''
+        found = collections.defaultdict(dict)
+        for name in set(names):
+            for attribute, values in self._attributes.items():
+                if name in values:
+                    found[name][attribute] = values[name]
+        return dict(found)
+
+    def _write_attributes(self, changes: list, record: bool = False):
+        '''
+        Apply the changes of attributes without committing, see StateContainer._write_attributes.
+        '''
+        self._begin()
+        for name, attribute, _, value in changes:
+            self._put(self._attributes[attribute], name,
+                      kMissing if value is None else value)
+        if record:
+            self._extend(self._undo_attributes, self._last_op, changes)
+
+    def _mark_undone(self, op_id: int, undone: bool):
+        '''
+        Mark one operation as undone or redone, in the open transaction.
+        '''
+        self._put(self._undo_ops, op_id, (self._undo_ops[op_id][0], undone))
+
+    def _read_checkpoints(self, chunked_id: str = None) -> list:
+        '''
+        Read the progress of the unfinished chunked operations, see StateContainer._read_checkpoints.
+        '''
+        return tuple((i, action, done, op_id)
+                     for i, (action, done, op_id) in self._checkpoints.items()
+                     if chunked_id in (None, i))
+
+    def _write_checkpoint(self,
+                          chunked_id: str,
+                          done: int,
+                          op_id: int = None,
+                          action: dict = None):
+        '''
+        Write the progress of one chunked operation in the open transaction, see StateContainer._write_checkpoint.
+        '''
+        if done is None:
+            self._put(self._checkpoints, chunked_id, kMissing)
+            return
+        if action is None:
+            action = self._checkpoints[chunked_id][0]
+        else:
+            # as in the database, e.g. tuples become lists
+            action = json.loads(json.dumps(action))
+        self._put(self._checkpoints, chunked_id, (action, done, op_id))
+
+    def _record_change_log(self, changes: list):
+        '''
+        Append the changes to the change log and drop the oldest ones above its size.
+
+        Attributes:
+            changes: an array of (name, original state, new state); None as name means
+                the original state is renamed to the new state.
+        '''
+        if not bool(changes):
+            return
+        seq = self._counters['seq']
+        for change in changes:
+            seq += 1
+            self._put(self._change_log, seq, tuple(change))
+        self._put(self._counters, 'seq', seq)
+        first = self._counters['first']
+        while first <= seq - state_container.kChangeLogSize:
+            self._put(self._change_log, first, kMissing)
+            first += 1
+        self._put(self._counters, 'first', first)
+
+    def data_version(self) -> tuple:
+        '''
+        Get a cheap token which changes whenever this container commits.
+
+        Returns:
+            A tuple, comparable with the one from an earlier call.
+        '''
+        return 0, self._writes
+
+    def change_sequence(self) -> int:
+        '''
+        Get the sequence number of the last change, to use with changes_since.
+
+        Returns:
+            The sequence number, 0 when nothing is changed.
+        '''
+        return self._counters['seq']
+
+    def changes_since(self, seq: int, limit: int = None) -> (int, list):
+        '''
+        Get the changes after one sequence number from the change log, see StateContainer.changes_since.
+        '''
+        first, last = self._counters['first'], self._counters['seq']
+        if not bool(self._change_log) or last <= seq:
+            return seq, tuple()
+        if first > seq + 1 or (limit is not None and last - seq > limit):
+            return last, None
+        return last, tuple(self._change_log[i] for i in range(seq + 1, last + 1))
+
+    def _compute_stats(self) -> dict:
+        '''
+        Compute the count and digest per state with a full scan of the names.
+
+        Returns:
+            A dict with state as key and (count, digest) as value.
+        '''
+        stats = collections.defaultdict(lambda: (0, 0))
+        for name, state in self._items.items():
+            count, digest = stats[state]
+            stats[state] = (count + 1, digest + state_container._hash_name(name))
+        return stats
+
+    def digest(self) -> str:
+        '''
+        Get the digest of all name-state pairs, it is the same as of a StateContainer with the same pairs.
+
+        Returns:
+            The digest as hexadecimal string.
+        '''
+        return state_container._combine_digests(
+            (state, digest) for state, (_, digest) in self._stats.items())
+
+    def is_table_available(self) -> bool:
+        '''
+        The dicts are always available.
+        '''
+        return True
+
+    def count_states(self) -> dict:
+        '''
+        Get the count of names per state, it is kept up to date on each change.
+
+        Returns:
+            A dict with state as key and the count of names as value.
+        '''
+        return {state: count for state, (count, _) in self._stats.items()}
+
+    def read_state(self, name: str) -> str:
+        '''
+        Get the state for one name.
+
+        Attributes:
+            name: one name.
+        Returns:
+            Its state if the name is given, or None.
+        '''
+        return self._items.get(name)
+
+    def _lookup(self, names: list) -> dict:
+        '''
+        Get the states for a name list.
+
+        Attributes:
+            names: one list or array of names.
+        Returns:
+            A dict with the found names as key and their states as value.
+        '''
+        return {n: self._items[n] for n in names if n in self._items}
+
+    def _filter(self,
+                names: list,
+                states: list,
+                where: tuple = None,
+                item_set: str = None) -> list:
+        '''
+        Get the names after the filtering of get_states, unordered.
+        '''
+        if not (names is not None and bool(names)) and not (
+                states is not None and bool(states)):
+            found = self._items.keys()
+        else:
+            found = set(n for n in names
+                        if n in self._items) if names is not None else set()
+            for state in set(states) if states is not None else tuple():
+                found.update(self._names.get(state, tuple()))
+        if item_set is not None:
+            assert item_set in self._sets, f'item set {item_set} not available'
+            found = self._sets[item_set].intersection(found)
+        if where is None:
+            return found
+        return found & item_attributes.evaluate(
+            item_attributes.check_condition(where, self._attribute_kinds),
+            self._attributes)
+
+    def get_states(self,
+                   names: list = None,
+                   states: list = None,
+                   after_name: str = None,
+                   limit: int = None,
+                   where: tuple = None,
+                   item_set: str = None) -> list:
+        '''
+        Get the correspondense of names to states, see StateContainer.get_states.
+        '''
+        found = sorted(self._filter(names, states, where, item_set))
+        if after_name is None and limit is None:
+            return tuple((n, self._items[n]) for n in found)
+        begin = 0 if after_name is None else bisect.bisect_right(
+            found, after_name)
+        end = len(found) if limit is None else begin + limit
+        return tuple((n, self._items[n]) for n in found[begin:end])
+
+    def iter_states(self,
+                    names: list = None,
+                    states: list = None,
+                    after_name: str = None,
+                    page_size: int = state_container.kPageSize,
+                    where: tuple = None,
+                    item_set: str = None):
+        '''
+        Iterate over the correspondense of names to states ordered by name, the names are sorted once.
+        '''
+        found = sorted(self._filter(names, states, where, item_set))
+        begin = 0 if after_name is None else bisect.bisect_right(
+            found, after_name)
+        for name in found[begin:]:
+            yield name, self._items[name]
+
+    def get_sets(self) -> dict:
+        '''
+        Get the named sets with their numbers of names, see StateContainer.get_sets.
+        '''
+        return {n: len(self._sets[n]) for n in sorted(self._sets)}
+
+    def read_set(self, set_name: str) -> list:
+        '''
+        Read the names of one named set ordered by name, see StateContainer.read_set.
+        '''
+        assert set_name in self._sets, f'item set {set_name} not available'
+        return tuple(sorted(self._sets[set_name]))
+
+    @state_container._atomic
+    def save_set(self, set_name: str, names: list) -> int:
+        '''
+        Save names as one named set, see StateContainer.save_set.
+        '''
+        assert type(set_name) == str and bool(set_name.strip()), \
+            f'wrong set name {set_name}'
+        names = frozenset(names)
+        assert all(type(n) == str for n in names), 'wrong parameter in save_set'
+        self._put(self._sets, set_name, names)
+        return len(names)
+
+    @state_container._atomic
+    def combine_sets(self, set_name: str, operation: str,
+                     set_names: list) -> int:
+        '''
+        Save the union, intersection or difference of named sets as one named set, see StateContainer.combine_sets.
+        '''
+        assert operation in state_container.kSetOperations, \
+            f'unknown set operation {operation}'
+        assert bool(set_names), 'no set to combine'
+        missing = tuple(n for n in set_names if n not in self._sets)
+        assert not bool(missing), f'item sets {missing} not available'
+        sets = tuple(self._sets[n] for n in set_names)
+        combine = {
+            'union': frozenset.union,
+            'intersection': frozenset.intersection,
+            'difference': frozenset.difference,
+        }[operation]
+        return self.save_set(set_name, combine(*sets))
+
+    @state_container._atomic
+    def delete_set(self, set_name: str):
+        '''
+        Delete one named set.
+        '''
+        assert set_name in self._sets, f'item set {set_name} not available'
+        self._put(self._sets, set_name, kMissing)
+
+    def _read_stats(self, states: list) -> dict:
+        '''
+        Read the count and digest of states which have names.
+
+        Attributes:
+            states: an array of states.
+        Returns:
+            A dict with state as key and (None, count, digest) as value, there are no ids.
+        '''
+        return {
+            state: (None, ) + self._stats[state]
+            for state in states if state in self._stats
+        }
+
+    def _rename(self, from_state: str, to_state: str, record: bool = False):
+        '''
+        Rename one state for its names, or join it into to_state when that exists, and commit.
+
+        Attributes:
+            from_state: the state to rename, it should have names.
+            to_state: the new name of the state.
+            record: when it is true, the renaming is recorded for undo.
+        '''
+        self._begin()
+        stats = self._read_stats((from_state, to_state))
+        assert from_state in stats, f'{from_state} is not available in rename'
+        names = tuple(self._names[from_state])
+        if record:
+            self._record_undo(
+                'rename', ((None, from_state, to_state), )
+                if to_state not in stats else tuple(
+                    (name, from_state, to_state) for name in names))
+        self._record_change_log(((None, from_state, to_state), ))
+        _, count, digest = stats[from_state]
+        _, to_count, to_digest = stats.get(to_state, (None, 0, 0))
+        self._put(self._stats, from_state, kMissing)
+        self._put(self._stats, to_state,
+                  (count + to_count,
+                   state_container._to_signed(digest + to_digest)))
+        for name in names:
+            self._set_state(name, to_state)
+        self._commit()
+
+    def _diff_merge(self, path: str, missing: bool) -> (list, list, list):
+        '''
+        Compute the differences to another database for merge, with a merge-join of both ordered by name.
+
+        Attributes:
+            path: path for the *.db file to merge from, a database of StateContainer.
+            missing: when it is true, the names missing in the other database are computed.
+        Returns:
+            (added, conflicts, missing): arrays of (name, this state, other state), see StateContainer.merge.
+        '''
+        return project_diff.diff_merge(self.iter_states(), path, missing)
+
+    def archive_logs(self, before=None) -> int:
+        '''
+        There are no log files to archive.
+
+        Returns:
+            0.
+        '''
+        return 0
+
+    def load(self, path: str):
+        '''
+        Read the states of one project as the start of the session, without logging and undo.
+        It should be called on an empty container.
+
+        Attributes:
+            path: path for the *.db file of the project.
+        '''
+        assert not bool(self._items), 'load into an empty container only'
+        self._begin()
+        try:
+            self._apply_changes(
+                tuple((n, None, s) for n, s in project_diff.iter_rows(path)))
+        except BaseException:
+            self._rollback()
+            raise
+        self._change_log.clear()
+        self._counters.update(first=1, seq=0)
+        self._commit()
+
+    def snapshot(self, path: str, catalog: str = None) -> dict:
+        '''
+        Write the states of this session to one project, a new or an existing one.
+        The project gets exactly the states of this session in one transaction, logged as one merge,
+        so it can be undone there and its logs replay to the same states.
+
+        Attributes:
+            path: path for the *.db file of the project.
+            catalog: path for the *.db file of the project catalog, which is updated.
+        Returns:
+            A dict with the counts of added, changed and removed names in the project.
+        '''
+        project = state_container.StateContainer(path, catalog=catalog)
+        # compared and changed with the write lock of the project
+        with project.transaction():
+            diffs = tuple(
+                project_diff.diff_rows(project.iter_states(),
+                                       self.iter_states()))
+            project._apply_merge(tuple((n, e, s) for _, n, e, s in diffs),
+                                 source=self._path,
+                                 policy='theirs')
+        counts = collections.Counter(kind for kind, _, _, _ in diffs)
+        return {kind: counts[kind] for kind in ('added', 'changed', 'removed')}
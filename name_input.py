@@ -0,0 +1,84 @@
+import io
+import csv
+
+# Number of names shown in the preview of the input.
+kPreviewSize = 200
+
+
+def iter_names(lines):
+    '''
+    Tokenize names separated with "," or new lines, one line after another.
+    Names with "," or new lines can be quoted with '"' as in CSV, '""' is one '"' inside quotes.
+
+    Attributes:
+        lines: an iterable of lines, e.g. an open file.
+    Returns:
+        A generator of the names without surrounding spaces, empty names are skipped.
+    '''
+    for row in csv.reader(lines, skipinitialspace=True):
+        for name in row:
+            name = name.strip()
+            if bool(name):
+                yield name
+
+
+def read_text(text: str) -> tuple:
+    '''
+    Get the names in one text, see iter_names.
+
+    Attributes:
+        text: the text, e.g. from the input widget.
+    Returns:
+        The names without duplicates, in the order of their first appearance.
+    '''
+    return unique(iter_names(io.StringIO(text)))
+
+
+def read_file(path: str) -> tuple:
+    '''
+    Get the names in one text file, it is read line by line, see iter_names.
+
+    Attributes:
+        path: path of the text file.
+    Returns:
+        The names without duplicates, in the order of their first appearance.
+    '''
+    with open(path, 'r', newline='') as fs:
+        return unique(iter_names(fs))
+
+
+def unique(names) -> tuple:
+    '''
+    Remove the duplicates in linear time.
+
+    Attributes:
+        names: an iterable of names.
+    Returns:
+        The names in the order of their first appearance.
+    '''
+    return tuple(dict.fromkeys(names))
+
+
+def quote(name: str) -> str:
+    '''
+    Quote one name if it can't be input as it is, so that it can be copied and input again.
+    '''
+    if any(c in name for c in ',"\n') or name != name.strip():
+        return '"' + name.replace('"', '""') + '"'
+    return name
+
+
+def preview(names: list, size: int = kPreviewSize) -> str:
+    '''
+    Get a short text of names for showing, with at most size names.
+
+    Attributes:
+        names: an array of names.
+        size: maximal number of names in the text.
+    Returns:
+        The quoted names separated with ",", with the count of the names left out.
+    '''
+    text = ','.join(quote(name) for name in names[:size])
+    if len(names) > size:
+        text += f',... ({len(names) - size} more)'
+    return text
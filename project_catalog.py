@@ -0,0 +1,121 @@
+import os
+import json
+import sqlite3
+import datetime
+
+# The name of the table for projects in catalog.
+kTable = 'projects'
+# Orders for listing the projects, mapped to SQL.
+kOrders = {
+    'name': 'name ASC',
+    'items': 'items DESC, name ASC',
+    'states': 'count_states DESC, name ASC',
+    'size': 'size DESC, name ASC',
+    'activity': 'last_activity DESC, name ASC',
+}
+
+
+def get_last_activity(path: str) -> datetime.datetime:
+    '''
+    Get the time of the last change of one project, from the modification times of
+    its database and its log directory, which changes with each new log file.
+
+    Attributes:
+        path: path for the *.db file of the project.
+    Returns:
+        The time of the last change.
+    '''
+    paths = (path, os.path.join(os.path.dirname(os.path.realpath(path)),
+                                'logs'))
+    return datetime.datetime.fromtimestamp(
+        max(os.path.getmtime(p) for p in paths if os.path.exists(p)))
+
+
+class ProjectCatalog(object):
+    '''
+    Small index database with the statistics of all projects, so that they can be listed
+    without opening the database of each project.
+
+    Attributes:
+        path: path for the *.db file of the catalog.
+    '''
+    def __init__(self, path: str):
+        '''
+        Constructor, it initilizes the catalog when it is not available.
+
+        Attributes:
+            path: path for the *.db file of the catalog.
+        '''
+        self._conn = sqlite3.connect(path, timeout=10.0)
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {kTable} (name text PRIMARY KEY, '
+            'path text, items integer, count_states integer, states text, '
+            'size integer, last_activity text);')
+        self._conn.commit()
+
+    def __del__(self):
+        '''
+        Destructor, it just closes the connection.
+        '''
+        self._conn.close()
+
+    def update(self, name: str, path: str, counts: dict):
+        '''
+        Update the statistics of one project, the last activity is read from its files.
+
+        Attributes:
+            name: project name.
+            path: path for the *.db file of the project.
+            counts: a dict with state as key and the count of names as value.
+        '''
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        self._conn.execute(
+            f'INSERT OR REPLACE INTO {kTable} VALUES (?, ?, ?, ?, ?, ?, ?);',
+            (name, os.path.realpath(path), sum(counts.values()), len(counts),
+             json.dumps(counts), size, str(get_last_activity(path))))
+        self._conn.commit()
+
+    def forget(self, names: list):
+        '''
+        Remove projects from the catalog.
+
+        Attributes:
+            names: the names of projects.
+        '''
+        self._conn.executemany(f'DELETE FROM {kTable} WHERE name=?;',
+                               ((name, ) for name in names))
+        self._conn.commit()
+
+    def get_names(self) -> tuple:
+        '''
+        Get the names of projects in catalog.
+
+        Returns:
+            The names of projects.
+        '''
+        return tuple(name for name, in self._conn.execute(
+            f'SELECT name FROM {kTable};'))
+
+    def get_projects(self, search: str = None, order: str = 'name') -> tuple:
+        '''
+        Get the projects with statistics.
+
+        Attributes:
+            search: when it is given, only the projects with it in the name are listed.
+            order: one of "name", "items", "states", "size" and "activity".
+        Returns:
+            An array of dicts with name, path, items, count_states, states (dict), size and last_activity.
+        '''
+        assert order in kOrders, f'unknown order {order} for projects'
+        command = f'SELECT * FROM {kTable}'
+        parameters = tuple()
+        if bool(search):
+            command += ' WHERE instr(lower(name), ?) > 0'
+            parameters = (search.lower(), )
+        cursor = self._conn.execute(
+            command + f' ORDER BY {kOrders[order]};', parameters)
+        fields = tuple(column[0] for column in cursor.description)
+        projects = tuple(dict(zip(fields, row)) for row in cursor)
+        for project in projects:
+            project['states'] = json.loads(project['states'])
+        return projects
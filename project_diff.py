@@ -0,0 +1,192 @@
+import os
+import sys
+import sqlite3
+import pathlib
+import argparse
+
+import state_container
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    '''
+    Open one database for reading only.
+
+    Attributes:
+        path: path of the database file.
+    Returns:
+        The connection to the database.
+    '''
+    uri = pathlib.Path(os.path.abspath(path)).as_uri()
+    return sqlite3.connect(f'{uri}?mode=ro', uri=True)
+
+
+def iter_rows(path: str):
+    '''
+    Get the name-state pairs in one database ordered by name, without loading all of them.
+
+    Attributes:
+        path: path of the database file.
+    Returns:
+        A generator of (name, state).
+    '''
+    conn = _connect(path)
+    try:
+        yield from conn.execute(
+            f'SELECT name, state FROM {state_container.kTable} ORDER BY name;'
+        )
+    finally:
+        conn.close()
+
+
+def diff_rows(rows_old, rows_new):
+    '''
+    Compare two sequences of name-state pairs ordered by name with a merge-join.
+
+    Attributes:
+        rows_old: an iterable of (name, state) as reference.
+        rows_new: an iterable of (name, state) to compare.
+    Returns:
+        A generator of (kind, name, old state, new state), kind is "added", "removed" or "changed";
+            old state is None for added, new state is None for removed.
+    '''
+    rows_old = iter(rows_old)
+    rows_new = iter(rows_new)
+    old = next(rows_old, None)
+    new = next(rows_new, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield 'removed', old[0], old[1], None
+            old = next(rows_old, None)
+        elif old is None or new[0] < old[0]:
+            yield 'added', new[0], None, new[1]
+            new = next(rows_new, None)
+        else:
+            if old[1] != new[1]:
+                yield 'changed', old[0], old[1], new[1]
+            old = next(rows_old, None)
+            new = next(rows_new, None)
+
+
+def diff_merge(rows, path: str, missing: bool) -> (list, list, list):
+    '''
+    Compute the differences to another database for merge with a merge-join, see StateContainer.merge.
+
+    Attributes:
+        rows: an iterable of (name, state) ordered by name, of the project to merge into.
+        path: path of the database to merge from.
+        missing: when it is true, the names missing in the other database are computed.
+    Returns:
+        (added, conflicts, missing): arrays of (name, this state, other state) for the names only in
+            the other database, with different states and only in this database; None for no state.
+    '''
+    added = []
+    conflicts = []
+    removed = []
+    for kind, name, ours, theirs in diff_rows(rows, iter_rows(path)):
+        if kind == 'added':
+            added.append((name, None, theirs))
+        elif kind == 'changed':
+            conflicts.append((name, ours, theirs))
+        elif missing:
+            removed.append((name, ours, None))
+    return tuple(added), tuple(conflicts), tuple(removed)
+
+
+def diff(path_old: str, path_new: str):
+    '''
+    Compare two databases with a merge-join on the names.
+
+    Attributes:
+        path_old: path of the database as reference, e.g. the backup.
+        path_new: path of the database to compare.
+    Returns:
+        A generator of (kind, name, old state, new state), kind is "added", "removed" or "changed";
+            old state is None for added, new state is None for removed.
+    '''
+    return diff_rows(iter_rows(path_old), iter_rows(path_new))
+
+
+def count_states(path: str) -> dict:
+    '''
+    Count the names per state in one database.
+
+    Attributes:
+        path: path of the database file.
+    Returns:
+        A dict with state as key and the count of names as value.
+    '''
+    conn = _connect(path)
+    try:
+        try:
+            return dict(
+                conn.execute(f'SELECT state, count FROM '
+                             f'{state_container.kTableDict} WHERE count > 0;'))
+        except sqlite3.OperationalError:
+            # older databases without interned states
+            return dict(
+                conn.execute(f'SELECT state, COUNT(*) FROM '
+                             f'{state_container.kTable} GROUP BY state;'))
+    finally:
+        conn.close()
+
+
+def count_deltas(path_old: str, path_new: str) -> dict:
+    '''
+    Get the changes of the count per state between two databases.
+
+    Attributes:
+        path_old: path of the database as reference.
+        path_new: path of the database to compare.
+    Returns:
+        A dict with state as key and the difference of counts (new - old) as value, unchanged states are skipped.
+    '''
+    counts_old = count_states(path_old)
+    counts_new = count_states(path_new)
+    deltas = {
+        state: counts_new.get(state, 0) - counts_old.get(state, 0)
+        for state in set(counts_old) | set(counts_new)
+    }
+    return {state: delta for state, delta in deltas.items() if delta != 0}
+
+
+def main(argv: list = None) -> int:
+    '''
+    Command line interface, it prints the differences line by line, separated with tab:
+    "+ name state" for added, "- name state" for removed, "~ name old new" for changed,
+    and at the end "# state delta" for the count per state.
+    When both databases have the same digest, nothing is compared.
+
+    Attributes:
+        argv: the arguments, by default they come from the command line.
+    Returns:
+        0 if the databases are equal, otherwise 1.
+    '''
+    parser = argparse.ArgumentParser(
+        description='compare the states in two project databases')
+    parser.add_argument('old', help='database as reference, e.g. backup')
+    parser.add_argument('new', help='database to compare')
+    parser.add_argument('--summary',
+                        action='store_true',
+                        help='print the count per state only')
+    args = parser.parse_args(argv)
+
+    digest_old = state_container.read_digest(args.old)
+    if digest_old is not None and digest_old == state_container.read_digest(
+            args.new):
+        return 0
+    symbols = {'added': '+', 'removed': '-', 'changed': '~'}
+    different = False
+    if not args.summary:
+        for kind, name, old, new in diff(args.old, args.new):
+            different = True
+            print('\t'.join(
+                [symbols[kind], name] +
+                [state for state in (old, new) if state is not None]))
+    for state, delta in sorted(count_deltas(args.old, args.new).items()):
+        different = True
+        print(f'#\t{state}\t{delta:+d}')
+    return 1 if different else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
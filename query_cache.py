@@ -0,0 +1,131 @@
+import collections
+
+# Estimated size in bytes of all results kept in one cache.
+kCacheSize = 1 << 26
+# Estimated size in bytes of one name-state pair without the characters.
+kPairSize = 160
+
+
+def normalize(names: list = None, states: list = None) -> tuple:
+    '''
+    Get the key of one filter, it doesn't depend on the order and duplicates of names and states.
+
+    Attributes:
+        names: the names for filtering as in get_states, None or empty for no filtering.
+        states: the states for filtering as in get_states, None or empty for no filtering.
+    Returns:
+        (names, states) as sorted tuples without duplicates, None for no filtering.
+    '''
+    return tuple(
+        tuple(sorted(set(values)))
+        if values is not None and bool(values) else None
+        for values in (names, states))
+
+
+def estimate_size(pairs: list) -> int:
+    '''
+    Estimate the memory used by one result.
+
+    Attributes:
+        pairs: an array of (name, state).
+    Returns:
+        The estimated size in bytes.
+    '''
+    return sum(kPairSize + len(n) + len(s) for n, s in pairs)
+
+
+class QueryCache(object):
+    '''
+    Cache of query results, each tagged with the data version at which it was read.
+    A result is only served for the same version, the least recently used results are evicted
+    when the estimated size of all results exceeds the limit.
+
+    Attributes:
+        max_size: estimated size in bytes of all results kept.
+    '''
+    def __init__(self, max_size: int = kCacheSize):
+        '''
+        Constructor, the cache is empty.
+
+        Attributes:
+            max_size: estimated size in bytes of all results kept.
+        '''
+        self._max_size = max_size
+        self._size = 0
+        # key: (version, value, size), the most recently used at the end
+        self._entries = collections.OrderedDict()
+        self._stats = collections.Counter()
+
+    def get(self, key, version):
+        '''
+        Get one result, it is dropped when it was read at another version.
+
+        Attributes:
+            key: key of the query, e.g. from normalize.
+            version: the current data version.
+        Returns:
+            The result, None when it is not cached for this version.
+        '''
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] != version:
+            self._drop(key)
+            self._stats['invalidations'] += 1
+            entry = None
+        if entry is None:
+            self._stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats['hits'] += 1
+        return entry[1]
+
+    def put(self, key, version, value, size: int):
+        '''
+        Keep one result, the least recently used ones are evicted above the size limit.
+
+        Attributes:
+            key: key of the query, e.g. from normalize.
+            version: the data version at which the result is read.
+            value: the result, it should not be changed afterwards.
+            size: estimated size in bytes of the result; results above the limit are not kept.
+        '''
+        if key in self._entries:
+            self._drop(key)
+        if size > self._max_size:
+            return
+        self._entries[key] = (version, value, size)
+        self._size += size
+        while self._size > self._max_size:
+            self._drop(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def _drop(self, key):
+        '''
+        Remove one result.
+        '''
+        self._size -= self._entries.pop(key)[2]
+
+    def clear(self):
+        '''
+        Remove all results, the statistics are kept.
+        '''
+        self._entries.clear()
+        self._size = 0
+
+    def get_stats(self) -> dict:
+        '''
+        Get the statistics of the cache.
+
+        Returns:
+            A dict with the counts of hits, misses, invalidations and evictions, the hit rate,
+                the number of results and their estimated size in bytes.
+        '''
+        total = self._stats['hits'] + self._stats['misses']
+        return {
+            'hits': self._stats['hits'],
+            'misses': self._stats['misses'],
+            'invalidations': self._stats['invalidations'],
+            'evictions': self._stats['evictions'],
+            'hit_rate': self._stats['hits'] / total if total > 0 else 0.0,
+            'entries': len(self._entries),
+            'size': self._size,
+        }
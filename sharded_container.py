@@ -0,0 +1,522 @@
+import os
+import json
+import heapq
+import collections
+import concurrent.futures
+
+import state_container
+import project_diff
+import fuzzy_index
+
+# Number of shards for new projects.
+kShards = 8
+# Directory for the shards beside the path of the project.
+kShardDir = 'shards'
+# Filename of the settings of the shards.
+kShardFile = 'shards.json'
+
+
+class _Shard(state_container.StateContainer):
+    '''
+    One shard of a sharded container, it only keeps names and states.
+    Logs, undo and the change log are kept by the coordinating container,
+    which also decides when the shard commits or rolls back.
+    '''
+    def __del__(self):
+        '''
+        Destructor, the connection is released with the shard, it may be called from another thread than its own.
+        '''
+        pass
+
+    def _init_tables(self):
+        '''
+        Create the tables for names and states and the index for fuzzy matching only.
+        '''
+        if not self._is_available(state_container.kTableItems):
+            self._migrate()
+        if not self._is_available(state_container.kTableFuzzyKeys):
+            self._create_fuzzy_index()
+        elif self._has_unique_names():
+            self._create_fuzzy_index(rebuild=True)
+
+    def log_action(self, action: dict):
+        '''
+        Nothing is logged per shard.
+        '''
+        pass
+
+    def _record_undo(self, action: str, changes: list):
+        '''
+        Nothing is recorded for undo per shard.
+        '''
+        pass
+
+    def _record_change_log(self, changes: list):
+        '''
+        Nothing is recorded in the change log per shard, the applied changes are kept for apply.
+        '''
+        self._applied = changes
+
+    def apply(self, changes: list) -> list:
+        '''
+        Apply the changes without committing, see end.
+
+        Attributes:
+            changes: an array of (name, original state, new state).
+        Returns:
+            The changes as applied, with the original states read again under the write lock of the shard;
+                the names which already have their new state are left out.
+        '''
+        self._applied = tuple()
+        self._write_changes(changes)
+        return self._applied
+
+    def _commit(self):
+        '''
+        Nothing is committed by the shard itself, see end.
+        '''
+        pass
+
+    def end(self, commit: bool):
+        '''
+        Commit or discard the pending changes of this shard.
+
+        Attributes:
+            commit: when it is true the changes are committed, otherwise rolled back.
+        '''
+        if commit:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+
+    def close(self):
+        '''
+        Close the connection, it should be called by the thread of the shard.
+        '''
+        self._conn.close()
+
+    def read_digests(self, compute: bool = False) -> dict:
+        '''
+        Get the sum of the hashes of the names per state.
+
+        Attributes:
+            compute: when it is true, the sums are computed with a full scan.
+        Returns:
+            A dict with state as key and the sum as value.
+        '''
+        if compute:
+            return {s: d for s, (_, d) in self._compute_stats().items()}
+        return {s: d for s, (_, _, d) in self._read_stats(
+            self.count_states()).items()}
+
+
+class ShardedContainer(state_container.StateContainer):
+    '''
+    The container for the states of very large projects, with the same interface as StateContainer.
+    The names are partitioned by their hash across several databases, the shards;
+    each shard has its own connection and thread, so that bulk operations run on all shards in parallel.
+    The database at path coordinates the shards: it keeps undo and the change log,
+    and each action is logged once beside it in the same format as StateContainer,
+    so the logs can be replayed in both containers and the results don't depend on the order of the shards.
+    The shards are committed together after each operation and all rolled back when any of them fails.
+
+    Attributes:
+        path: path for the *.db file of the coordinator, the logs are beside it and the shards in "shards" beside it.
+        catalog: path for the *.db file of the project catalog, which is updated on each commit.
+        read_only: when it is true, the coordinator and the shards are opened for reading only.
+        shards: number of shards for a new project, an existing project keeps its number.
+    '''
+    def __init__(self,
+                 path: str,
+                 catalog: str = None,
+                 read_only: bool = False,
+                 shards: int = kShards,
+                 journal: str = None):
+        '''
+        Constructor, it initilizes the coordinator and the shards when they are not available.
+
+        Attributes:
+            path: path for the *.db file of the coordinator, the logs are beside it and the shards in "shards" beside it.
+            catalog: path for the *.db file of the project catalog, which is updated on each commit.
+            read_only: when it is true, the coordinator and the shards are opened for reading only.
+            shards: number of shards for a new project, an existing project keeps its number.
+            journal: durability of the journal of the actions, see StateContainer.
+        '''
+        self._executors = tuple()
+        self._shards = tuple()
+        self._dirty = set()
+        super().__init__(path,
+                         catalog=catalog,
+                         read_only=read_only,
+                         journal=journal)
+        dir_shards = os.path.join(self._dir, kShardDir)
+        path_settings = os.path.join(dir_shards, kShardFile)
+        if os.path.isfile(path_settings):
+            with open(path_settings, 'r') as fs:
+                shards = json.load(fs)['shards']
+        else:
+            assert not read_only, f'{dir_shards} not available'
+            assert type(shards) == int and shards > 0, \
+                f'wrong number of shards {shards}'
+            os.makedirs(dir_shards, exist_ok=True)
+            with open(path_settings, 'w') as fs:
+                json.dump({'shards': shards}, fs)
+
+        # each connection is used by the thread which opened it only
+        self._executors = tuple(
+            concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            for _ in range(shards))
+        self._shards = tuple(
+            executor.submit(_Shard,
+                            os.path.join(dir_shards, f'{i}.db'),
+                            read_only=read_only).result()
+            for i, executor in enumerate(self._executors))
+
+    def __del__(self):
+        '''
+        Destructor, the threads of the shards are stopped without waiting; close the container to wait for them.
+        '''
+        for executor in getattr(self, '_executors', tuple()):
+            executor.shutdown(wait=False)
+        super().__del__()
+
+    def close(self):
+        '''
+        Close the shards, each by its own thread, and stop their threads,
+        then the coordinator. Closing twice does nothing.
+        '''
+        for shard, executor in zip(self._shards, self._executors):
+            executor.submit(shard.close).result()
+            executor.shutdown()
+        self._shards = tuple()
+        self._executors = tuple()
+        super().close()
+
+    def _get_shard(self, name: str) -> int:
+        '''
+        Get the index of the shard for one name, it doesn't change between runs.
+        '''
+        return state_container._hash_name(name) % len(self._shards)
+
+    def _partition(self, items: list, key=None) -> dict:
+        '''
+        Partition names, or items with names, by shard; the order is kept in each part.
+
+        Attributes:
+            items: an array of names or of items.
+            key: when it is given, it gets the name of one item.
+        Returns:
+            A dict with the index of shard as key and the array of its items as value.
+        '''
+        parts = collections.defaultdict(list)
+        for item in items:
+            parts[self._get_shard(item if key is None else key(item))].append(
+                item)
+        return parts
+
+    def _run(self, method: str, arguments: dict = None) -> dict:
+        '''
+        Call one method of the shards in parallel, each on the thread of its shard.
+
+        Attributes:
+            method: name of the method of _Shard.
+            arguments: a dict with the index of shard as key and a tuple of parameters as value;
+                by default the method is called on all shards without parameters.
+        Returns:
+            A dict with the index of shard as key and the result of the method as value.
+        '''
+        assert bool(self._shards), f'{self._path} is closed'
+        if arguments is None:
+            arguments = {i: tuple() for i in range(len(self._shards))}
+        futures = {
+            i: self._executors[i].submit(getattr(self._shards[i], method),
+                                         *args)
+            for i, args in arguments.items()
+        }
+        concurrent.futures.wait(futures.values())
+        return {i: future.result() for i, future in futures.items()}
+
+    def _write_shards(self, method: str, arguments: dict):
+        '''
+        Call one writing method of the shards in parallel and commit, all changes are discarded when any fails.
+
+        Attributes:
+            method: name of the method of _Shard.
+            arguments: a dict with the index of shard as key and a tuple of parameters as value.
+        '''
+        self._dirty.update(arguments)
+        try:
+            self._run(method, arguments)
+        except BaseException:
+            if self._depth == 0:
+                self._rollback()
+            raise
+        self._commit()
+
+    def _commit(self):
+        '''
+        Commit the changed shards and then the coordinator, unless they belong to an open transaction.
+        '''
+        if self._depth == 0 and bool(self._dirty):
+            self._run('end', {i: (True, ) for i in self._dirty})
+            self._dirty.clear()
+        super()._commit()
+
+    def _rollback(self):
+        '''
+        Discard the pending changes of the changed shards and of the coordinator.
+        '''
+        if bool(self._dirty):
+            self._run('end', {i: (False, ) for i in self._dirty})
+            self._dirty.clear()
+        super()._rollback()
+
+    def _write_changes(self, changes: list, action: str = None):
+        '''
+        Apply the changes to the shards in parallel, record the changes as the shards applied them
+        for undo and in the change log, and commit.
+
+        Attributes:
+            changes: an array of (name, original state, new state); None as original state means
+                the name is inserted, None as new state means the name is deleted.
+            action: when it is given, the changes are recorded as one operation for undo.
+                The original states are read again by the shards, see StateContainer._write_changes.
+        '''
+        arguments = {
+            i: (part, )
+            for i, part in self._partition(
+                changes, key=lambda change: change[0]).items()
+        }
+        self._dirty.update(arguments)
+        try:
+            applied = {
+                change[0]: change
+                for part in self._run('apply', arguments).values()
+                for change in part
+            }
+            changes = tuple(applied[n]
+                            for n in dict.fromkeys(n for n, _, _ in changes)
+                            if n in applied)
+            if action is not None:
+                self._record_undo(action, changes)
+            self._record_change_log(changes)
+        except BaseException:
+            if self._depth == 0:
+                self._rollback()
+            raise
+        self._commit()
+
+    def _rename(self, from_state: str, to_state: str, record: bool = False):
+        '''
+        Rename one state in the shards which have it and commit.
+
+        Attributes:
+            from_state: the state to rename, it should have names.
+            to_state: the new name of the state.
+            record: when it is true, the renaming is recorded for undo.
+        '''
+        stats = self._run('_read_stats', {
+            i: ((from_state, to_state), )
+            for i in range(len(self._shards))
+        })
+        having = tuple(i for i, s in stats.items() if from_state in s)
+        assert bool(having), f'{from_state} is not available in rename'
+        if record:
+            if not any(to_state in s for s in stats.values()):
+                self._record_undo('rename', ((None, from_state, to_state), ))
+            else:
+                self._record_undo(
+                    'rename',
+                    tuple((name, from_state, to_state)
+                          for name, _ in self.iter_states(
+                              states=(from_state, ))))
+        self._record_change_log(((None, from_state, to_state), ))
+        self._write_shards('_rename',
+                           {i: (from_state, to_state)
+                            for i in having})
+
+    def _read_stats(self, states: list) -> dict:
+        '''
+        Read the count and digest of states which have names in any shard.
+
+        Attributes:
+            states: an array of states.
+        Returns:
+            A dict with state as key and (None, count, digest) as value, the ids differ between shards.
+        '''
+        states = tuple(states)
+        stats = dict()
+        for part in self._run('_read_stats', {
+                i: (states, )
+                for i in range(len(self._shards))
+        }).values():
+            for state, (_, count, digest) in part.items():
+                _, total_count, total_digest = stats.get(state, (None, 0, 0))
+                stats[state] = (None, total_count + count,
+                                total_digest + digest)
+        return stats
+
+    def digest(self) -> str:
+        '''
+        Get the digest of all name-state pairs, it is the same as of a StateContainer with the same pairs.
+
+        Returns:
+            The digest as hexadecimal string.
+        '''
+        return self._combine(self._run('read_digests'))
+
+    def compute_digest(self) -> str:
+        '''
+        Compute the digest with a full scan of all shards, to check the integrity against digest.
+
+        Returns:
+            The digest as hexadecimal string.
+        '''
+        return self._combine(
+            self._run('read_digests',
+                      {i: (True, )
+                       for i in range(len(self._shards))}))
+
+    @staticmethod
+    def _combine(digests: dict) -> str:
+        '''
+        Combine the sums of hashes per state of all shards to one digest.
+        '''
+        total = collections.Counter()
+        for part in digests.values():
+            total.update(part)
+        return state_container._combine_digests(total.items())
+
+    def count_states(self) -> dict:
+        '''
+        Get the count of names per state of all shards.
+
+        Returns:
+            A dict with state as key and the count of names as value.
+        '''
+        counts = collections.Counter()
+        for part in self._run('count_states').values():
+            counts.update(part)
+        return dict(counts)
+
+    def read_state(self, name: str) -> str:
+        '''
+        Get the state for one name.
+
+        Attributes:
+            name: one name.
+        Returns:
+            Its state if the name is given, or None.
+        '''
+        return self.consult((name, ))[0]
+
+    def _lookup(self, names: list) -> dict:
+        '''
+        Get the states for a name list, the shards are consulted in parallel.
+
+        Attributes:
+            names: one list or array of names.
+        Returns:
+            A dict with the found names as key and their states as value.
+        '''
+        found = dict()
+        for part in self._run(
+                '_lookup', {
+                    i: (part, )
+                    for i, part in self._partition(set(names)).items()
+                }).values():
+            found.update(part)
+        return found
+
+    def get_states(self,
+                   names: list = None,
+                   states: list = None,
+                   after_name: str = None,
+                   limit: int = None,
+                   where: tuple = None,
+                   item_set: str = None) -> list:
+        '''
+        Get the correspondense of names to states, the shards are filtered in parallel.
+
+        Attributes:
+            names: one list or names for filtering, if it is None, filtering skips and all names are included.
+            states: one list or names for filtering, if it is None, filtering skips and all states are included.
+            after_name: when it is given, only the names after it are included and the result is ordered by name,
+                for paging with the last name of the previous page.
+            limit: when it is given, at most so many pairs are returned and the result is ordered by name.
+            where: one condition on attributes for filtering, the attributes are kept by the coordinator,
+                see StateContainer.get_states.
+            item_set: the name of one named set for filtering, the sets are kept by the coordinator.
+        Returns:
+            An array of pairs name-state after the given filtering.
+        '''
+        if where is not None or item_set is not None:
+            command, parameters = self._select_matched(where, item_set)
+            matched = set(name for name, in self._conn.cursor().execute(
+                command + ';', parameters))
+            if not bool(matched):
+                return tuple()
+            if not (names is not None and bool(names)) and not (
+                    states is not None and bool(states)):
+                return self.get_states(names=tuple(matched),
+                                       after_name=after_name,
+                                       limit=limit)
+            pairs = tuple(pair for pair in self.get_states(names, states)
+                          if pair[0] in matched)
+            if after_name is None and limit is None:
+                return pairs
+            pairs = sorted(pair for pair in pairs
+                           if after_name is None or pair[0] > after_name)
+            return tuple(pairs if limit is None else pairs[:limit])
+        arguments = {
+            i: (names, states, after_name, limit)
+            for i in range(len(self._shards))
+        }
+        if names is not None and bool(names) and not (states is not None
+                                                       and bool(states)):
+            # only the shards of the names can have results
+            arguments = {
+                i: (part, states, after_name, limit)
+                for i, part in self._partition(set(names)).items()
+            }
+        parts = self._run('get_states', arguments).values()
+        if after_name is None and limit is None:
+            return tuple(pair for part in parts for pair in part)
+        pairs = heapq.merge(*parts, key=lambda pair: pair[0])
+        return tuple(pairs if limit is None else (
+            pair for _, pair in zip(range(limit), pairs)))
+
+    def suggest(self,
+                names: list,
+                count: int = fuzzy_index.kSuggestions) -> dict:
+        '''
+        Suggest the names which are meant by names without match, each shard is searched in parallel.
+
+        Attributes:
+            names: an array of names, e.g. the names denied by select_for_transition.
+            count: maximal number of suggestions per name.
+        Returns:
+            A dict with each of names as key and an array of (name, state, similarity) as value, the most similar first.
+        '''
+        names = tuple(names)
+        parts = self._run('suggest',
+                          {i: (names, count)
+                           for i in range(len(self._shards))}).values()
+        return {
+            name: tuple(
+                sorted((s for part in parts for s in part[name]),
+                       key=lambda s: (-s[2], s[0]))[:count])
+            for name in names
+        }
+
+    def _diff_merge(self, path: str, missing: bool) -> (list, list, list):
+        '''
+        Compute the differences to another database for merge, with a merge-join of both ordered by name.
+
+        Attributes:
+            path: path for the *.db file to merge from, a database of StateContainer.
+            missing: when it is true, the names missing in the other database are computed.
+        Returns:
+            (added, conflicts, missing): arrays of (name, this state, other state), see StateContainer.merge.
+        '''
+        return project_diff.diff_merge(self.iter_states(), path, missing)
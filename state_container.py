@@ -2,9 +2,195 @@ import os
 import sqlite3
 import json
 import datetime
+import hashlib
+import pathlib
+import uuid
+import contextlib
+import functools
+import collections
 
-# The name of the table for states.
+import log_archive
+import project_catalog
+import query_cache
+import fuzzy_index
+import item_attributes
+import journal_writer
+
+# The name of the view for states, pairs of name and state.
 kTable = 'states'
+# The name of the table for names, each with the id of its state.
+kTableItems = 'items'
+# The name of the table for interned states with the count and digest of their names.
+kTableDict = 'state_dict'
+# The name of the index on the state ids of names.
+kIndexState = 'items_state'
+# The tables of older versions, they are migrated.
+kTableLegacyStats = 'state_stats'
+# The name of the table for the operations which can be undone.
+kTableUndoOps = 'undo_ops'
+# The name of the table for the changes of the operations which can be undone.
+kTableUndoChanges = 'undo_changes'
+# Number of operations kept for undo.
+kUndoDepth = 100
+# Number of changes kept for undo, the oldest operations are dropped above it; the last operation is always kept.
+kUndoSize = 100000
+# The name of the table for the states referred to by undo and the change log, the id of a state never changes.
+kTableStateIds = 'state_ids'
+# The name of the table for the sequence of changed names, for refreshing views.
+kTableChangeLog = 'change_log'
+# The name of the table for the keys of names for fuzzy matching.
+kTableFuzzyKeys = 'fuzzy_keys'
+# The name of the full-text index on the trigrams of the keys, it needs FTS5 in sqlite3.
+kTableTrigrams = 'fuzzy_trigrams'
+# The name of the table for the number of keys per trigram, from the full-text index.
+kTableTrigramCounts = 'fuzzy_trigram_counts'
+# The name of the table for the attributes of names, e.g. owner or due date.
+kTableAttributes = 'item_attributes'
+# The name of the table for the kinds of the defined attributes.
+kTableAttributeKinds = 'attribute_kinds'
+# The name of the table for the changes of attributes of the operations which can be undone.
+kTableUndoAttributes = 'undo_attributes'
+# The name of the table for the progress of the chunked operations which are not finished.
+kTableCheckpoints = 'chunked_checkpoints'
+# The name of the table for the named sets of names, e.g. saved input lists.
+kTableSets = 'item_sets'
+# The name of the table for the names in the named sets.
+kTableSetNames = 'item_set_names'
+# Number of changes kept in the change log.
+kChangeLogSize = 100000
+# Number of changes from which a view is rebuilt instead of patched.
+kViewRefreshLimit = 10000
+# Size in bytes of memory-mapped I/O for read-only containers.
+kReadOnlyMmapSize = 1 << 28
+# Size in KiB of the page cache for read-only containers.
+kReadOnlyCacheSize = 1 << 16
+# Modulus for the digests, they are sums of 64 bit hashes.
+kDigestModulus = 1 << 64
+# Maximal number of names bound in one query.
+kBatchSize = 500
+# Number of pairs read with one query when iterating.
+kPageSize = 1000
+# Policies for conflicts in merge: take the other state, keep this state or only report.
+kMergePolicies = ('theirs', 'ours', 'report')
+# Operations which can run in chunks, with their parameters.
+kChunkedOperations = {
+    'add': ('content', 'forced', 'attributes'),
+    'transit': ('names', 'from_state', 'to_state', 'forced', 'attributes'),
+    'remove': ('names', 'forced'),
+}
+# Number of items per chunk of chunked operations.
+kChunkSize = 10000
+# Operations on named sets, with their compound operators in sqlite3;
+# the difference keeps the names of the first set which are in none of the others.
+kSetOperations = {
+    'union': 'UNION',
+    'intersection': 'INTERSECT',
+    'difference': 'EXCEPT',
+}
+
+
+def _to_signed(value: int) -> int:
+    '''
+    Map an integer to the signed 64 bit range of sqlite3, modulo 2^64.
+    '''
+    value %= kDigestModulus
+    return value - kDigestModulus if value >= kDigestModulus // 2 else value
+
+
+def _hash_name(name: str) -> int:
+    '''
+    Get the 64 bit hash of one name.
+    '''
+    return int.from_bytes(
+        hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(),
+        'little')
+
+
+def _combine_digests(stats) -> str:
+    '''
+    Combine the digests of the names per state to the digest of the project.
+
+    Attributes:
+        stats: an iterable of (state, sum of the hashes of its names).
+    Returns:
+        The digest as hexadecimal string.
+    '''
+    total = 0
+    for state, digest in stats:
+        total += int.from_bytes(
+            hashlib.blake2b(state.encode('utf-8') + b'\0' +
+                            (digest % kDigestModulus).to_bytes(8, 'little'),
+                            digest_size=8).digest(), 'little')
+    return f'{total % kDigestModulus:016x}'
+
+
+def _get_chunked_names(operation: str, parameters: dict) -> tuple:
+    '''
+    Get the names of the items of one chunked operation in their order.
+
+    Attributes:
+        operation: one of kChunkedOperations.
+        parameters: the parameters of the operation.
+    Returns:
+        The array of names.
+    '''
+    return tuple(parameters['content'] if operation ==
+                 'add' else parameters['names'])
+
+
+def _get_chunk(operation: str, parameters: dict, names: list) -> dict:
+    '''
+    Get the parameters of one chunked operation for some of its names.
+
+    Attributes:
+        operation: one of kChunkedOperations.
+        parameters: the parameters of the operation.
+        names: the names of the chunk.
+    Returns:
+        The parameters for the operation.
+    '''
+    if operation == 'add':
+        return dict(parameters,
+                    content={n: parameters['content'][n]
+                             for n in names})
+    return dict(parameters, names=tuple(names))
+
+
+def _atomic(method):
+    '''
+    Run one operation in one transaction which holds the write lock from its checks to its changes,
+    so that another window can't change the names in between.
+    '''
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        with self.transaction():
+            return method(self, *args, **kwargs)
+
+    return wrapped
+
+def read_digest(path: str) -> str:
+    '''
+    Read the digest of one project database without opening it for writing,
+    e.g. for comparing a backup with its project.
+
+    Attributes:
+        path: path for the *.db file.
+    Returns:
+        The digest as hexadecimal string, None if the database has no digest.
+    '''
+    uri = pathlib.Path(os.path.abspath(path)).as_uri()
+    conn = sqlite3.connect(f'{uri}?mode=ro', uri=True)
+    try:
+        for table in (kTableDict, kTableLegacyStats):
+            try:
+                return _combine_digests(
+                    conn.execute(f'SELECT state, digest FROM {table} '
+                                 'WHERE count > 0;'))
+            except sqlite3.OperationalError:
+                pass
+        return None
+    finally:
+        conn.close()
 
 
 class StateContainer(object):
@@ -14,108 +200,1407 @@ class StateContainer(object):
 
     Attributes:
         path: path for the *.db file for sqlite3. The logs will be beside it.
+        catalog: path for the *.db file of the project catalog, which is updated on each commit.
+        read_only: when it is true, the database is opened for reading only, e.g. for reports.
     '''
-    def __init__(self, path: str):
+    def __init__(self,
+                 path: str,
+                 catalog: str = None,
+                 read_only: bool = False,
+                 immutable: bool = False,
+                 mmap_size: int = None,
+                 cache_size: int = None,
+                 journal: str = None):
         '''
         Constructor, it initilizes the database when it is not available.
 
         Attributes:
             path: path for the *.db file for sqlite3. The logs will be beside it.
+            catalog: path for the *.db file of the project catalog, which is updated on each commit.
+                The project is named after the directory of path.
+            read_only: when it is true, the database is opened with mode "ro" and no write is possible;
+                no table or log directory is created, so the database should be opened once for writing before.
+            immutable: with read_only, the file is assumed not to change, sqlite3 skips all locking.
+                Only safe when no other program writes it, e.g. for backups.
+            mmap_size: size in bytes of memory-mapped I/O, by default kReadOnlyMmapSize for read_only.
+            cache_size: size in KiB of the page cache, by default kReadOnlyCacheSize for read_only.
+            journal: when it is given, the actions are logged in one journal file by a background thread
+                instead of one file per action, with this durability from journal_writer.kDurabilities;
+                close the container to write the queued logs.
         '''
         self._path = path
         self._dir = os.path.dirname(os.path.realpath(path))
         self._log_dir = os.path.join(self._dir, 'logs')
-        self._conn = sqlite3.connect(path)
-        cursor = self._conn.cursor()
-        if not self.is_table_available():
-            cursor.execute(f'CREATE TABLE {kTable} (name text, state text);')
+        self._read_only = read_only
+        self._depth = 0
+        self._writes = 0
+        # databases attached for merge, they are detached when the transaction ends
+        self._attached = []
+        # logs of the actions which are not committed yet, with the actions
+        self._pending_logs = []
+        # [name, id] of the operation for undo which groups the operations of one transaction
+        self._undo_group = None
+        # id of the operation for undo which was recorded last, the changes of attributes are added to it
+        self._last_op = None
+        # whether the trigram index for fuzzy matching is available, None when it is not checked yet
+        self._trigram_index = None
+        # results of filter_states per filter, tagged with the data version
+        self._query_cache = query_cache.QueryCache()
+        # the writer of the journal, None when each action is logged in its own file
+        self._journal_writer = None
+        # whether one chunk of a chunked operation runs, its actions are logged with the chunked operation only
+        self._in_chunk = False
+        if read_only:
+            assert os.path.isfile(path), f'{path} not available'
+            uri = pathlib.Path(os.path.abspath(path)).as_uri()
+            self._conn = sqlite3.connect(
+                f'{uri}?mode=ro' + ('&immutable=1' if immutable else ''),
+                uri=True)
+            self._conn.execute('PRAGMA query_only=1;')
+            if mmap_size is None:
+                mmap_size = kReadOnlyMmapSize
+            if cache_size is None:
+                cache_size = kReadOnlyCacheSize
+        else:
+            assert not immutable, 'only read-only databases can be immutable'
+            self._conn = sqlite3.connect(path)
+            # only for new databases: free pages can be given back without rebuilding, see db_maintenance
+            self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL;')
+        if mmap_size is not None:
+            self._conn.execute(f'PRAGMA mmap_size={int(mmap_size)};')
+        if cache_size is not None:
+            self._conn.execute(f'PRAGMA cache_size={-int(cache_size)};')
+        self._catalog = project_catalog.ProjectCatalog(
+            catalog) if catalog is not None and not read_only else None
+        if read_only:
+            assert self._is_available(kTableItems), \
+                f'{path} is not initialized, open it for writing once'
+        else:
+            self._init_tables()
+            if journal is not None:
+                self._journal_writer = journal_writer.JournalWriter(
+                    self._log_dir, durability=journal)
+
+    def _init_tables(self):
+        '''
+        Create the tables which are not available and the log directory.
+        '''
+        if not self._is_available(kTableItems):
+            self._migrate()
+        if not self._is_available(kTableStateIds):
+            self._conn.cursor().execute(
+                f'CREATE TABLE {kTableStateIds} (id integer PRIMARY KEY, '
+                'state text UNIQUE NOT NULL);')
+            self._conn.commit()
+        if not self._is_available(kTableUndoOps):
+            cursor = self._conn.cursor()
+            cursor.execute(f'CREATE TABLE {kTableUndoOps} (id integer '
+                           'PRIMARY KEY, action text, undone integer, '
+                           'size integer NOT NULL DEFAULT 0);')
+            self._create_undo_changes()
+            self._conn.commit()
+        elif self._has_column(kTableUndoChanges, 'old_state'):
+            self._migrate_undo()
+        if not self._is_available(kTableChangeLog):
+            self._create_change_log()
+            self._conn.commit()
+        elif self._has_column(kTableChangeLog, 'old_state'):
+            self._migrate_change_log()
+        if not self._is_available(kTableFuzzyKeys):
+            self._create_fuzzy_index()
+        elif self._has_unique_names():
+            self._create_fuzzy_index(rebuild=True)
+        if not self._is_available(kTableAttributes):
+            cursor = self._conn.cursor()
+            cursor.execute(f'CREATE TABLE {kTableAttributeKinds} (attribute '
+                           'text PRIMARY KEY, kind text NOT NULL);')
+            # the values have no type affinity, so integers compare as integers and texts as texts
+            cursor.execute(f'CREATE TABLE {kTableAttributes} (name text, '
+                           'attribute text, value, PRIMARY KEY (name, '
+                           'attribute)) WITHOUT ROWID;')
+            cursor.execute(f'CREATE INDEX {kTableAttributes}_value ON '
+                           f'{kTableAttributes} (attribute, value);')
+            cursor.execute(f'CREATE TABLE {kTableUndoAttributes} (op_id '
+                           'integer, name text, attribute text, old_value, '
+                           'new_value);')
+            cursor.execute(f'CREATE INDEX {kTableUndoAttributes}_op ON '
+                           f'{kTableUndoAttributes} (op_id);')
+            self._conn.commit()
+        if not self._is_available(kTableCheckpoints):
+            self._conn.cursor().execute(
+                f'CREATE TABLE {kTableCheckpoints} (id text PRIMARY KEY, '
+                'action text NOT NULL, done integer NOT NULL, op_id integer);')
+            self._conn.commit()
+        if not self._is_available(kTableSets):
+            cursor = self._conn.cursor()
+            # the ids are not reused, so that a set can be replaced by a combination of itself
+            cursor.execute(f'CREATE TABLE {kTableSets} (id integer PRIMARY KEY '
+                           'AUTOINCREMENT, name text UNIQUE NOT NULL);')
+            cursor.execute(f'CREATE TABLE {kTableSetNames} (set_id integer, '
+                           'name text, PRIMARY KEY (set_id, name)) WITHOUT ROWID;')
+            self._conn.commit()
         if not os.path.isdir(self._log_dir):
             os.mkdir(self._log_dir)
 
+    def _has_column(self, table: str, column: str) -> bool:
+        '''
+        Check whether one table has one column, e.g. to find the tables of older versions.
+        '''
+        return any(row[1] == column for row in self._conn.cursor().execute(
+            f'PRAGMA table_info({table});'))
+
+    def _create_undo_changes(self):
+        '''
+        Create the table for the changes of the operations for undo, in the open transaction.
+        The rows are ordered by operation, so that no further index is needed, and the states are ids from kTableStateIds.
+        '''
+        self._conn.cursor().execute(
+            f'CREATE TABLE {kTableUndoChanges} (op_id integer, seq integer, '
+            'name text, old_id integer, new_id integer, PRIMARY KEY (op_id, '
+            'seq)) WITHOUT ROWID;')
+
+    def _migrate_undo(self):
+        '''
+        Move the changes for undo of older versions, with the states as text, into the table with ids of states.
+        All is done in one transaction, an interrupted migration is started again on the next opening.
+        '''
+        cursor = self._conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE;')
+        try:
+            cursor.execute(
+                f'INSERT OR IGNORE INTO {kTableStateIds} (state) SELECT old_state '
+                f'FROM {kTableUndoChanges} WHERE old_state IS NOT NULL UNION '
+                f'SELECT new_state FROM {kTableUndoChanges} WHERE new_state IS '
+                'NOT NULL;')
+            cursor.execute(f'ALTER TABLE {kTableUndoChanges} RENAME TO '
+                           f'{kTableUndoChanges}_legacy;')
+            cursor.execute(f'DROP INDEX IF EXISTS {kTableUndoChanges}_op;')
+            self._create_undo_changes()
+            cursor.execute(
+                f'INSERT INTO {kTableUndoChanges} SELECT u.op_id, ROW_NUMBER() '
+                'OVER (PARTITION BY u.op_id ORDER BY u.rowid), u.name, o.id, '
+                f'n.id FROM {kTableUndoChanges}_legacy u LEFT JOIN '
+                f'{kTableStateIds} o ON o.state = u.old_state LEFT JOIN '
+                f'{kTableStateIds} n ON n.state = u.new_state;')
+            cursor.execute(f'DROP TABLE {kTableUndoChanges}_legacy;')
+            cursor.execute(f'ALTER TABLE {kTableUndoOps} ADD COLUMN size '
+                           'integer NOT NULL DEFAULT 0;')
+            cursor.execute(
+                f'UPDATE {kTableUndoOps} SET size=(SELECT COUNT(*) FROM '
+                f'{kTableUndoChanges} WHERE op_id={kTableUndoOps}.id);')
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+
+    def _create_change_log(self):
+        '''
+        Create the table for the change log, in the open transaction; the states are ids from kTableStateIds.
+        '''
+        self._conn.cursor().execute(
+            f'CREATE TABLE {kTableChangeLog} (seq integer PRIMARY KEY '
+            'AUTOINCREMENT, name text, old_id integer, new_id integer);')
+
+    def _migrate_change_log(self):
+        '''
+        Move the change log of older versions, with the states as text, into the table with ids of states.
+        The sequence numbers are kept, so that the views of other connections are still patched.
+        '''
+        cursor = self._conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE;')
+        try:
+            cursor.execute(
+                f'INSERT OR IGNORE INTO {kTableStateIds} (state) SELECT old_state '
+                f'FROM {kTableChangeLog} WHERE old_state IS NOT NULL UNION '
+                f'SELECT state FROM {kTableChangeLog} WHERE state IS NOT NULL;')
+            cursor.execute(f'ALTER TABLE {kTableChangeLog} RENAME TO '
+                           f'{kTableChangeLog}_legacy;')
+            self._create_change_log()
+            cursor.execute(
+                f'INSERT INTO {kTableChangeLog} SELECT c.seq, c.name, o.id, '
+                f'n.id FROM {kTableChangeLog}_legacy c LEFT JOIN '
+                f'{kTableStateIds} o ON o.state = c.old_state LEFT JOIN '
+                f'{kTableStateIds} n ON n.state = c.state;')
+            # the next sequence number continues after the dropped changes too
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name=?;',
+                           (kTableChangeLog, ))
+            cursor.execute('UPDATE sqlite_sequence SET name=? WHERE name=?;',
+                           (kTableChangeLog, f'{kTableChangeLog}_legacy'))
+            cursor.execute(f'DROP TABLE {kTableChangeLog}_legacy;')
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+
+    def _migrate(self):
+        '''
+        Create the tables for names and interned states, the names and states from
+        the table "states" of older versions are moved into them.
+        "states" becomes a view with the same columns, so that reading stays the same.
+        All is done in one transaction, an interrupted migration is started again on the next opening.
+        '''
+        cursor = self._conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE;')
+        try:
+            self._create_tables()
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+
+    def _create_tables(self):
+        '''
+        Create the tables for names and interned states in the open transaction, see _migrate.
+        '''
+        cursor = self._conn.cursor()
+        cursor.execute(f'CREATE TABLE {kTableDict} (id integer PRIMARY KEY, '
+                       'state text UNIQUE NOT NULL, count integer NOT NULL, '
+                       'digest integer NOT NULL);')
+        cursor.execute(f'CREATE TABLE {kTableItems} (name text PRIMARY KEY, '
+                       'state_id integer NOT NULL) WITHOUT ROWID;')
+        cursor.execute(
+            f'CREATE INDEX {kIndexState} ON {kTableItems} (state_id);')
+        if self._is_available(kTable):
+            cursor.execute(f'INSERT INTO {kTableDict} (state, count, digest) '
+                           f'SELECT DISTINCT state, 0, 0 FROM {kTable};')
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {kTableItems} SELECT s.name, d.id '
+                f'FROM {kTable} s JOIN {kTableDict} d ON d.state = s.state;')
+            cursor.execute(f'DROP TABLE {kTable};')
+        cursor.execute(f'DROP TABLE IF EXISTS {kTableLegacyStats};')
+        cursor.execute(
+            f'CREATE VIEW {kTable} AS SELECT i.name AS name, d.state AS state '
+            f'FROM {kTableItems} i JOIN {kTableDict} d ON d.id = i.state_id;')
+        self._rebuild_stats()
+
+    def _create_fuzzy_index(self, rebuild: bool = False):
+        '''
+        Create the tables for fuzzy matching and index the available names in one transaction.
+        Without FTS5 in sqlite3 there is no trigram index and only the names with the same key are suggested.
+        The keys are ordered by (key, name), the key of a name is known, so that only the ids for the trigram index need an index.
+
+        Attributes:
+            rebuild: whether the tables of older versions are dropped first.
+        '''
+        cursor = self._conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE;')
+        try:
+            if rebuild:
+                for table in (kTableTrigramCounts, kTableTrigrams,
+                              kTableFuzzyKeys):
+                    cursor.execute(f'DROP TABLE IF EXISTS {table};')
+            cursor.execute(f'CREATE TABLE {kTableFuzzyKeys} (key text, name '
+                           'text, id integer NOT NULL, PRIMARY KEY (key, name)) '
+                           'WITHOUT ROWID;')
+            cursor.execute(f'CREATE UNIQUE INDEX {kTableFuzzyKeys}_id ON '
+                           f'{kTableFuzzyKeys} (id);')
+            try:
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE {kTableTrigrams} USING fts5(key, '
+                    f'content={kTableFuzzyKeys}, content_rowid=id, '
+                    'tokenize=trigram, detail=none);')
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE {kTableTrigramCounts} USING '
+                    f'fts5vocab({kTableTrigrams}, row);')
+            except sqlite3.OperationalError:
+                pass
+            self._trigram_index = None
+            self._index_names(
+                tuple(name for name, in self._conn.cursor().execute(
+                    f'SELECT name FROM {kTableItems};')), tuple())
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+
+    def _has_unique_names(self) -> bool:
+        '''
+        Check whether the keys for fuzzy matching are from older versions, with an index on the names.
+        '''
+        return any(row[3] == 'u' for row in self._conn.cursor().execute(
+            f'PRAGMA index_list({kTableFuzzyKeys});'))
+
+    def _has_trigram_index(self) -> bool:
+        '''
+        Checks whether the trigram index is available, it is checked once.
+        '''
+        if self._trigram_index is None:
+            self._trigram_index = self._is_available(kTableTrigrams)
+        return self._trigram_index
+
     def __del__(self):
         '''
-        Destructor, it just closes the connection.
+        Destructor, it writes the queued logs and closes the connection.
+        '''
+        if getattr(self, '_journal_writer', None) is not None:
+            self._journal_writer.close()
+        if hasattr(self, '_conn'):
+            self._conn.close()
+
+    def close(self):
+        '''
+        Write the queued logs of the journal and close the connection, closing twice does nothing.
         '''
+        if self._journal_writer is not None:
+            self._journal_writer.close()
+            self._journal_writer = None
+        if not self._read_only:
+            try:
+                # update the statistics of the tables the queries of this connection may benefit from
+                self._conn.execute('PRAGMA optimize;')
+            except sqlite3.Error:
+                # closed before, or locked by another connection
+                pass
         self._conn.close()
 
     def log_action(self, action: dict):
         '''
-        Log one dictionary with the information to one action.
+        Log one dictionary with the information to one action.
+
+        Attributes:
+            action: one dict which should contain all information one action brings.
+        '''
+        assert not self._read_only, f'{self._path} is opened read-only'
+        if self._in_chunk:
+            return
+        if self._journal_writer is not None:
+            # the timestamp identifies the log in the journal
+            path = self._journal_writer.append(action)
+        else:
+            log_text = json.dumps(action, indent=' ')
+            path = os.path.join(
+                self._log_dir,
+                str(datetime.datetime.now()).replace(' ', 'T').replace(
+                    ':', '-') + log_archive.kLogExtension)
+            with open(path, 'w') as fs:
+                fs.write(log_text)
+        if action.get('doable', True):
+            self._pending_logs.append((path, action))
+
+    @contextlib.contextmanager
+    def transaction(self, undo_group: str = None):
+        '''
+        Group the operations inside the with-block into one transaction.
+        The changes are committed when the block finishes and rolled back when it raises.
+
+        Attributes:
+            undo_group: when it is given, the operations inside are recorded as one operation
+                with this name, so that one undo reverts all of them.
+        '''
+        self._depth += 1
+        if self._depth == 1 and not self._read_only:
+            self._begin()
+        if undo_group is not None and self._undo_group is None:
+            self._undo_group = [undo_group, None]
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self._undo_group = None
+                self._rollback()
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self._undo_group = None
+        self._commit()
+
+    def _commit(self):
+        '''
+        Commit the pending changes, unless they belong to an open transaction.
+        '''
+        if self._depth == 0:
+            # the logs of the actions are written before the changes are committed
+            if self._journal_writer is not None:
+                self._journal_writer.wait_commit()
+            self._conn.commit()
+            self._detach()
+            self._pending_logs.clear()
+            self._writes += 1
+            if self._catalog is not None:
+                self.update_catalog()
+
+    def _rollback(self):
+        '''
+        Discard the pending changes, their logs are marked as not doable so that they are not replayed.
+        '''
+        self._conn.rollback()
+        self._detach()
+        if self._journal_writer is not None:
+            self._journal_writer.mark_rolled_back(
+                tuple(path for path, _ in self._pending_logs))
+        else:
+            for path, action in self._pending_logs:
+                with open(path, 'w') as fs:
+                    fs.write(
+                        json.dumps(dict(action, doable=False,
+                                        rolled_back=True),
+                                   indent=' '))
+        self._pending_logs.clear()
+
+    def _detach(self):
+        '''
+        Detach the databases attached for merge, it is only possible when no transaction is open.
+        '''
+        for alias in self._attached:
+            self._conn.cursor().execute(f'DETACH DATABASE {alias};')
+        self._attached.clear()
+
+    def update_catalog(self):
+        '''
+        Write the statistics of this project to the catalog.
+        '''
+        assert self._catalog is not None, 'no catalog for this project'
+        self._catalog.update(os.path.basename(self._dir), self._path,
+                             self.count_states())
+
+    def _write_changes(self, changes: list, action: str = None):
+        '''
+        Apply the changes to the table in batches and commit.
+
+        Attributes:
+            changes: an array of (name, original state, new state); None as original state means
+                the name is inserted, None as new state means the name is deleted.
+            action: when it is given, the changes are recorded as one operation for undo.
+                The original states are read again in the transaction, so that the counts and
+                digests stay right when another window changed the names after they were consulted.
+        '''
+        self._begin()
+        try:
+            self._apply_changes(changes, action)
+        except BaseException:
+            if self._depth == 0:
+                self._rollback()
+            raise
+        self._commit()
+
+    def _begin(self):
+        '''
+        Start a transaction which holds the write lock, unless one is open.
+        '''
+        if not self._conn.in_transaction:
+            self._conn.cursor().execute('BEGIN IMMEDIATE;')
+
+    def _apply_changes(self, changes: list, action: str = None):
+        '''
+        Apply the changes to the table in batches without committing, see _write_changes.
+        '''
+        current = self._lookup(tuple(n for n, _, _ in changes))
+        changes = tuple((n, current.get(n), s) for n, _, s in changes
+                        if current.get(n) != s)
+        if action is not None:
+            self._record_undo(action, changes)
+        self._record_change_log(changes)
+        counts = collections.Counter()
+        digests = collections.Counter()
+        for n, e, s in changes:
+            h = _hash_name(n)
+            counts[e] -= 1
+            counts[s] += 1
+            digests[e] -= h
+            digests[s] += h
+        states = tuple(state for state in counts if state is not None)
+        cursor = self._conn.cursor()
+        cursor.executemany(
+            f'INSERT OR IGNORE INTO {kTableDict} (state, count, digest) '
+            'VALUES (?, 0, 0);', ((state, ) for state in states))
+        stats = dict()
+        for begin in range(0, len(states), kBatchSize):
+            batch = states[begin:begin + kBatchSize]
+            stats.update((state, (i, count, digest))
+                         for i, state, count, digest in cursor.execute(
+                             f'SELECT id, state, count, digest FROM '
+                             f'{kTableDict} WHERE state IN '
+                             f'({",".join("?" * len(batch))});', batch))
+
+        cursor.executemany(f'INSERT INTO {kTableItems} VALUES (?, ?);',
+                           ((n, stats[s][0])
+                            for n, e, s in changes if e is None))
+        cursor.executemany(f'UPDATE {kTableItems} SET state_id=? WHERE name=?;',
+                           ((stats[s][0], n) for n, e, s in changes
+                            if e is not None and s is not None))
+        cursor.executemany(f'DELETE FROM {kTableItems} WHERE name=?;',
+                           ((n, ) for n, e, s in changes if s is None))
+        self._index_names(tuple(n for n, e, _ in changes if e is None),
+                          tuple(n for n, _, s in changes if s is None))
+        self._write_stats(
+            tuple((state, count + counts[state], digest + digests[state])
+                  for state, (_, count, digest) in stats.items()))
+
+    def _index_names(self, inserted: list, deleted: list):
+        '''
+        Update the keys and the trigram index for fuzzy matching with the inserted and deleted names.
+
+        Attributes:
+            inserted: an array of the names which are inserted.
+            deleted: an array of the names which are deleted.
+        '''
+        cursor = self._conn.cursor()
+        deleted = tuple((fuzzy_index.normalize(n), n) for n in deleted)
+        if bool(deleted) and self._has_trigram_index():
+            rows = []
+            for key, name in deleted:
+                rows.extend(
+                    cursor.execute(
+                        f'SELECT id, key FROM {kTableFuzzyKeys} WHERE key=? '
+                        'AND name=?;', (key, name)))
+            cursor.executemany(
+                f'INSERT INTO {kTableTrigrams} ({kTableTrigrams}, rowid, '
+                'key) VALUES ("delete", ?, ?);', rows)
+        cursor.executemany(
+            f'DELETE FROM {kTableFuzzyKeys} WHERE key=? AND name=?;', deleted)
+        if not bool(inserted):
+            return
+        # the new ids are above the largest one
+        last, = cursor.execute(
+            f'SELECT COALESCE(MAX(id), 0) FROM {kTableFuzzyKeys};').fetchone()
+        cursor.executemany(
+            f'INSERT INTO {kTableFuzzyKeys} VALUES (?, ?, ?);',
+            ((fuzzy_index.normalize(n), n, last + i)
+             for i, n in enumerate(inserted, 1)))
+        if self._has_trigram_index():
+            cursor.execute(
+                f'INSERT INTO {kTableTrigrams} (rowid, key) SELECT id, key '
+                f'FROM {kTableFuzzyKeys} WHERE id>?;', (last, ))
+
+    def _record_undo(self, action: str, changes: list):
+        '''
+        Record the changes of one operation for undo, the operations which were undone can't be redone anymore.
+
+        Attributes:
+            action: name of the operation.
+            changes: an array of (name, original state, new state); None as name means
+                the original state is renamed to the new state.
+        '''
+        cursor = self._conn.cursor()
+        if self._undo_group is not None and self._undo_group[1] is not None:
+            self._last_op = self._undo_group[1]
+            self._insert_undo_changes(self._undo_group[1], changes)
+            return
+        if self._undo_group is not None:
+            action = self._undo_group[0]
+        self._drop_undo_ops('undone=1')
+        op_id = cursor.execute(
+            f'INSERT INTO {kTableUndoOps} (action, undone) VALUES (?, 0);',
+            (action, )).lastrowid
+        self._last_op = op_id
+        if self._undo_group is not None:
+            self._undo_group[1] = op_id
+        self._insert_undo_changes(op_id, changes)
+
+    def _insert_undo_changes(self, op_id: int, changes: list):
+        '''
+        Append changes to one operation for undo and drop the oldest operations above kUndoDepth and kUndoSize.
+
+        Attributes:
+            op_id: id of the operation.
+            changes: an array of (name, original state, new state), see _record_undo.
+        '''
+        changes = tuple(changes)
+        cursor = self._conn.cursor()
+        ids = self._intern_states(s for _, e, n in changes for s in (e, n))
+        size, = cursor.execute(f'SELECT size FROM {kTableUndoOps} WHERE id=?;',
+                               (op_id, )).fetchone()
+        cursor.executemany(
+            f'INSERT INTO {kTableUndoChanges} VALUES (?, ?, ?, ?, ?);',
+            ((op_id, size + i, n, ids.get(e), ids.get(s))
+             for i, (n, e, s) in enumerate(changes, 1)))
+        cursor.execute(f'UPDATE {kTableUndoOps} SET size=? WHERE id=?;',
+                       (size + len(changes), op_id))
+        # the newest operations are kept while their changes fit, at least the last one
+        total = 0
+        for other, other_size in cursor.execute(
+                f'SELECT id, size FROM {kTableUndoOps} WHERE id<=? ORDER BY '
+                'id DESC LIMIT ?;', (op_id, kUndoDepth)).fetchall():
+            total += other_size
+            if total > kUndoSize and other != op_id:
+                self._drop_undo_ops('id<=?', (other, ))
+                return
+        self._drop_undo_ops('id<=?', (op_id - kUndoDepth, ))
+
+    def _drop_undo_ops(self, condition: str, parameters: tuple = tuple()):
+        '''
+        Delete the operations for undo which fulfill one condition on kTableUndoOps, with their changes.
+        '''
+        cursor = self._conn.cursor()
+        for table in (kTableUndoChanges, kTableUndoAttributes):
+            cursor.execute(
+                f'DELETE FROM {table} WHERE op_id IN '
+                f'(SELECT id FROM {kTableUndoOps} WHERE {condition});',
+                parameters)
+        cursor.execute(f'DELETE FROM {kTableUndoOps} WHERE {condition};',
+                       parameters)
+
+    def _intern_states(self, states) -> dict:
+        '''
+        Get the ids of states in kTableStateIds, the states which are not there yet are added.
+
+        Attributes:
+            states: the states, None is skipped.
+        Returns:
+            A dict with state as key and id as value.
+        '''
+        states = tuple(set(s for s in states if s is not None))
+        cursor = self._conn.cursor()
+        cursor.executemany(
+            f'INSERT OR IGNORE INTO {kTableStateIds} (state) VALUES (?);',
+            ((state, ) for state in states))
+        ids = dict()
+        for begin in range(0, len(states), kBatchSize):
+            batch = states[begin:begin + kBatchSize]
+            ids.update((state, i) for i, state in cursor.execute(
+                f'SELECT id, state FROM {kTableStateIds} WHERE state IN '
+                f'({",".join("?" * len(batch))});', batch))
+        return ids
+
+    def _record_change_log(self, changes: list):
+        '''
+        Append the changes to the change log and drop the oldest ones above its size.
+
+        Attributes:
+            changes: an array of (name, original state, new state); None as name means
+                the original state is renamed to the new state.
+        '''
+        changes = tuple(changes)
+        if not bool(changes):
+            return
+        cursor = self._conn.cursor()
+        ids = self._intern_states(s for _, e, n in changes for s in (e, n))
+        cursor.executemany(
+            f'INSERT INTO {kTableChangeLog} (name, old_id, new_id) '
+            'VALUES (?, ?, ?);',
+            ((n, ids.get(e), ids.get(s)) for n, e, s in changes))
+        cursor.execute(f'DELETE FROM {kTableChangeLog} WHERE seq<=?;',
+                       (self.change_sequence() - kChangeLogSize, ))
+
+    def data_version(self) -> tuple:
+        '''
+        Get a cheap token which changes whenever this or another connection commits to the database.
+
+        Returns:
+            A tuple, comparable with the one from an earlier call.
+        '''
+        return self._conn.cursor().execute(
+            'PRAGMA data_version;').fetchone()[0], self._writes
+
+    def change_sequence(self) -> int:
+        '''
+        Get the sequence number of the last change, to use with changes_since.
+
+        Returns:
+            The sequence number, 0 when nothing is changed.
+        '''
+        return self._conn.cursor().execute(
+            f'SELECT COALESCE(MAX(seq), 0) FROM {kTableChangeLog};').fetchone(
+            )[0]
+
+    def changes_since(self, seq: int, limit: int = None) -> (int, list):
+        '''
+        Get the changes after one sequence number from the change log.
+
+        Attributes:
+            seq: the sequence number of the last known change.
+            limit: when there are more changes than it, no change is returned.
+        Returns:
+            (seq, changes): seq is the sequence number of the last change; changes is an array of
+                (name, original state, new state) in order, None as new state for removed names and
+                None as name for renaming the original state; changes is None when they are not
+                all in the change log anymore or more than limit, then the view should be rebuilt.
+        '''
+        cursor = self._conn.cursor()
+        first, last = cursor.execute(
+            f'SELECT MIN(seq), MAX(seq) FROM {kTableChangeLog};').fetchone()
+        if first is None or last <= seq:
+            return seq, tuple()
+        if first > seq + 1 or (limit is not None and last - seq > limit):
+            return last, None
+        return last, tuple(
+            cursor.execute(
+                f'SELECT c.name, o.state, n.state FROM {kTableChangeLog} c '
+                f'LEFT JOIN {kTableStateIds} o ON o.id = c.old_id LEFT JOIN '
+                f'{kTableStateIds} n ON n.id = c.new_id WHERE c.seq>? AND '
+                'c.seq<=? ORDER BY c.seq;', (seq, last)))
+
+    def refresh_view(self,
+                     view: dict,
+                     seq: int,
+                     names: list = None,
+                     states: list = None,
+                     patched: dict = None) -> (int, bool):
+        '''
+        Patch the result of get_states with the changes since it was read, without running the filter again.
+        The same "or" logic of get_states is applied to the changed names only.
+
+        Attributes:
+            view: a dict with name as key and state as value, it is patched in place.
+            seq: the sequence number of the last change in view, from change_sequence before reading it.
+            names: the names for filtering the view as in get_states.
+            states: the states for filtering the view as in get_states.
+            patched: when it is given, the names changed in view are put in it with (old state, new state),
+                None for names which were not or are no more in view; it stays empty when view is rebuilt.
+        Returns:
+            (seq, changed): seq is the sequence number of the last change now in view;
+                changed is true if view is patched or rebuilt.
+        '''
+        last, changes = self.changes_since(seq, limit=kViewRefreshLimit)
+        if changes is None:
+            view.clear()
+            view.update(self.get_states(names=names, states=states))
+            return last, True
+        before = dict()
+        names = set(names) if names is not None and bool(names) else None
+        states = set(states) if states is not None and bool(states) else None
+
+        def matches(name: str, state: str) -> bool:
+            if names is None and states is None:
+                return True
+            return (names is not None and name in names) or (states is not None
+                                                             and state in states)
+
+        for name, old_state, state in changes:
+            if name is not None:
+                before.setdefault(name, view.get(name))
+                if state is not None and matches(name, state):
+                    view[name] = state
+                else:
+                    view.pop(name, None)
+                continue
+            # one state is renamed
+            for renamed in tuple(n for n, s in view.items() if s == old_state):
+                before.setdefault(renamed, view[renamed])
+                if matches(renamed, state):
+                    view[renamed] = state
+                else:
+                    del view[renamed]
+            if states is not None and state in states and old_state not in states:
+                for renamed, _ in self.get_states(states=(state, )):
+                    before.setdefault(renamed, view.get(renamed))
+                    view[renamed] = state
+        if patched is not None:
+            patched.update((n, (e, view.get(n))) for n, e in before.items()
+                           if e != view.get(n))
+        return last, bool(changes)
+
+    def _write_stats(self, stats: list):
+        '''
+        Write the count and digest for states, the states without names are deleted
+        unless a name still refers to them.
+
+        Attributes:
+            stats: an array of (state, count, digest).
+        '''
+        cursor = self._conn.cursor()
+        cursor.executemany(
+            f'INSERT INTO {kTableDict} (state, count, digest) VALUES (?, ?, ?) '
+            'ON CONFLICT (state) DO UPDATE SET count=excluded.count, '
+            'digest=excluded.digest;',
+            ((state, count, _to_signed(digest))
+             for state, count, digest in stats))
+        cursor.executemany(
+            f'DELETE FROM {kTableDict} WHERE state=? AND count<=0 AND NOT '
+            f'EXISTS (SELECT 1 FROM {kTableItems} WHERE state_id={kTableDict}.id);',
+            ((state, ) for state, count, _ in stats if count <= 0))
+
+    def _compute_stats(self) -> dict:
+        '''
+        Compute the count and digest per state with a full scan of the table.
+
+        Returns:
+            A dict with state as key and (count, digest) as value.
+        '''
+        stats = collections.defaultdict(lambda: (0, 0))
+        for name, state in self._conn.cursor().execute(
+                f'SELECT name, state FROM {kTable};'):
+            count, digest = stats[state]
+            stats[state] = (count + 1, digest + _hash_name(name))
+        return stats
+
+    def _rebuild_stats(self):
+        '''
+        Rebuild the count and digest per state from the names.
+        '''
+        stats = self._compute_stats()
+        self._conn.cursor().execute(
+            f'UPDATE {kTableDict} SET count=0, digest=0;')
+        self._write_stats(
+            tuple((state, count, digest)
+                  for state, (count, digest) in stats.items()))
+        self._conn.cursor().execute(
+            f'DELETE FROM {kTableDict} WHERE count<=0 AND NOT EXISTS (SELECT 1 '
+            f'FROM {kTableItems} WHERE state_id={kTableDict}.id);')
+
+    def digest(self) -> str:
+        '''
+        Get the digest of all name-state pairs, it doesn't depend on the order and
+        is kept up to date on each change, so comparing two projects doesn't need a scan.
+
+        Returns:
+            The digest as hexadecimal string.
+        '''
+        return _combine_digests(self._conn.cursor().execute(
+            f'SELECT state, digest FROM {kTableDict} WHERE count > 0;'))
+
+    def compute_digest(self) -> str:
+        '''
+        Compute the digest with a full scan, to check the integrity against digest.
+
+        Returns:
+            The digest as hexadecimal string.
+        '''
+        return _combine_digests(
+            (state, digest)
+            for state, (_, digest) in self._compute_stats().items())
+
+    def _is_available(self, table: str) -> bool:
+        '''
+        Checks whether one table or view is created.
+
+        Attributes:
+            table: name of the table or view.
+        '''
+        return (table, ) in tuple(self._conn.cursor().execute(
+            'SELECT name FROM sqlite_master WHERE type IN ("table", "view");'))
+
+    def is_table_available(self) -> bool:
+        '''
+        Checks whether the table for this program is created.
+
+        Now it is "states". I don't see how it can be changed because this software is for ME.
+        '''
+        return self._is_available(kTable)
+
+    def count_states(self) -> dict:
+        '''
+        Get the count of names per state, it is kept up to date on each change.
+
+        Returns:
+            A dict with state as key and the count of names as value.
+        '''
+        return dict(self._conn.cursor().execute(
+            f'SELECT state, count FROM {kTableDict} WHERE count > 0;'))
+
+    def read_state(self, name: str) -> str:
+        '''
+        Get the state for one name.
+
+        Attributes:
+            name: one name.
+        Returns:
+            Its state if the name is given, or None.
+        '''
+        cursor = self._conn.cursor()
+        result = tuple(
+            cursor.execute(
+                f'SELECT state FROM {kTable} WHERE name=="{name}";'))
+        assert len(result) <= 1, f'duplicate result for name {name}'
+        return result[0][0] if len(result) > 0 else None
+
+    def consult(self, names: list) -> list:
+        '''
+        Get the states for a name list.
+
+        Attributes:
+            names: one list or array of names.
+        Returns:
+            The states for the names; when a name cannot be found in database, None is returned in its place.
+        '''
+        assert all(type(name) == str
+                   for name in names), 'wrong parameter in consult'
+        found = self._lookup(names)
+        return tuple(found.get(name) for name in names)
+
+    def _lookup(self, names: list) -> dict:
+        '''
+        Get the states for a name list with batched queries.
+
+        Attributes:
+            names: one list or array of names.
+        Returns:
+            A dict with the found names as key and their states as value.
+        '''
+        names = tuple(set(names))
+        cursor = self._conn.cursor()
+        found = dict()
+        for begin in range(0, len(names), kBatchSize):
+            batch = names[begin:begin + kBatchSize]
+            found.update(
+                cursor.execute(
+                    f'SELECT name, state FROM {kTable} WHERE name IN '
+                    f'({",".join("?" * len(batch))});', batch))
+        return found
+
+    def get_states(self,
+                   names: list = None,
+                   states: list = None,
+                   after_name: str = None,
+                   limit: int = None,
+                   where: tuple = None,
+                   item_set: str = None) -> list:
+        '''
+        Get the correspondense of names to states.
+
+        Attributes:
+            names: one list or names for filtering, if it is None, filtering skips and all names are included.
+            states: one list or names for filtering, if it is None, filtering skips and all states are included.
+            after_name: when it is given, only the names after it are included and the result is ordered by name,
+                for paging with the last name of the previous page.
+            limit: when it is given, at most so many pairs are returned and the result is ordered by name.
+            where: when it is given, only the names whose attributes fulfill this condition are included,
+                e.g. ("and", ("owner", "=", "thomas"), ("priority", ">=", 2)), see item_attributes.check_condition.
+            item_set: when it is given, only the names in the named set are included, see save_set.
+        Returns:
+            An array of pairs name-state after the given filtering.
+        '''
+        if not self.is_table_available():
+            return None
+        command = f'SELECT name, state FROM {kTable}'
+        conditions = []
+        parameters = []
+        for column, values in (('name', names), ('state', states)):
+            if values is not None and bool(values):
+                conditions.append(
+                    f'{column} IN (SELECT value FROM json_each(?))')
+                parameters.append(json.dumps(list(values)))
+        conditions = [f'({" or ".join(conditions)})'] if bool(conditions) else []
+        matched = self._select_matched(where, item_set)
+        if matched is not None:
+            conditions.append(f'name IN ({matched[0]})')
+            parameters += matched[1]
+        if after_name is not None:
+            conditions.append('name > ?')
+            parameters.append(after_name)
+        if bool(conditions):
+            command += ' WHERE ' + ' and '.join(conditions)
+        if after_name is not None or limit is not None:
+            command += ' ORDER BY name'
+        if limit is not None:
+            command += ' LIMIT ?'
+            parameters.append(limit)
+        return tuple(self._conn.cursor().execute(command + ';', parameters))
+
+    def iter_states(self,
+                    names: list = None,
+                    states: list = None,
+                    after_name: str = None,
+                    page_size: int = kPageSize,
+                    where: tuple = None,
+                    item_set: str = None):
+        '''
+        Iterate over the correspondense of names to states ordered by name, page by page.
+        Only one page is held at once and no query stays open between the pages.
+
+        Attributes:
+            names: one list or names for filtering, if it is None, filtering skips and all names are included.
+            states: one list or names for filtering, if it is None, filtering skips and all states are included.
+            after_name: when it is given, only the names after it are included.
+            page_size: number of pairs read with one query.
+            where: one condition on attributes for filtering as in get_states.
+            item_set: the name of one named set for filtering as in get_states.
+        Returns:
+            A generator of pairs name-state after the given filtering.
+        '''
+        while True:
+            page = self.get_states(names=names,
+                                   states=states,
+                                   after_name=after_name,
+                                   limit=page_size,
+                                   where=where,
+                                   item_set=item_set)
+            if not bool(page):
+                return
+            yield from page
+            if len(page) < page_size:
+                return
+            after_name = page[-1][0]
+
+    def filter_states(self,
+                      names: list = None,
+                      states: list = None,
+                      where: tuple = None,
+                      item_set: str = None) -> (list, dict):
+        '''
+        Get the result of get_states and its count per state, from the cache when the database
+        didn't change since the same filter was run; the order of names and states doesn't matter.
+
+        Attributes:
+            names: one list or names for filtering as in get_states.
+            states: one list or names for filtering as in get_states.
+            where: one condition on attributes for filtering as in get_states.
+            item_set: the name of one named set for filtering as in get_states.
+        Returns:
+            (pairs, counts): pairs is an array of pairs name-state as from get_states;
+                counts is a dict with state as key and the count of its names in pairs as value.
+                Both are shared with the cache and should not be changed.
+        '''
+        if where is not None:
+            where = item_attributes.check_condition(where,
+                                                    self.get_attribute_kinds())
+        key = query_cache.normalize(names, states) + (where, item_set)
+        # the version changes on commit, the changes of an open transaction are not cached
+        version = self.data_version() if self._depth == 0 else None
+        result = self._query_cache.get(
+            key, version) if version is not None else None
+        if result is None:
+            pairs = self.get_states(names=key[0],
+                                    states=key[1],
+                                    where=where,
+                                    item_set=item_set)
+            result = (pairs, dict(collections.Counter(s for _, s in pairs)))
+            if version is not None:
+                self._query_cache.put(key, version, result,
+                                      query_cache.estimate_size(pairs))
+        return result
+
+    def get_cache_stats(self) -> dict:
+        '''
+        Get the statistics of the cache of filter_states.
+
+        Returns:
+            A dict with the counts of hits, misses, invalidations and evictions, the hit rate,
+                the number of cached results and their estimated size in bytes.
+        '''
+        return self._query_cache.get_stats()
+
+    def _select_where(self, where: tuple) -> (str, list):
+        '''
+        Get the query for the names which fulfill one condition on attributes.
+        Each condition on one attribute is read through the index on attribute and value,
+        "and" intersects and "or" unites the names of the conditions.
+
+        Attributes:
+            where: one condition from item_attributes.check_condition.
+        Returns:
+            (command, parameters) of the query with the column name.
+        '''
+        if where[0] in item_attributes.kCombinators:
+            parts = tuple(self._select_where(c) for c in where[1:])
+            command = (' INTERSECT ' if where[0] == 'and' else ' UNION ').join(
+                f'SELECT name FROM ({c})' for c, _ in parts)
+            return command, [p for _, parameters in parts for p in parameters]
+        attribute, operator, value = where
+        command = f'SELECT name FROM {kTableAttributes} WHERE attribute=? AND '
+        if operator == 'in':
+            return command + 'value IN (SELECT value FROM json_each(?))', [
+                attribute, json.dumps(list(value))
+            ]
+        return command + f'value{operator}?', [attribute, value]
+
+    def _select_matched(self, where: tuple, item_set: str) -> (str, list):
+        '''
+        Get the query for the names which fulfill one condition on attributes and are in one named set.
+
+        Attributes:
+            where: one condition on attributes as in get_states, None for no condition.
+            item_set: the name of one named set, None for no set.
+        Returns:
+            (command, parameters) of the query with the column name, None when neither is given.
+        '''
+        parts = []
+        if where is not None:
+            parts.append(
+                self._select_where(
+                    item_attributes.check_condition(
+                        where, self.get_attribute_kinds())))
+        if item_set is not None:
+            set_id = self._find_set(item_set)
+            assert set_id is not None, f'item set {item_set} not available'
+            parts.append((f'SELECT name FROM {kTableSetNames} WHERE set_id=?',
+                          [set_id]))
+        if not bool(parts):
+            return None
+        return ' INTERSECT '.join(f'SELECT name FROM ({c})' for c, _ in
+                                  parts), [p for _, ps in parts for p in ps]
+
+    def _find_set(self, set_name: str) -> int:
+        '''
+        Get the id of one named set.
+
+        Attributes:
+            set_name: name of the set.
+        Returns:
+            The id, None when the set is not available.
+        '''
+        found = self._conn.cursor().execute(
+            f'SELECT id FROM {kTableSets} WHERE name=?;',
+            (set_name, )).fetchone()
+        return None if found is None else found[0]
+
+    def _replace_set(self, set_name: str) -> (int, int):
+        '''
+        Create one named set in the open transaction, the set with the same name is replaced;
+        the names of the replaced set stay readable until they are deleted with its id.
+
+        Attributes:
+            set_name: name of the set.
+        Returns:
+            (old id, new id): the id of the replaced set, None when there was none, and the id of the new set.
+        '''
+        assert type(set_name) == str and bool(set_name.strip()), \
+            f'wrong set name {set_name}'
+        cursor = self._conn.cursor()
+        old = self._find_set(set_name)
+        cursor.execute(f'DELETE FROM {kTableSets} WHERE name=?;', (set_name, ))
+        return old, cursor.execute(
+            f'INSERT INTO {kTableSets} (name) VALUES (?);',
+            (set_name, )).lastrowid
+
+    def _count_set(self, set_id: int) -> int:
+        '''
+        Get the number of names in one named set.
+        '''
+        return self._conn.cursor().execute(
+            f'SELECT COUNT(*) FROM {kTableSetNames} WHERE set_id=?;',
+            (set_id, )).fetchone()[0]
+
+    def get_sets(self) -> dict:
+        '''
+        Get the named sets.
+
+        Returns:
+            A dict with the name of the set as key and its number of names as value, ordered by name.
+        '''
+        return dict(self._conn.cursor().execute(
+            f'SELECT s.name, COUNT(n.name) FROM {kTableSets} s LEFT JOIN '
+            f'{kTableSetNames} n ON n.set_id = s.id GROUP BY s.id '
+            'ORDER BY s.name;'))
+
+    def read_set(self, set_name: str) -> list:
+        '''
+        Read the names of one named set.
+
+        Attributes:
+            set_name: name of the set.
+        Returns:
+            An array of the names ordered by name.
+        '''
+        set_id = self._find_set(set_name)
+        assert set_id is not None, f'item set {set_name} not available'
+        return tuple(name for name, in self._conn.cursor().execute(
+            f'SELECT name FROM {kTableSetNames} WHERE set_id=? ORDER BY name;',
+            (set_id, )))
+
+    @_atomic
+    def save_set(self, set_name: str, names: list) -> int:
+        '''
+        Save names as one named set in the project, e.g. an input list or the accepted or denied names of a split,
+        so that they can be used again without pasting them. The set with the same name is replaced.
+        The sets are no operations on the items, they are not logged and can't be undone.
+
+        Attributes:
+            set_name: name of the set.
+            names: an iterable of names, they don't need to be in the project; repeated names are saved once.
+        Returns:
+            The number of names in the set.
+        '''
+        old, new = self._replace_set(set_name)
+        cursor = self._conn.cursor()
+        cursor.execute(f'DELETE FROM {kTableSetNames} WHERE set_id=?;', (old, ))
+        names = tuple(names)
+        assert all(type(n) == str for n in names), 'wrong parameter in save_set'
+        cursor.executemany(
+            f'INSERT OR IGNORE INTO {kTableSetNames} VALUES (?, ?);',
+            ((new, n) for n in names))
+        return self._count_set(new)
+
+    @_atomic
+    def combine_sets(self, set_name: str, operation: str,
+                     set_names: list) -> int:
+        '''
+        Save the union, intersection or difference of named sets as one named set, computed in the database
+        without reading the names. The result can replace one of the combined sets.
+
+        Attributes:
+            set_name: name of the result set.
+            operation: one of kSetOperations.
+            set_names: an array of the names of the combined sets, in order for the difference.
+        Returns:
+            The number of names in the result set.
+        '''
+        assert operation in kSetOperations, f'unknown set operation {operation}'
+        assert bool(set_names), 'no set to combine'
+        ids = tuple(self._find_set(n) for n in set_names)
+        assert None not in ids, \
+            f'item sets {tuple(n for n, i in zip(set_names, ids) if i is None)} not available'
+        old, new = self._replace_set(set_name)
+        cursor = self._conn.cursor()
+        cursor.execute(
+            f'INSERT INTO {kTableSetNames} SELECT ?, name FROM (' +
+            f' {kSetOperations[operation]} '.join(
+                (f'SELECT name FROM {kTableSetNames} WHERE set_id=?', ) *
+                len(ids)) + ');', (new, ) + ids)
+        cursor.execute(f'DELETE FROM {kTableSetNames} WHERE set_id=?;', (old, ))
+        return self._count_set(new)
+
+    @_atomic
+    def delete_set(self, set_name: str):
+        '''
+        Delete one named set.
+
+        Attributes:
+            set_name: name of the set.
+        '''
+        set_id = self._find_set(set_name)
+        assert set_id is not None, f'item set {set_name} not available'
+        cursor = self._conn.cursor()
+        cursor.execute(f'DELETE FROM {kTableSetNames} WHERE set_id=?;',
+                       (set_id, ))
+        cursor.execute(f'DELETE FROM {kTableSets} WHERE id=?;', (set_id, ))
+
+    def get_attribute_kinds(self) -> dict:
+        '''
+        Get the defined attributes.
+
+        Returns:
+            A dict with attribute as key and its kind as value, see item_attributes.kKinds.
+        '''
+        return dict(self._conn.cursor().execute(
+            f'SELECT attribute, kind FROM {kTableAttributeKinds};'))
+
+    def _write_attribute_kind(self, attribute: str, kind: str):
+        '''
+        Write the definition of one attribute, in the open transaction.
+        '''
+        self._conn.cursor().execute(
+            f'INSERT INTO {kTableAttributeKinds} VALUES (?, ?);',
+            (attribute, kind))
+
+    @_atomic
+    def define_attribute(self, attribute: str, kind: str):
+        '''
+        Define one attribute, so that it can be set for names and used in filtering.
+        Defining it again with the same kind changes nothing.
+
+        Attributes:
+            attribute: name of the attribute, e.g. "owner".
+            kind: kind of its values, one of item_attributes.kKinds.
+        '''
+        item_attributes.check_name(attribute)
+        assert kind in item_attributes.kKinds, f'unknown kind {kind}'
+        kinds = self.get_attribute_kinds()
+        action = {
+            'action': 'define_attribute',
+            'attribute': attribute,
+            'kind': kind,
+            'doable': kinds.get(attribute, kind) == kind,
+        }
+        self.log_action(action)
+
+        assert action['doable'], f'{attribute} is defined as {kinds[attribute]}'
+        if attribute not in kinds:
+            self._write_attribute_kind(attribute, kind)
+
+    def get_attributes(self, names: list) -> dict:
+        '''
+        Get the attributes of names with batched queries.
 
         Attributes:
-            action: one dict which should contain all information one action brings.
+            names: one list or array of names.
+        Returns:
+            A dict with the names which have attributes as key and a dict of attribute to value as value.
         '''
-        log_text = json.dumps(action, indent=' ')
-        path = os.path.join(
-            self._log_dir,
-            str(datetime.datetime.now()).replace(' ', 'T').replace(':', '-') +
-            '.log.json')
-        with open(path, 'w') as fs:
-            fs.write(log_text)
+        names = tuple(set(names))
+        cursor = self._conn.cursor()
+        found = collections.defaultdict(dict)
+        for begin in range(0, len(names), kBatchSize):
+            batch = names[begin:begin + kBatchSize]
+            for name, attribute, value in cursor.execute(
+                    f'SELECT name, attribute, value FROM {kTableAttributes} '
+                    f'WHERE name IN ({",".join("?" * len(batch))});', batch):
+                found[name][attribute] = value
+        return dict(found)
 
-    def is_table_available(self) -> bool:
+    @_atomic
+    def set_attributes(self, names: list, attributes: dict):
         '''
-        Checks whether the table for this program is created.
+        Set the same attributes for all given names, as one operation for undo.
+        When any of names is not in database, it breaks without changing.
 
-        Now it is "states". I don't see how it can be changed because this software is for ME.
+        Attributes:
+            names: an array or list of names.
+            attributes: a dict with attribute as key and value as value, None clears the attribute.
         '''
-        return (kTable, ) in tuple(self._conn.cursor().execute(
-            'SELECT name FROM sqlite_master WHERE type="table";'))
+        if not bool(names):
+            return
+        assert all(type(name) == str
+                   for name in names), 'wrong parameter in set_attributes'
+        attributes = item_attributes.check_values(attributes,
+                                                  self.get_attribute_kinds())
+        available_states = self.consult(names)
+        conflicts = tuple(n for n, s in zip(names, available_states)
+                          if s is None)
+        action = {
+            'action': 'set_attributes',
+            'names': names,
+            'attributes': attributes,
+            'doable': not bool(conflicts),
+        }
+        self.log_action(action)
 
-    def read_state(self, name: str) -> str:
+        assert action['doable'], f'{conflicts} not initialized'
+        self._record_undo('set_attributes', tuple())
+        self._change_attributes(names, attributes)
+
+    def _change_attributes(self, names: list, attributes: dict = None):
         '''
-        Get the state for one name.
+        Set the same attributes for names and record the changes for the last operation for undo, see _write_attributes.
 
         Attributes:
-            name: one name.
-        Returns:
-            Its state if the name is given, or None.
+            names: an array of names.
+            attributes: a dict with attribute as key and value as value, None clears the attribute;
+                when it is None, all attributes of the names are cleared.
         '''
-        cursor = self._conn.cursor()
-        result = tuple(
-            cursor.execute(
-                f'SELECT state FROM {kTable} WHERE name=="{name}";'))
-        assert len(result) <= 1, f'duplicate result for name {name}'
-        return result[0][0] if len(result) > 0 else None
+        found = self.get_attributes(names)
+        changes = []
+        for name in dict.fromkeys(names):
+            current = found.get(name, dict())
+            for attribute, value in (attributes if attributes is not None else
+                                     dict.fromkeys(current)).items():
+                if current.get(attribute) != value:
+                    changes.append((name, attribute, current.get(attribute),
+                                    value))
+        self._write_attributes(changes, record=True)
 
-    def consult(self, names: list) -> list:
+    def _write_attributes(self, changes: list, record: bool = False):
         '''
-        Get the states for a name list.
+        Apply the changes of attributes without committing.
 
         Attributes:
-            names: one list or array of names.
-        Returns:
-            The states for the names; when a name cannot be found in database, None is returned in its place.
+            changes: an array of (name, attribute, original value, new value), None as value means no value;
+                each attribute of one name appears once.
+            record: when it is true, the changes are recorded for the last operation for undo.
         '''
-        assert all(type(name) == str
-                   for name in names), 'wrong parameter in consult'
-        return tuple(self.read_state(name) for name in names)
+        self._begin()
+        cursor = self._conn.cursor()
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {kTableAttributes} VALUES (?, ?, ?);',
+            ((n, a, v) for n, a, _, v in changes if v is not None))
+        cursor.executemany(
+            f'DELETE FROM {kTableAttributes} WHERE name=? AND attribute=?;',
+            ((n, a) for n, a, _, v in changes if v is None))
+        if record:
+            cursor.executemany(
+                f'INSERT INTO {kTableUndoAttributes} VALUES (?, ?, ?, ?, ?);',
+                ((self._last_op, ) + tuple(change) for change in changes))
 
-    def get_states(self, names: list = None, states: list = None) -> list:
+    def _read_undo_attributes(self, op_id: int) -> list:
         '''
-        Get the correspondense of names to states.
+        Read the recorded changes of attributes of one operation in their order.
 
         Attributes:
-            names: one list or names for filtering, if it is None, filtering skips and all names are included.
-            states: one list or names for filtering, if it is None, filtering skips and all states are included.
+            op_id: id of the operation.
         Returns:
-            An array of pairs name-state after the given filtering.
+            An array of (name, attribute, original value, new value).
         '''
-        if not self.is_table_available():
-            return None
-        command = f'SELECT name, state FROM {kTable}'
-        condition_name = ' or '.join([f'name="{name}" ' for name in names
-                                      ]) if names is not None else ''
-        condition_state = ' or '.join(
-            [f'state="{state}" '
-             for state in states]) if states is not None else ''
-        condition = (' WHERE ' if bool(condition_name) or bool(condition_state) else '') + \
-            condition_name + \
-            (' or ' if bool(condition_name) and bool(condition_state) else '') + \
-            condition_state
-        return tuple(self._conn.cursor().execute(command + condition + ';'))
-
-    def add_states(self, content: dict, forced: bool = False):
+        return tuple(self._conn.cursor().execute(
+            f'SELECT name, attribute, old_value, new_value FROM '
+            f'{kTableUndoAttributes} WHERE op_id=? ORDER BY rowid;',
+            (op_id, )))
+
+    @_atomic
+    def add_states(self,
+                   content: dict,
+                   forced: bool = False,
+                   attributes: dict = None):
         '''
         Add the names with given states.
         When any key in content is available in database, it breaks without changing.
@@ -123,6 +1608,7 @@ class StateContainer(object):
         Attributes:
             content: a dict with name as key and state as value.
             forced: when it is true, the content will be applied without checking.
+            attributes: when it is given, these attributes are set for all names, see set_attributes.
         '''
         if not bool(content):
             return
@@ -135,6 +1621,10 @@ class StateContainer(object):
             'content': content,
             'forced': forced,
         }
+        if attributes is not None:
+            attributes = item_attributes.check_values(
+                attributes, self.get_attribute_kinds())
+            action['attributes'] = attributes
 
         names = tuple(content.keys())
         target_states = tuple(content[n] for n in names)
@@ -145,22 +1635,22 @@ class StateContainer(object):
         action['doable'] = forced or not any(conflicts)
         if forced:
             action['reset'] = tuple(n for n, c in zip(names, conflicts) if c)
+            action['original_states'] = {
+                n: e
+                for n, e, c in zip(names, available_states, conflicts) if c
+            }
 
         self.log_action(action)
 
         assert action['doable'], \
             f'{tuple(n for n, c in zip(names, conflicts) if c)} already added with another states'
-        cursor = self._conn.cursor()
-        for n, s, e in zip(names, target_states, available_states):
-            if e is None:
-                cursor.execute(f'INSERT INTO {kTable} VALUES ("{n}" , "{s}");')
-            elif e == s:
-                pass
-            elif forced:
-                cursor.execute(
-                    f'UPDATE {kTable} SET state="{s}" WHERE name="{n}";')
-
-        self._conn.commit()
+        self._write_changes(tuple(
+            (n, e, s)
+            for n, s, e in zip(names, target_states, available_states)
+            if e != s),
+                            action='add')
+        if attributes is not None:
+            self._change_attributes(names, attributes)
 
     def select_for_addition(self, content: dict) -> (list, list):
         '''
@@ -183,11 +1673,13 @@ class StateContainer(object):
         return tuple(n for n, c in zip(names, conflicts)
                      if not c), tuple(n for n, c in zip(names, conflicts) if c)
 
+    @_atomic
     def transit(self,
                 names: list,
                 from_state: str,
                 to_state: str,
-                forced: bool = False):
+                forced: bool = False,
+                attributes: dict = None):
         '''
         Change the states for given names from one state to another.
         When any of names doesn't have from state, it breaks without changing.
@@ -197,11 +1689,15 @@ class StateContainer(object):
             from_state: from which state to change.
             to_state: to change to which state.
             forced: when it is true, the states will be changed for the given names if they appear.
+            attributes: when it is given, these attributes are set for all names, see set_attributes.
         '''
         if not bool(names):
             return
         assert all(type(name) == str
                    for name in names), 'wrong parameter in transit'
+        if attributes is not None:
+            attributes = item_attributes.check_values(
+                attributes, self.get_attribute_kinds())
         available_states = self.consult(names)
         assert None not in available_states, \
             f'{tuple(n for n, s in zip(names, available_states) if s is None)} not initialized'
@@ -216,19 +1712,22 @@ class StateContainer(object):
             'to_state': to_state,
             'forced': forced,
         }
+        if attributes is not None:
+            action['attributes'] = attributes
         action['doable'] = forced or not bool(conflicts)
-        if forced:
-            action['original_states'] = available_states
+        action['original_states'] = available_states
         self.log_action(action)
 
         assert action[
             'doable'], f'{conflicts} doesn\'t have state {from_state}'
-        cursor = self._conn.cursor()
-        for name, available_state in zip(names, available_states):
-            cursor.execute(
-                f'UPDATE {kTable} SET state="{to_state}" WHERE name="{name}";')
-
-        self._conn.commit()
+        self._write_changes(
+            tuple((name, available_state, to_state)
+                  for name, available_state in dict(
+                      zip(names, available_states)).items()
+                  if available_state != to_state),
+            action='transit')
+        if attributes is not None:
+            self._change_attributes(names, attributes)
 
     def select_for_transition(self, names: list,
                               from_state: str) -> (list, list):
@@ -243,11 +1742,11 @@ class StateContainer(object):
             (accepted, denied): accepted are the names which are safe to apply to transit;
                 denied not accepted, they are not in database or have different states than from_state.
         '''
-        selected = tuple(n for n, s in zip(names, self.consult(names))
-                         if s == from_state)
-        left = tuple(n for n in names if n not in selected)
-        return selected, left
+        accepted = tuple(s == from_state for s in self.consult(names))
+        return tuple(n for n, a in zip(names, accepted) if a), tuple(
+            n for n, a in zip(names, accepted) if not a)
 
+    @_atomic
     def remove(self, names: list, forced: bool = False):
         '''
         Remove the states with given names.
@@ -274,15 +1773,284 @@ class StateContainer(object):
         action['doable'] = forced or not bool(conflicts)
         if forced:
             action['skipped'] = conflicts
+        action['original_states'] = available_states
         self.log_action(action)
 
         assert action['doable'], f'{conflicts} are not available in remove'
+        self._write_changes(
+            tuple((name, state, None)
+                  for name, state in dict(zip(names, available_states)).items()
+                  if state is not None),
+            action='remove')
+        # the attributes are removed with the names and restored on undo
+        self._change_attributes(names)
+
+    @_atomic
+    def rename_state(self, from_state: str, to_state: str):
+        '''
+        Rename one state for all names which have it.
+        The state is interned, so only one row changes; when to_state exists already,
+        the names of both states are joined.
+
+        Attributes:
+            from_state: the state to rename.
+            to_state: the new name of the state.
+        '''
+        assert type(from_state) == str and type(
+            to_state) == str, 'wrong parameter in rename_state'
+        action = {
+            'action': 'rename',
+            'from_state': from_state,
+            'to_state': to_state,
+            'doable': from_state in self._read_stats((from_state, )),
+        }
+        self.log_action(action)
+
+        assert action['doable'], f'{from_state} is not available in rename'
+        if from_state != to_state:
+            self._rename(from_state, to_state, record=True)
+
+    def _read_stats(self, states: list) -> dict:
+        '''
+        Read the id, count and digest of states which have names.
+
+        Attributes:
+            states: an array of states.
+        Returns:
+            A dict with state as key and (id, count, digest) as value.
+        '''
+        states = tuple(states)
+        stats = dict()
+        for begin in range(0, len(states), kBatchSize):
+            batch = states[begin:begin + kBatchSize]
+            stats.update((state, (i, count, digest))
+                         for i, state, count, digest in self._conn.cursor(
+                         ).execute(
+                             f'SELECT id, state, count, digest FROM '
+                             f'{kTableDict} WHERE count > 0 AND state IN '
+                             f'({",".join("?" * len(batch))});', batch))
+        return stats
+
+    def _rename(self, from_state: str, to_state: str, record: bool = False):
+        '''
+        Rename one state in the dictionary, or join it into to_state when that exists, and commit.
+
+        Attributes:
+            from_state: the state to rename, it should have names.
+            to_state: the new name of the state.
+            record: when it is true, the renaming is recorded for undo.
+        '''
+        self._begin()
         cursor = self._conn.cursor()
-        for name, state in zip(names, available_states):
-            if state is not None:
-                cursor.execute(f'DELETE FROM {kTable} WHERE name="{name}";')
+        stats = self._read_stats((from_state, to_state))
+        assert from_state in stats, f'{from_state} is not available in rename'
+        if to_state not in stats:
+            if record:
+                self._record_undo('rename', ((None, from_state, to_state), ))
+            self._record_change_log(((None, from_state, to_state), ))
+            cursor.execute(f'DELETE FROM {kTableDict} WHERE state=?;',
+                           (to_state, ))
+            cursor.execute(f'UPDATE {kTableDict} SET state=? WHERE state=?;',
+                           (to_state, from_state))
+        else:
+            from_id, from_count, from_digest = stats[from_state]
+            to_id, to_count, to_digest = stats[to_state]
+            self._record_change_log(((None, from_state, to_state), ))
+            if record:
+                self._record_undo(
+                    'rename',
+                    tuple((name, from_state, to_state)
+                          for name, in cursor.execute(
+                              f'SELECT name FROM {kTableItems} '
+                              'WHERE state_id=?;', (from_id, )).fetchall()))
+            cursor.execute(
+                f'UPDATE {kTableItems} SET state_id=? WHERE state_id=?;',
+                (to_id, from_id))
+            self._write_stats(
+                ((from_state, 0, 0), (to_state, from_count + to_count,
+                                      from_digest + to_digest)))
+        self._commit()
 
-        self._conn.commit()
+    @_atomic
+    def undo(self):
+        '''
+        Undo the last operation which is not undone yet, by applying its inverse changes in one transaction.
+        When any of its names was changed afterwards in another way, it breaks without changing.
+        '''
+        op = self._find_undo_op(undone=False)
+        assert op is not None, 'nothing to undo'
+        self._revert(op, undone=True)
+
+    @_atomic
+    def redo(self):
+        '''
+        Redo the first undone operation, possible until another operation is executed.
+        '''
+        op = self._find_undo_op(undone=True)
+        assert op is not None, 'nothing to redo'
+        self._revert(op, undone=False)
+
+    def _find_undo_op(self, undone: bool) -> tuple:
+        '''
+        Find the operation to undo or redo.
+
+        Attributes:
+            undone: when it is true, the first undone operation is found for redo,
+                otherwise the last operation which is not undone for undo.
+        Returns:
+            (id, action) of the operation, None when there is none.
+        '''
+        return self._conn.cursor().execute(
+            f'SELECT id, action FROM {kTableUndoOps} WHERE undone=? '
+            f'ORDER BY id {"ASC" if undone else "DESC"} LIMIT 1;',
+            (int(undone), )).fetchone()
+
+    def _read_undo_changes(self, op_id: int) -> list:
+        '''
+        Read the recorded changes of one operation in their order.
+
+        Attributes:
+            op_id: id of the operation.
+        Returns:
+            An array of (name, original state, new state), None as name renames the state.
+        '''
+        return tuple(self._conn.cursor().execute(
+            f'SELECT u.name, o.state, n.state FROM {kTableUndoChanges} u '
+            f'LEFT JOIN {kTableStateIds} o ON o.id = u.old_id LEFT JOIN '
+            f'{kTableStateIds} n ON n.id = u.new_id WHERE u.op_id=? '
+            'ORDER BY u.seq;', (op_id, )))
+
+    def _mark_undone(self, op_id: int, undone: bool):
+        '''
+        Mark one operation as undone or redone, in the open transaction.
+
+        Attributes:
+            op_id: id of the operation.
+            undone: whether the operation is undone.
+        '''
+        self._conn.cursor().execute(
+            f'UPDATE {kTableUndoOps} SET undone=? WHERE id=?;',
+            (int(undone), op_id))
+
+    def _revert(self, op: tuple, undone: bool):
+        '''
+        Apply the recorded changes of one operation forwards or backwards, log it and mark the operation.
+
+        Attributes:
+            op: (id, action) of the operation.
+            undone: when it is true, the changes are applied backwards for undo, otherwise forwards for redo.
+        '''
+        op_id, operation = op
+        changes = tuple(self._read_undo_changes(op_id))
+        attributes = tuple(self._read_undo_attributes(op_id))
+        if undone:
+            changes = tuple((n, s, e) for n, e, s in changes[::-1])
+            attributes = tuple((n, a, s, e) for n, a, e, s in attributes[::-1])
+
+        action = {
+            'action': 'undo' if undone else 'redo',
+            'operation': operation,
+            'changes': [list(change) for change in changes],
+            'doable': True,
+        }
+        if bool(attributes):
+            action['attributes'] = [list(change) for change in attributes]
+        self.log_action(action)
+
+        # when a name changed afterwards, it fails and the log is marked as not doable by the rollback
+        with self.transaction():
+            check = f'changed after {operation}, cannot {action["action"]}'
+            self._apply_sequence(changes, check=check)
+            self._apply_attributes(attributes, check=check)
+            self._mark_undone(op_id, undone)
+
+    def _apply_sequence(self, changes: list, check: str = None):
+        '''
+        Apply the changes of one operation in their order, the operations of one group can change one name several times.
+        The consecutive changes of names are written together, each name from its first to its last state.
+
+        Attributes:
+            changes: an array of (name, original state, new state), None as name renames the state.
+            check: when it is given, the original states are checked and it is the message when they differ.
+        '''
+        batch = dict()
+
+        def flush():
+            if check is not None:
+                current = self._lookup(tuple(batch))
+                conflicts = tuple(n for n, (e, _) in batch.items()
+                                  if current.get(n) != e)
+                assert not bool(conflicts), f'{conflicts} {check}'
+            self._write_changes(tuple((n, e, s) for n, (e, s) in batch.items()))
+            batch.clear()
+
+        for name, old_state, state in changes:
+            if name is not None:
+                batch[name] = (batch.get(name, (old_state, ))[0], state)
+                continue
+            flush()
+            assert check is None or old_state in self._read_stats(
+                (old_state, )), f'{(old_state, )} {check}'
+            self._rename(old_state, state)
+        flush()
+
+    def _apply_attributes(self,
+                          changes: list,
+                          check: str = None,
+                          record: bool = False):
+        '''
+        Apply the changes of attributes of one operation in their order, each attribute of one name
+        from its first to its last value.
+
+        Attributes:
+            changes: an array of (name, attribute, original value, new value).
+            check: when it is given, the original values are checked and it is the message when they differ.
+            record: when it is true, the changes are recorded for the last operation for undo.
+        '''
+        if not bool(changes):
+            return
+        batch = dict()
+        for name, attribute, old_value, value in changes:
+            batch[(name, attribute)] = (batch.get((name, attribute),
+                                                  (old_value, ))[0], value)
+        if check is not None:
+            current = self.get_attributes(tuple(n for n, _ in batch))
+            conflicts = tuple(
+                sorted(set(n for (n, a), (e, _) in batch.items()
+                           if current.get(n, dict()).get(a) != e)))
+            assert not bool(conflicts), f'{conflicts} {check}'
+        self._write_attributes(tuple(
+            (n, a, e, v) for (n, a), (e, v) in batch.items()),
+                               record=record)
+
+    @_atomic
+    def _apply_revert(self,
+                      action: str,
+                      changes: list,
+                      attributes: list = tuple()):
+        '''
+        Apply and log the changes of one logged undo or redo, e.g. in replay.
+        The undo history of this database is not used, so the result doesn't depend on its earlier operations;
+        the changes are recorded as one new operation, which can be undone here.
+
+        Attributes:
+            action: "undo" or "redo".
+            changes: an array of (name, original state, new state) in the logged order, None as name renames the state.
+            attributes: an array of (name, attribute, original value, new value) in the logged order.
+        '''
+        changes = tuple(tuple(change) for change in changes)
+        attributes = tuple(tuple(change) for change in attributes)
+        logged = {
+            'action': action,
+            'changes': [list(change) for change in changes],
+            'doable': True,
+        }
+        if bool(attributes):
+            logged['attributes'] = [list(change) for change in attributes]
+        self.log_action(logged)
+        self._record_undo(action, changes)
+        self._apply_sequence(changes)
+        self._apply_attributes(attributes, record=True)
 
     def select_for_removal(self, names: list) -> (list, list):
         '''
@@ -295,20 +2063,447 @@ class StateContainer(object):
             (accepted, denied): accepted are the names which are safe to apply to remove;
                 denied not accepted, they are not in database.
         '''
-        selected = tuple(n for n, s in zip(names, self.consult(names))
-                         if s is not None)
-        left = tuple(n for n in names if n not in selected)
-        return selected, left
+        accepted = tuple(s is not None for s in self.consult(names))
+        return tuple(n for n, a in zip(names, accepted) if a), tuple(
+            n for n, a in zip(names, accepted) if not a)
+
+    def run_chunked(self,
+                    operation: str,
+                    parameters: dict,
+                    chunk_size: int = kChunkSize) -> str:
+        '''
+        Run add_states, transit or remove for a huge input in chunks, each chunk in its own transaction,
+        so that the write lock is released between the chunks and other windows stay responsive.
+        The operation is logged once and its progress is committed with each chunk,
+        so that it is continued from the last committed chunk with resume_chunked, e.g. after a crash.
+        Unless forced, the whole input is checked before the first chunk, as in the operation itself;
+        the chunks are recorded as one operation for undo while no other operation comes in between.
+
+        Attributes:
+            operation: "add", "transit" or "remove", see kChunkedOperations.
+            parameters: the parameters of the operation as dict, e.g. {"names": names, "forced": False}.
+            chunk_size: number of items per chunk.
+        Returns:
+            The id of the chunked operation.
+        '''
+        assert operation in kChunkedOperations, \
+            f'{operation} cannot run in chunks'
+        assert all(p in kChunkedOperations[operation] for p in parameters), \
+            f'wrong parameter in {operation}'
+        assert type(chunk_size) == int and chunk_size > 0, \
+            f'wrong chunk size {chunk_size}'
+        parameters = dict(parameters)
+        if parameters.get('attributes') is not None:
+            parameters['attributes'] = item_attributes.check_values(
+                parameters['attributes'], self.get_attribute_kinds())
+        else:
+            parameters.pop('attributes', None)
+        names = _get_chunked_names(operation, parameters)
+        states = self.consult(names)
+        forced = parameters.get('forced', False)
+        if operation == 'add':
+            assert all(type(s) == str for s in parameters['content'].values()), \
+                'wrong parameter in add_states'
+            denied = tuple(n for n, s in zip(names, states)
+                           if s not in (None, parameters['content'][n])
+                           and not forced)
+            message = f'{denied} already added with another states'
+        elif operation == 'transit':
+            denied = tuple(n for n, s in zip(names, states) if s is None or (
+                s != parameters['from_state'] and not forced))
+            message = f'{denied} doesn\'t have state {parameters["from_state"]}'
+        else:
+            denied = tuple(n for n, s in zip(names, states)
+                           if s is None and not forced)
+            message = f'{denied} are not available in remove'
+
+        chunked_id = uuid.uuid4().hex
+        action = {
+            'action': 'chunked',
+            'chunked_id': chunked_id,
+            'operation': operation,
+            'parameters': parameters,
+            'chunk_size': chunk_size,
+            'doable': not bool(denied),
+        }
+        with self.transaction():
+            self.log_action(action)
+            assert action['doable'], message
+            self._write_checkpoint(chunked_id, 0, action=action)
+        self.resume_chunked(chunked_id)
+        return chunked_id
+
+    def resume_chunked(self, chunked_id: str = None):
+        '''
+        Continue chunked operations from their last committed chunk, e.g. after a crash or a failed chunk.
+
+        Attributes:
+            chunked_id: id of the chunked operation, by default all unfinished ones are continued in their order.
+        '''
+        if chunked_id is None:
+            for i, _, _, _ in self._read_checkpoints():
+                self.resume_chunked(i)
+            return
+        checkpoints = self._read_checkpoints(chunked_id)
+        assert bool(checkpoints), f'{chunked_id} is not unfinished'
+        _, action, done, op_id = checkpoints[0]
+        operation = action['operation']
+        names = _get_chunked_names(operation, action['parameters'])
+        callback = {
+            'add': self.add_states,
+            'transit': self.transit,
+            'remove': self.remove,
+        }[operation]
+        while done < len(names):
+            chunk = names[done:done + action['chunk_size']]
+            with self.transaction(undo_group=operation):
+                # inside another transaction, the chunks belong to its operation for undo
+                grouped = self._depth == 1
+                last = self._find_undo_op(undone=False)
+                if grouped and last is not None and last[0] == op_id and \
+                        self._find_undo_op(undone=True) is None:
+                    self._undo_group[1] = op_id
+                self._in_chunk = True
+                try:
+                    callback(
+                        **_get_chunk(operation, action['parameters'], chunk))
+                finally:
+                    self._in_chunk = False
+                if grouped:
+                    op_id = self._undo_group[1]
+                done += len(chunk)
+                self._write_checkpoint(
+                    chunked_id, done if done < len(names) else None, op_id)
+
+    @_atomic
+    def cancel_chunked(self, chunked_id: str):
+        '''
+        Stop one unfinished chunked operation, its committed chunks stay.
+        It is logged, so that a replay stops at the same item.
+
+        Attributes:
+            chunked_id: id of the chunked operation.
+        '''
+        checkpoints = self._read_checkpoints(chunked_id)
+        assert bool(checkpoints), f'{chunked_id} is not unfinished'
+        self.log_action({
+            'action': 'stop_chunked',
+            'chunked_id': chunked_id,
+            'done': checkpoints[0][2],
+        })
+        self._write_checkpoint(chunked_id, None)
+
+    def get_unfinished_chunked(self) -> list:
+        '''
+        Get the chunked operations which are not finished, in the order they started.
+
+        Returns:
+            An array of dicts with the id, the operation, the number of done items and the number of all items.
+        '''
+        return tuple({
+            'chunked_id': i,
+            'operation': action['operation'],
+            'done': done,
+            'total': len(
+                _get_chunked_names(action['operation'], action['parameters'])),
+        } for i, action, done, _ in self._read_checkpoints())
+
+    def _read_checkpoints(self, chunked_id: str = None) -> list:
+        '''
+        Read the progress of the unfinished chunked operations in the order they started.
+
+        Attributes:
+            chunked_id: when it is given, only this operation is read.
+        Returns:
+            An array of (id, logged action, number of done items, id of the operation for undo).
+        '''
+        query = f'SELECT id, action, done, op_id FROM {kTableCheckpoints}'
+        if chunked_id is not None:
+            rows = self._conn.cursor().execute(f'{query} WHERE id=?;',
+                                               (chunked_id, ))
+        else:
+            rows = self._conn.cursor().execute(f'{query} ORDER BY rowid;')
+        return tuple((i, json.loads(action), done, op_id)
+                     for i, action, done, op_id in rows)
+
+    def _write_checkpoint(self,
+                          chunked_id: str,
+                          done: int,
+                          op_id: int = None,
+                          action: dict = None):
+        '''
+        Write the progress of one chunked operation in the open transaction, so that it is committed with its chunk.
+
+        Attributes:
+            chunked_id: id of the chunked operation.
+            done: number of done items, None when the operation is finished or stopped.
+            op_id: id of the operation for undo which the chunks are recorded in.
+            action: the logged action, when it is given the progress is written for the first time.
+        '''
+        cursor = self._conn.cursor()
+        if done is None:
+            cursor.execute(f'DELETE FROM {kTableCheckpoints} WHERE id=?;',
+                           (chunked_id, ))
+        elif action is not None:
+            cursor.execute(
+                f'INSERT INTO {kTableCheckpoints} VALUES (?, ?, ?, ?);',
+                (chunked_id, json.dumps(action), done, op_id))
+        else:
+            cursor.execute(
+                f'UPDATE {kTableCheckpoints} SET done=?, op_id=? WHERE id=?;',
+                (done, op_id, chunked_id))
+
+    def _replay_chunked(self, stopped: dict, chunked_id: str, operation: str,
+                        parameters: dict, chunk_size: int):
+        '''
+        Replay one chunked operation, until the item it was stopped at.
+
+        Attributes:
+            stopped: a dict with the id of the stopped chunked operations as key and their number of done items as value.
+        '''
+        if chunked_id in stopped:
+            parameters = _get_chunk(
+                operation, parameters,
+                _get_chunked_names(operation,
+                                   parameters)[:stopped[chunked_id]])
+        self.run_chunked(operation, parameters, chunk_size=chunk_size)
+
+    def suggest(self, names: list, count: int = fuzzy_index.kSuggestions) -> dict:
+        '''
+        Suggest the names which are meant by names without match, e.g. with typos or another format
+        ("Issue-12" for "issue 12"), with the index of keys and trigrams; all names are handled in one call.
+        For each name, the names with the same key and the names sharing most of its rarest trigrams are compared.
+
+        Attributes:
+            names: an array of names, e.g. the names denied by select_for_transition.
+            count: maximal number of suggestions per name.
+        Returns:
+            A dict with each of names as key and an array of (name, state, similarity) as value, the most similar first.
+        '''
+        result = dict()
+        # the names of one call share most trigrams, they are counted once
+        counts = dict()
+        for name in names:
+            key = fuzzy_index.normalize(name)
+            trigrams = fuzzy_index.trigrams(key)
+            unknown = tuple(t for t in trigrams if t not in counts)
+            if bool(unknown):
+                counts.update(dict.fromkeys(unknown, 0))
+                counts.update(self._count_trigrams(unknown))
+            hits = collections.Counter()
+            budget = fuzzy_index.kMaxPostings
+            for trigram in sorted(trigrams, key=lambda t: (counts[t], t)):
+                if counts[trigram] == 0:
+                    continue
+                if counts[trigram] > budget and bool(hits):
+                    break
+                budget -= counts[trigram]
+                hits.update(self._read_postings(trigram))
+            candidates = self._find_key(key) + self._read_names(
+                tuple(i for i, _ in hits.most_common(fuzzy_index.kCandidates)))
+            found = self._lookup(candidates)
+            result[name] = fuzzy_index.rank(
+                name, tuple((n, found[n]) for n in candidates if n in found),
+                count)
+        return result
+
+    def _count_trigrams(self, trigrams: list) -> dict:
+        '''
+        Get the number of names per trigram.
+
+        Attributes:
+            trigrams: an array of trigrams.
+        Returns:
+            A dict with trigram as key and the number of names as value, trigrams without names are left out.
+        '''
+        trigrams = tuple(trigrams)
+        if not self._has_trigram_index():
+            return dict()
+        return dict(self._conn.cursor().execute(
+            f'SELECT term, doc FROM {kTableTrigramCounts} WHERE term IN '
+            f'({",".join("?" * len(trigrams))});', trigrams))
 
-    def replay(self, logs: list):
+    def _read_postings(self, trigram: str) -> list:
+        '''
+        Get the ids of the names which have one trigram, see _read_names.
+        '''
+        return tuple(i for i, in self._conn.cursor().execute(
+            f'SELECT rowid FROM {kTableTrigrams} WHERE {kTableTrigrams} MATCH ?;',
+            ('"' + trigram.replace('"', '""') + '"', )))
+
+    def _read_names(self, ids: list) -> list:
+        '''
+        Get the names for the ids from _read_postings.
+        '''
+        return tuple(name for name, in self._conn.cursor().execute(
+            f'SELECT name FROM {kTableFuzzyKeys} WHERE id IN '
+            f'({",".join("?" * len(ids))});', ids))
+
+    def _find_key(self, key: str) -> list:
+        '''
+        Get the names which have one key.
+        '''
+        return tuple(name for name, in self._conn.cursor().execute(
+            f'SELECT name FROM {kTableFuzzyKeys} WHERE key=?;', (key, )))
+
+    def merge(self,
+              path: str,
+              policy: str = 'report',
+              remove_missing: bool = False) -> dict:
+        '''
+        Merge the states from another database, e.g. a copy which was edited offline.
+        The differences are computed in SQL with the other database attached and applied
+        in the same transaction, which holds the write lock from the comparison to the changes;
+        the merge is logged as one action.
+
+        Attributes:
+            path: path for the *.db file to merge from.
+            policy: for names with different states, "theirs" takes the other state,
+                "ours" keeps this state; "report" changes nothing and returns what "ours" would do.
+            remove_missing: when it is true and policy is "theirs", the names missing in the other database are removed.
+        Returns:
+            A dict with the counts of added, changed and removed names,
+                and the conflicts as an array of (name, this state, other state).
+        '''
+        assert policy in kMergePolicies, f'unknown policy {policy} in merge'
+        assert os.path.isfile(path), f'{path} not available for merge'
+        with self.transaction():
+            added, conflicts, missing = self._diff_merge(
+                path, remove_missing and policy == 'theirs')
+            if policy != 'report':
+                self._apply_merge(added + (conflicts if policy == 'theirs'
+                                           else tuple()) + missing,
+                                  source=path,
+                                  policy=policy)
+        return {
+            'added': len(added),
+            'changed': len(conflicts) if policy == 'theirs' else 0,
+            'removed': len(missing),
+            'conflicts': conflicts,
+        }
+
+    def _diff_merge(self, path: str, missing: bool) -> (list, list, list):
+        '''
+        Compute the differences to another database for merge, in SQL with the other database attached.
+        It is called in a transaction, the database is detached when it ends.
+
+        Attributes:
+            path: path for the *.db file to merge from.
+            missing: when it is true, the names missing in the other database are computed.
+        Returns:
+            (added, conflicts, missing): arrays of (name, this state, other state) for the names only in
+                the other database, with different states and only in this database; None for no state.
+        '''
+        cursor = self._conn.cursor()
+        # several merges can run in one transaction
+        other = f'merge_{len(self._attached)}'
+        cursor.execute(f'ATTACH DATABASE ? AS {other};', (path, ))
+        self._attached.append(other)
+        added = tuple(
+            cursor.execute(
+                f'SELECT o.name, NULL, o.state FROM {other}.{kTable} o '
+                f'LEFT JOIN main.{kTable} m ON m.name = o.name '
+                'WHERE m.name IS NULL;'))
+        conflicts = tuple(
+            cursor.execute(
+                f'SELECT o.name, m.state, o.state FROM {other}.{kTable} o '
+                f'JOIN main.{kTable} m ON m.name = o.name '
+                'WHERE m.state != o.state;'))
+        missing = tuple(
+            cursor.execute(
+                f'SELECT m.name, m.state, NULL FROM main.{kTable} m '
+                f'LEFT JOIN {other}.{kTable} o ON o.name = m.name '
+                'WHERE o.name IS NULL;')) if missing else tuple()
+        return added, conflicts, missing
+
+    @_atomic
+    def _apply_merge(self,
+                     changes: list,
+                     source: str = None,
+                     policy: str = None):
+        '''
+        Apply and log the changes computed by merge.
+
+        Attributes:
+            changes: an array of (name, original state, new state), None as new state removes the name.
+            source: path of the merged database, it is only logged.
+            policy: policy for conflicts, it is only logged.
+        '''
+        if not bool(changes):
+            return
+        available_states = self.consult(tuple(n for n, _, _ in changes))
+        changes = tuple((n, e, s)
+                        for (n, _, s), e in zip(changes, available_states))
+        self.log_action({
+            'action': 'merge',
+            'changes': [list(change) for change in changes],
+            'source': source,
+            'policy': policy,
+        })
+        self._write_changes(tuple(c for c in changes if c[1] != c[2]),
+                            action='merge')
+        self._change_attributes(tuple(n for n, _, s in changes if s is None))
+
+    def archive_logs(self, before=None) -> int:
+        '''
+        Move the log files into the compressed archive beside them.
+
+        Attributes:
+            before: only the logs older than this datetime or timestamp are archived; by default all are.
+        Returns:
+            The number of archived actions.
+        '''
+        assert not self._read_only, f'{self._path} is opened read-only'
+        if self._journal_writer is not None:
+            # the journal continues in a new file, so that the written one can be archived
+            self._journal_writer.rotate()
+        return log_archive.archive_logs(self._log_dir, before=before)
+
+    def replay(self,
+               logs: list = None,
+               source: str = None,
+               since=None,
+               until=None):
         '''
         Replay the action with given logs.
         When any log is not valid in the updated databasem it breaks.
 
         Attributes:
-            logs: a list or array of logs to replay, it should be one log file generated here.
+            logs: a list or array of logs to replay, log files or journal files generated here.
+            source: the log directory of another project, its archived and not archived logs are replayed.
+            since: with source, only the actions from this datetime or timestamp are replayed.
+            until: with source, only the actions until this datetime or timestamp are replayed.
+        '''
+        assert (logs is None) != (source is None), \
+            'either logs or source should be given for replay'
+        if logs is not None:
+            assert all(os.path.isfile(log)
+                       for log in logs), 'logs not available'
+
+            # no auto close sucks
+            def read(fn: str) -> str:
+                with open(fn, 'r') as fs:
+                    return fs.read()
+
+            actions = tuple(
+                action for log in logs
+                for action in ((a for _, a in log_archive.read_journal(log))
+                               if log.endswith(log_archive.kJournalExtension
+                                               ) else (json.loads(read(log)), )))
+        else:
+            assert os.path.isdir(source), 'logs not available'
+            actions = tuple(
+                action for _, action in log_archive.read_actions(
+                    source, since=since, until=until))
+        self._replay_actions(actions)
+
+    def _replay_actions(self, actions: list):
+        '''
+        Replay the logged actions in the given order.
+
+        Attributes:
+            actions: an array of dicts as they are logged.
         '''
-        assert all(os.path.isfile(log) for log in logs), 'logs not available'
         example_actions = {
             'add': {
                 'action': 'add',
@@ -327,26 +2522,93 @@ class StateContainer(object):
                 'names': [],
                 'forced': False
             },
+            'merge': {
+                'action': 'merge',
+                'changes': [],
+            },
+            'rename': {
+                'action': 'rename',
+                'from_state': '',
+                'to_state': '',
+            },
+            'undo': {
+                'action': 'undo',
+                'changes': [],
+            },
+            'redo': {
+                'action': 'redo',
+                'changes': [],
+            },
+            'define_attribute': {
+                'action': 'define_attribute',
+                'attribute': '',
+                'kind': '',
+            },
+            'set_attributes': {
+                'action': 'set_attributes',
+                'names': [],
+                'attributes': dict(),
+            },
+            'chunked': {
+                'action': 'chunked',
+                'chunked_id': '',
+                'operation': '',
+                'parameters': dict(),
+                'chunk_size': 0,
+            },
+            'stop_chunked': {
+                'action': 'stop_chunked',
+                'chunked_id': '',
+                'done': 0,
+            },
         }
+        # the parameters which are only logged when they are given
+        optional_parameters = {
+            'add': {
+                'attributes': dict()
+            },
+            'transit': {
+                'attributes': dict()
+            },
+            'undo': {
+                'attributes': []
+            },
+            'redo': {
+                'attributes': []
+            },
+        }
+        # the number of done items of the stopped chunked operations
+        stopped = dict()
         callbacks = {
             'add': self.add_states,
             'transit': self.transit,
             'remove': self.remove,
+            'merge': self._apply_merge,
+            'rename': self.rename_state,
+            'undo': functools.partial(self._apply_revert, 'undo'),
+            'redo': functools.partial(self._apply_revert, 'redo'),
+            'define_attribute': self.define_attribute,
+            'set_attributes': self.set_attributes,
+            'chunked': functools.partial(self._replay_chunked, stopped),
+            # the stop is applied when the chunked operation is replayed
+            'stop_chunked': lambda chunked_id, done: None,
         }
 
-        # no auto close sucks
-        def read(fn: str) -> str:
-            with open(fn, 'r') as fs:
-                return fs.read()
-
-        actions = tuple(json.loads(read(log)) for log in logs)
         assert all('action' in action and action['action'] in example_actions and \
                 all(p in action and type(action[p]) == type(example_actions[action['action']][p]) \
-                    for p in example_actions[action['action']]) for action in actions), \
+                    for p in example_actions[action['action']]) and \
+                all(type(action[p]) == type(e) for p, e in optional_parameters.get(
+                    action['action'], dict()).items() if p in action) for action in actions), \
             'at least one of the actions is invalid and has incomplete data'
+        stopped.update((a['chunked_id'], a['done']) for a in actions
+                       if a['action'] == 'stop_chunked'
+                       and a.get('doable', True))
         for action in filter(lambda a: not ('doable' in a and not a['doable']),
                              actions):
+            parameters = dict(example_actions[action['action']],
+                              **optional_parameters.get(action['action'],
+                                                        dict()))
             callbacks[action['action']](**{
                 p: action[p]
-                for p in example_actions[action['action']] if p != 'action'
+                for p in parameters if p != 'action' and p in action
             })
@@ -0,0 +1,658 @@
+import unittest
+import sys
+import shutil
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import sharded_container
+import memory_container
+import log_archive
+
+DIR_PROJ = os.path.join(DIR_BASE, 'tests', 'proj')
+DIR_OTHER = os.path.join(DIR_BASE, 'tests', 'copy')
+
+
+def clean():
+    for path in (DIR_PROJ, DIR_OTHER):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class Conformance(object):
+    '''
+    The tests which each kind of container should pass with the same results.
+    '''
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_PROJ)
+        os.makedirs(DIR_OTHER)
+        self.container = self.open()
+
+    def tearDown(self):
+        del self.container
+        clean()
+
+    def open(self):
+        raise NotImplementedError
+
+    def get_actions(self) -> list:
+        return tuple(action for _, action in log_archive.read_actions(
+            os.path.join(DIR_PROJ, 'logs')))
+
+    def check_digest(self):
+        self.assertEqual(self.container.digest(),
+                         self.container.compute_digest())
+
+    def test_operations(self):
+        container = self.container
+        container.add_states({'1': 'a', '2': 'a', '3': 'b'})
+        self.assertRaises(AssertionError, container.add_states, {'1': 'b'})
+        container.add_states({'1': 'a', '4': 'b'})
+        container.add_states({'1': 'c'}, forced=True)
+        self.assertEqual(container.consult(('1', '4', '5')), ('c', 'b', None))
+        self.assertEqual(container.read_state('2'), 'a')
+        self.assertEqual(container.count_states(), {'a': 1, 'b': 2, 'c': 1})
+
+        self.assertRaises(AssertionError, container.transit, ('2', '3'), 'a',
+                          'c')
+        self.assertRaises(AssertionError, container.transit, ('5', ), 'a',
+                          'c')
+        self.assertEqual(container.select_for_transition(('2', '3', '5'), 'a'),
+                         (('2', ), ('3', '5')))
+        container.transit(('2', ), 'a', 'c')
+        container.transit(('2', '3'), 'x', 'd', forced=True)
+        self.assertRaises(AssertionError, container.remove, ('1', '5'))
+        self.assertEqual(container.select_for_removal(('1', '5')),
+                         (('1', ), ('5', )))
+        container.remove(('1', '5'), forced=True)
+        self.assertEqual(container.select_for_addition({
+            '2': 'd',
+            '3': 'a',
+            '6': 'a'
+        }), (('2', '6'), ('3', )))
+
+        self.assertEqual(sorted(container.get_states()), [('2', 'd'),
+                                                          ('3', 'd'),
+                                                          ('4', 'b')])
+        self.assertEqual(sorted(container.get_states(names=('4', '5'))),
+                         [('4', 'b')])
+        self.assertEqual(
+            sorted(container.get_states(names=('4', ), states=('d', ))),
+            [('2', 'd'), ('3', 'd'), ('4', 'b')])
+        self.assertEqual(container.get_states(after_name='2', limit=1),
+                         (('3', 'd'), ))
+        self.assertEqual(container.count_states(), {'b': 1, 'd': 2})
+        self.check_digest()
+
+    def test_paging(self):
+        names = tuple(f'{i:03d}' for i in range(250))
+        self.container.add_states({n: str(int(n) % 3) for n in names})
+        self.assertEqual(
+            tuple(n for n, _ in self.container.iter_states(page_size=7)),
+            names)
+        self.assertEqual(
+            tuple(n for n, _ in self.container.iter_states(states=('1', ),
+                                                           after_name='100')),
+            tuple(n for n in names if n > '100' and int(n) % 3 == 1))
+
+    def test_transaction(self):
+        container = self.container
+        container.add_states({'1': 'a', '2': 'a'})
+        digest = container.digest()
+        with self.assertRaises(AssertionError):
+            with container.transaction():
+                container.transit(('1', ), 'a', 'b')
+                container.add_states({'3': 'c'})
+                container.rename_state('a', 'd')
+                container.remove(('4', ))
+        self.assertEqual(sorted(container.get_states()), [('1', 'a'),
+                                                          ('2', 'a')])
+        self.assertEqual(container.digest(), digest)
+        self.check_digest()
+        container.undo()
+        self.assertEqual(container.get_states(), tuple())
+
+        with container.transaction(undo_group='group'):
+            container.add_states({'1': 'a', '2': 'a'})
+            container.transit(('1', ), 'a', 'b')
+        with self.assertRaises(AssertionError):
+            with container.transaction(undo_group='group'):
+                container.add_states({'3': 'c'})
+                container.transit(('3', ), 'c', 'd')
+                container.remove(('4', ))
+        container.undo()
+        self.assertEqual(container.get_states(), tuple())
+        self.assertFalse(
+            any(action.get('doable', True) and action['action'] == 'rename'
+                for action in self.get_actions()))
+
+    def test_undo_redo(self):
+        container = self.container
+        container.add_states({'1': 'a', '2': 'a', '3': 'a'})
+        history = [set(container.get_states())]
+        container.add_states({'3': 'b', '4': 'b'}, forced=True)
+        history.append(set(container.get_states()))
+        container.transit(('3', '4'), from_state='b', to_state='c')
+        history.append(set(container.get_states()))
+        container.rename_state('a', 'd')
+        history.append(set(container.get_states()))
+        container.rename_state('d', 'c')
+        history.append(set(container.get_states()))
+        container.remove(('1', '4'))
+        history.append(set(container.get_states()))
+
+        for states in history[-2::-1]:
+            container.undo()
+            self.assertEqual(set(container.get_states()), states)
+            self.check_digest()
+        container.undo()
+        self.assertRaises(AssertionError, container.undo)
+        for states in history:
+            container.redo()
+            self.assertEqual(set(container.get_states()), states)
+        self.assertRaises(AssertionError, container.redo)
+
+        container.undo()
+        container.add_states({'5': 'e'})
+        self.assertRaises(AssertionError, container.redo)
+        container.undo()
+        container.undo()
+        self.assertEqual(container.read_state('2'), 'd')
+        self.check_digest()
+
+    def test_undo_size(self):
+        container = self.container
+        size = state_container.kUndoSize
+        state_container.kUndoSize = 3
+        try:
+            container.add_states({'1': 'a', '2': 'a'})
+            container.add_states({'3': 'b'})
+            # the oldest operation is dropped above the size
+            container.transit(('1', '2'), 'a', 'c')
+            # the last operation is kept even above the size
+            container.add_states({str(i): 'd' for i in range(4, 9)})
+        finally:
+            state_container.kUndoSize = size
+        container.undo()
+        self.assertEqual(container.count_states(), {'b': 1, 'c': 2})
+        self.assertRaises(AssertionError, container.undo)
+        self.check_digest()
+
+    def test_refresh_view(self):
+        container = self.container
+        container.add_states({'1': 'a', '2': 'b'})
+        seq = container.change_sequence()
+        view = dict(container.get_states(states=('a', )))
+        container.transit(('2', ), 'b', 'a')
+        container.rename_state('a', 'c')
+        container.add_states({'3': 'a'})
+        patched = dict()
+        seq, changed = container.refresh_view(view,
+                                              seq,
+                                              states=('a', ),
+                                              patched=patched)
+        self.assertTrue(changed)
+        self.assertEqual(seq, container.change_sequence())
+        self.assertEqual(view, {'3': 'a'})
+        self.assertEqual(patched, {'1': ('a', None), '3': (None, 'a')})
+        self.assertEqual(container.refresh_view(view, seq), (seq, False))
+
+    def test_stale_changes(self):
+        container = self.container
+        container.add_states({'1': 'a', '2': 'a'})
+        seq = container.change_sequence()
+        view = dict(container.get_states())
+        # the original states were consulted before another window changed the names
+        container._write_changes(
+            (('1', 'x', 'b'), ('2', 'x', 'a'), ('3', 'x', 'c')),
+            action='transit')
+        patched = dict()
+        container.refresh_view(view, seq, patched=patched)
+        self.assertEqual(patched, {'1': ('a', 'b'), '3': (None, 'c')})
+        self.assertEqual(view, {'1': 'b', '2': 'a', '3': 'c'})
+        container.undo()
+        self.assertEqual(sorted(container.get_states()), [('1', 'a'),
+                                                          ('2', 'a')])
+        self.check_digest()
+
+    def test_merge(self):
+        path_other = os.path.join(DIR_OTHER, 'states.db')
+        state_container.StateContainer(path_other).add_states({
+            '1': 'a',
+            '2': 'c',
+            '3': 'c'
+        })
+        self.container.add_states({'1': 'a', '2': 'b', '4': 'b'})
+        result = self.container.merge(path_other)
+        self.assertEqual(result['conflicts'], (('2', 'b', 'c'), ))
+        self.assertEqual(result['added'], 1)
+        result = self.container.merge(path_other,
+                                      policy='theirs',
+                                      remove_missing=True)
+        self.assertEqual((result['changed'], result['removed']), (1, 1))
+        self.assertEqual(self.container.digest(),
+                         state_container.read_digest(path_other))
+        self.container.undo()
+        # the report changed nothing
+        self.assertEqual(sorted(self.container.get_states()), [('1', 'a'),
+                                                               ('2', 'b'),
+                                                               ('4', 'b')])
+
+    def test_suggest(self):
+        container = self.container
+        container.add_states({
+            'issue 12': 'a',
+            'Issue-13': 'b',
+            'task 7': 'a',
+            'issue12x': 'a'
+        })
+        container.remove(('issue12x', ))
+        result = container.suggest(('Issue-12', 'isue 13', 'zzz', 'task 7'))
+        self.assertEqual(result['Issue-12'][0], ('issue 12', 'a', 1.0))
+        self.assertEqual(result['isue 13'][0][:2], ('Issue-13', 'b'))
+        self.assertEqual(result['zzz'], tuple())
+        self.assertNotIn('task 7', (n for n, _, _ in result['task 7']))
+        self.assertNotIn('issue12x',
+                         (n for r in result.values() for n, _, _ in r))
+        container.undo()
+        self.assertEqual(
+            container.suggest(('issue-12x', ))['issue-12x'][0],
+            ('issue12x', 'a', 1.0))
+
+    def test_attributes(self):
+        container = self.container
+        container.define_attribute('owner', 'text')
+        container.define_attribute('priority', 'integer')
+        container.define_attribute('due', 'date')
+        container.define_attribute('owner', 'text')
+        self.assertRaises(AssertionError, container.define_attribute, 'owner',
+                          'integer')
+        self.assertRaises(AssertionError, container.define_attribute, 'and',
+                          'text')
+        container.add_states({
+            '1': 'a',
+            '2': 'a',
+            '3': 'b'
+        },
+                             attributes={
+                                 'owner': 'anna',
+                                 'priority': 1
+                             })
+        self.assertRaises(AssertionError,
+                          container.add_states, {'4': 'a'},
+                          attributes={'priority': 'high'})
+        self.assertRaises(AssertionError,
+                          container.add_states, {'4': 'a'},
+                          attributes={'due': '2021-02-30'})
+        self.assertRaises(AssertionError,
+                          container.add_states, {'4': 'a'},
+                          attributes={'size': 1})
+        self.assertIsNone(container.read_state('4'))
+        container.transit(('2', '3'),
+                          'a',
+                          'c',
+                          forced=True,
+                          attributes={
+                              'owner': 'thomas',
+                              'due': '2021-03-31'
+                          })
+        container.set_attributes(('3', ), {'priority': 3, 'due': None})
+        self.assertRaises(AssertionError, container.set_attributes,
+                          ('3', '5'), {'priority': 1})
+        self.assertEqual(
+            container.get_attributes(('1', '3', '5')), {
+                '1': {
+                    'owner': 'anna',
+                    'priority': 1
+                },
+                '3': {
+                    'owner': 'thomas',
+                    'priority': 3
+                }
+            })
+
+        self.assertEqual(
+            sorted(container.get_states(where=('owner', '=', 'thomas'))),
+            [('2', 'c'), ('3', 'c')])
+        self.assertEqual(
+            sorted(
+                container.get_states(where=('or', ('and', ('owner', '=',
+                                                           'thomas'),
+                                                   ('priority', '>=', 2)),
+                                            ('owner', '=', 'anna')))),
+            [('1', 'a'), ('3', 'c')])
+        self.assertEqual(
+            container.get_states(where=['due', 'in', ['2021-03-31']]),
+            (('2', 'c'), ))
+        self.assertEqual(
+            container.get_states(names=('3', ),
+                                 states=('a', ),
+                                 where=('priority', '<', 3)), (('1', 'a'), ))
+        self.assertEqual(
+            container.get_states(where=('owner', '!=', 'nobody'),
+                                 after_name='1',
+                                 limit=1), (('2', 'c'), ))
+        self.assertEqual(container.get_states(where=('owner', '=', 'nobody')),
+                         tuple())
+        self.assertEqual(
+            tuple(container.iter_states(page_size=1,
+                                        where=('priority', '>', 0))),
+            (('1', 'a'), ('2', 'c'), ('3', 'c')))
+        self.assertEqual(
+            container.filter_states(where=('owner', '=', 'anna')),
+            ((('1', 'a'), ), {'a': 1}))
+        self.assertRaises(AssertionError, container.get_states,
+                          where=('priority', '>', '1'))
+        self.assertRaises(AssertionError, container.get_states,
+                          where=('size', '=', 1))
+
+        # the attributes are removed with the names and all changes are undone
+        container.remove(('1', ))
+        self.assertEqual(container.get_attributes(('1', )), dict())
+        container.undo()
+        self.assertEqual(container.get_attributes(('1', ))['1']['owner'],
+                         'anna')
+        container.undo()
+        self.assertEqual(container.get_attributes(('3', ))['3'], {
+            'owner': 'thomas',
+            'priority': 1,
+            'due': '2021-03-31'
+        })
+        container.undo()
+        self.assertEqual(
+            sorted(container.get_states(where=('owner', '=', 'anna'))),
+            [('1', 'a'), ('2', 'a'), ('3', 'b')])
+        container.redo()
+        self.assertEqual(
+            container.get_attributes(('2', ))['2']['due'], '2021-03-31')
+        container.undo()
+        container.undo()
+        self.assertEqual(container.get_attributes(('1', '2', '3')), dict())
+
+    def test_item_sets(self):
+        container = self.container
+        container.add_states({str(i): 'ab'[i % 2] for i in range(1, 7)})
+        self.assertEqual(container.save_set('week', ('1', '2', '3', 'x', '2')),
+                         4)
+        self.assertEqual(container.save_set('late', ('3', '4')), 2)
+        self.assertEqual(container.get_sets(), {'late': 2, 'week': 4})
+        self.assertEqual(
+            container.combine_sets('both', 'intersection', ('week', 'late')),
+            1)
+        self.assertEqual(container.read_set('both'), ('3', ))
+        self.assertEqual(
+            container.combine_sets('week', 'union', ('week', 'late')), 5)
+        self.assertEqual(
+            container.combine_sets('rest', 'difference',
+                                   ('week', 'late', 'both')), 3)
+        self.assertEqual(container.read_set('rest'), ('1', '2', 'x'))
+        self.assertRaises(AssertionError, container.combine_sets, 'rest',
+                          'xor', ('week', 'late'))
+        self.assertRaises(AssertionError, container.combine_sets, 'rest',
+                          'union', ('week', 'none'))
+        self.assertRaises(AssertionError, container.read_set, 'none')
+        self.assertEqual(container.read_set('rest'), ('1', '2', 'x'))
+
+        self.assertEqual(sorted(container.get_states(item_set='rest')),
+                         [('1', 'b'), ('2', 'a')])
+        self.assertEqual(
+            sorted(container.get_states(states=('b', ), item_set='week')),
+            [('1', 'b'), ('3', 'b')])
+        self.assertEqual(
+            tuple(container.iter_states(item_set='week', page_size=2)),
+            (('1', 'b'), ('2', 'a'), ('3', 'b'), ('4', 'a')))
+        self.assertEqual(
+            container.filter_states(item_set='week')[1], {'a': 2, 'b': 2})
+        container.define_attribute('owner', 'text')
+        container.set_attributes(('2', '5'), {'owner': 'anna'})
+        self.assertEqual(
+            container.get_states(where=('owner', '=', 'anna'),
+                                 item_set='rest'), (('2', 'a'), ))
+        self.assertRaises(AssertionError, container.get_states,
+                          item_set='none')
+
+        container.transit(container.read_set('both'), 'b', 'c')
+        self.assertEqual(container.read_state('3'), 'c')
+        with self.assertRaises(AssertionError):
+            with container.transaction():
+                container.save_set('late', ('5', ))
+                container.delete_set('rest')
+                container.remove(('x', ))
+        self.assertEqual(container.read_set('late'), ('3', '4'))
+        container.delete_set('rest')
+        self.assertEqual(tuple(container.get_sets()), ('both', 'late', 'week'))
+        # the sets are not logged
+        self.assertEqual(
+            set(action['action'] for action in self.get_actions()),
+            {'add', 'define_attribute', 'set_attributes', 'transit', 'remove'})
+
+    def test_chunked(self):
+        container = self.container
+        names = tuple(str(i) for i in range(25))
+        container.run_chunked('add', {'content': {n: 'a' for n in names}},
+                              chunk_size=10)
+        self.assertEqual(container.count_states(), {'a': 25})
+        self.assertEqual(container.get_unfinished_chunked(), tuple())
+        container.undo()
+        self.assertEqual(container.count_states(), dict())
+        container.redo()
+        self.assertRaises(AssertionError, container.run_chunked, 'remove',
+                          {'names': ('1', 'x')})
+        self.assertRaises(AssertionError, container.run_chunked, 'rename',
+                          {'names': ('1', )})
+        self.assertEqual(container.count_states(), {'a': 25})
+
+        # the process dies in the second chunk
+        def crash(operation):
+            calls = []
+
+            def run(**kwargs):
+                calls.append(kwargs)
+                assert len(calls) < 2, 'crash'
+                return operation(**kwargs)
+
+            return run
+
+        container.transit = crash(container.transit)
+        self.assertRaises(AssertionError,
+                          container.run_chunked,
+                          'transit', {
+                              'names': names,
+                              'from_state': 'a',
+                              'to_state': 'b'
+                          },
+                          chunk_size=10)
+        del container.transit
+        unfinished, = container.get_unfinished_chunked()
+        self.assertEqual((unfinished['operation'], unfinished['done'],
+                          unfinished['total']), ('transit', 10, 25))
+        self.assertEqual(container.count_states(), {'a': 15, 'b': 10})
+        container.resume_chunked()
+        self.assertEqual(container.count_states(), {'b': 25})
+        self.assertEqual(container.get_unfinished_chunked(), tuple())
+        self.check_digest()
+        container.undo()
+        self.assertEqual(container.count_states(), {'a': 25})
+
+        # a stopped operation keeps its chunks and is replayed until there
+        container.remove = lambda **kwargs: self.fail('crash')
+        self.assertRaises(AssertionError,
+                          container.run_chunked,
+                          'remove', {'names': names},
+                          chunk_size=10)
+        del container.remove
+        unfinished, = container.get_unfinished_chunked()
+        container.resume_chunked(unfinished['chunked_id'])
+        self.assertEqual(container.count_states(), dict())
+        container.add_states({n: 'a' for n in names})
+        container.remove = crash(container.remove)
+        self.assertRaises(AssertionError,
+                          container.run_chunked,
+                          'remove', {'names': names},
+                          chunk_size=10)
+        del container.remove
+        unfinished, = container.get_unfinished_chunked()
+        container.cancel_chunked(unfinished['chunked_id'])
+        self.assertEqual(container.get_unfinished_chunked(), tuple())
+        self.assertEqual(container.count_states(), {'a': 15})
+        self.assertRaises(AssertionError, container.resume_chunked,
+                          unfinished['chunked_id'])
+
+        replay = state_container.StateContainer(
+            os.path.join(DIR_OTHER, 'states.db'))
+        replay._replay_actions(self.get_actions())
+        self.assertEqual(sorted(replay.get_states()),
+                         sorted(container.get_states()))
+
+    def test_replay(self):
+        container = self.container
+        container.add_states({str(i): 'a' for i in range(20)})
+        container.transit(('1', '2'), 'a', 'b')
+        self.assertRaises(AssertionError, container.transit, ('1', '3'), 'a',
+                          'b')
+        container.rename_state('b', 'c')
+        container.define_attribute('owner', 'text')
+        container.define_attribute('cost', 'real')
+        container.set_attributes(('4', '5'), {'owner': 'anna', 'cost': 2})
+        container.transit(('5', '6'),
+                          'a',
+                          'b',
+                          attributes={'owner': 'thomas'})
+        container.add_states({'20': 'd'}, attributes={'cost': 0.5})
+        container.remove(('4', ))
+        container.undo()
+        container.redo()
+        container.undo()
+        replay = state_container.StateContainer(
+            os.path.join(DIR_OTHER, 'states.db'))
+        replay._replay_actions(self.get_actions())
+        self.assertEqual(replay.digest(), container.digest())
+        self.assertEqual(sorted(replay.get_states()),
+                         sorted(container.get_states()))
+        names = tuple(n for n, _ in container.get_states())
+        self.assertEqual(replay.get_attributes(names),
+                         container.get_attributes(names))
+        self.assertEqual(container.get_attributes(('4', '20')), {
+            '4': {
+                'owner': 'anna',
+                'cost': 2.0
+            },
+            '20': {
+                'cost': 0.5
+            }
+        })
+
+
+class TestStateContainer(Conformance, unittest.TestCase):
+    def open(self):
+        return state_container.StateContainer(
+            os.path.join(DIR_PROJ, 'states.db'))
+
+
+    def test_attribute_index(self):
+        self.container.define_attribute('owner', 'text')
+        command, parameters = self.container._select_where(
+            ('or', ('owner', '=', 'anna'), ('owner', 'in', ('thomas', ))))
+        plan = ' '.join(row[-1] for row in self.container._conn.execute(
+            f'EXPLAIN QUERY PLAN {command};', parameters))
+        self.assertIn(f'{state_container.kTableAttributes}_value', plan)
+        self.assertNotIn('SCAN', plan.replace('SCAN json_each', ''))
+
+    def test_set_index(self):
+        self.container.save_set('week', ('1', '2'))
+        command, parameters = self.container._select_matched(None, 'week')
+        plan = ' '.join(row[-1] for row in self.container._conn.execute(
+            f'EXPLAIN QUERY PLAN SELECT name FROM {state_container.kTable} '
+            f'WHERE name IN ({command});', parameters))
+        self.assertIn(f'SEARCH {state_container.kTableSetNames}', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_fuzzy_migration(self):
+        self.container.add_states({'issue 12': 'a'})
+        for table in (state_container.kTableTrigramCounts,
+                      state_container.kTableTrigrams,
+                      state_container.kTableFuzzyKeys):
+            self.container._conn.execute(f'DROP TABLE {table};')
+        container = self.open()
+        self.assertEqual(
+            tuple(n for n, _, _ in container.suggest(
+                ('issue-13', ))['issue-13']), ('issue 12', ))
+
+
+class TestJournalContainer(Conformance, unittest.TestCase):
+    def open(self):
+        return state_container.StateContainer(os.path.join(
+            DIR_PROJ, 'states.db'),
+                                              journal='flush')
+
+    def tearDown(self):
+        self.container.close()
+        super().tearDown()
+
+
+class TestShardedContainer(Conformance, unittest.TestCase):
+    def open(self):
+        return sharded_container.ShardedContainer(os.path.join(
+            DIR_PROJ, 'states.db'),
+                                                  shards=3)
+
+    def tearDown(self):
+        self.container.close()
+        super().tearDown()
+
+
+class TestMemoryContainer(Conformance, unittest.TestCase):
+    def open(self):
+        return memory_container.MemoryContainer()
+
+    def get_actions(self) -> list:
+        return self.container.get_actions()
+
+    def test_no_files(self):
+        self.container.add_states({'1': 'a'})
+        self.assertEqual(os.listdir(DIR_PROJ), [])
+        self.assertEqual(self.container.archive_logs(), 0)
+
+    def test_order(self):
+        names = tuple(f'{i:03d}' for i in range(250))
+        self.container.add_states({n: 'a' for n in names[::-1]})
+        self.assertEqual(tuple(n for n, _ in self.container.get_states()),
+                         names)
+
+    def test_snapshot(self):
+        path = os.path.join(DIR_PROJ, 'states.db')
+        project = state_container.StateContainer(path)
+        project.add_states({'1': 'a', '2': 'b', '3': 'c'})
+        container = self.container
+        container.load(path)
+        self.assertEqual(container.digest(), project.digest())
+        self.assertEqual(container.change_sequence(), 0)
+        self.assertRaises(AssertionError, container.undo)
+        container.transit(('1', ), 'a', 'b')
+        container.remove(('3', ))
+        container.add_states({'4': 'd'})
+        self.assertEqual(project.read_state('1'), 'a')
+
+        self.assertEqual(container.snapshot(path), {
+            'added': 1,
+            'changed': 1,
+            'removed': 1
+        })
+        self.assertEqual(project.digest(), container.digest())
+        project.undo()
+        self.assertEqual(sorted(project.get_states()), [('1', 'a'),
+                                                        ('2', 'b'),
+                                                        ('3', 'c')])
+
+        path_new = os.path.join(DIR_OTHER, 'new', 'states.db')
+        os.makedirs(os.path.dirname(path_new))
+        container.snapshot(path_new)
+        self.assertEqual(state_container.read_digest(path_new),
+                         container.digest())
+
+
+if __name__ == '__main__':
+    unittest.main()
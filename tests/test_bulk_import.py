@@ -0,0 +1,159 @@
+import unittest
+import sys
+import shutil
+import os
+import csv
+import json
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import bulk_import
+
+DIR_IMPORT = os.path.join(DIR_BASE, 'tests', 'import')
+
+
+def clean():
+    if os.path.isdir(DIR_IMPORT):
+        shutil.rmtree(DIR_IMPORT)
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_IMPORT)
+        self.container = state_container.StateContainer(
+            os.path.join(DIR_IMPORT, 'states.db'))
+        self.container.add_states({'issue1': 'done', 'issue2': 'init'})
+
+    def tearDown(self):
+        del self.container
+        clean()
+
+    def write(self, filename: str, text: str) -> str:
+        path = os.path.join(DIR_IMPORT, filename)
+        with open(path, 'w') as fs:
+            fs.write(text)
+        return path
+
+    def test_readers(self):
+        pairs = tuple((f'issue{i}', f'state{i % 3}') for i in range(1000))
+        path_csv = self.write(
+            'in.csv', 'name,state\n' + ''.join(f'{n},{s}\n'
+                                               for n, s in pairs))
+        path_json = self.write(
+            'in.json',
+            json.dumps(
+                {
+                    'states': [{
+                        'name': n,
+                        'state': s
+                    } for n, s in pairs],
+                    'count_names': len(pairs)
+                },
+                indent=' '))
+        path_ndjson = self.write(
+            'in.ndjson', ''.join(
+                json.dumps({
+                    'name': n,
+                    'state': s
+                }) + '\n' for n, s in pairs))
+        size = bulk_import.kReadSize
+        bulk_import.kReadSize = 100
+        try:
+            self.assertEqual(tuple(bulk_import.read_pairs(path_csv)), pairs)
+            self.assertEqual(tuple(bulk_import.read_pairs(path_json)), pairs)
+            self.assertEqual(tuple(bulk_import.read_pairs(path_ndjson)),
+                             pairs)
+        finally:
+            bulk_import.kReadSize = size
+
+    def test_conflicts(self):
+        path = self.write(
+            'in.csv', 'issue1,done\nissue2,done\nissue3,init\n'
+            'issue4,init\nissue3,failed\n"issue,5",init\n')
+        result = bulk_import.import_file(self.container, path, chunk_size=2)
+        self.assertEqual(result['imported'], 4)
+        self.assertEqual(result['conflicts'], 2)
+        self.assertEqual(
+            self.container.consult(
+                ('issue1', 'issue2', 'issue3', 'issue4', 'issue,5')),
+            ('done', 'init', 'init', 'init', 'init'))
+        with open(result['report'], 'r', newline='') as fs:
+            self.assertEqual(
+                tuple((r['name'], r['reason']) for r in csv.DictReader(fs)),
+                (('issue2', 'exists'), ('issue3', 'repeated')))
+
+        # a name repeated in the same chunk or across chunks is reported alike
+        path = self.write('in.csv', 'issue6,init\nissue7,init\nissue6,done\n')
+        for chunk_size in (2, 3):
+            result = bulk_import.import_file(self.container,
+                                             path,
+                                             chunk_size=chunk_size)
+            with open(result['report'], 'r', newline='') as fs:
+                self.assertEqual(
+                    tuple((r['name'], r['reason'])
+                          for r in csv.DictReader(fs)),
+                    (('issue6', 'repeated'), ))
+            self.container.remove(('issue6', 'issue7'))
+
+    def test_atomic(self):
+        path = self.write('in.csv',
+                          'issue3,init\nissue4,init\nissue3,failed\n')
+        result = bulk_import.import_file(self.container,
+                                         path,
+                                         atomic=True,
+                                         chunk_size=2)
+        self.assertEqual(result['imported'], 0)
+        self.assertEqual(result['conflicts'], 1)
+        self.assertEqual(self.container.consult(('issue3', 'issue4')),
+                         (None, None))
+
+        path = self.write('in.csv', 'issue1,done\nissue3,init\nissue4,init\n')
+        result = bulk_import.import_file(self.container,
+                                         path,
+                                         atomic=True,
+                                         chunk_size=2)
+        self.assertEqual(result['imported'], 3)
+        self.assertIsNone(result['report'])
+        self.assertEqual(self.container.consult(('issue3', 'issue4')),
+                         ('init', 'init'))
+
+        # one undo reverts all chunks
+        self.container.undo()
+        self.assertEqual(self.container.consult(('issue3', 'issue4')),
+                         (None, None))
+
+    def test_atomic_failure(self):
+        path = self.write('in.csv',
+                          ''.join(f'issue{i},init\n' for i in range(3, 9)))
+        add_states = self.container.add_states
+        calls = []
+
+        def fail(content: dict):
+            calls.append(content)
+            if len(calls) == 3:
+                raise IOError('disk full')
+            add_states(content)
+
+        self.container.add_states = fail
+        with self.assertRaises(IOError):
+            bulk_import.import_file(self.container,
+                                    path,
+                                    atomic=True,
+                                    chunk_size=2)
+        del self.container.add_states
+        self.assertEqual(len(self.container.get_states()), 2)
+
+        # the logs of the chunks are not replayed
+        os.makedirs(os.path.join(DIR_IMPORT, 'replay'))
+        container_replay = state_container.StateContainer(
+            os.path.join(DIR_IMPORT, 'replay', 'states.db'))
+        container_replay.replay(source=os.path.join(DIR_IMPORT, 'logs'))
+        self.assertEqual(set(container_replay.get_states()),
+                         set(self.container.get_states()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+import sys
+import shutil
+import sqlite3
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import db_maintenance
+
+DIR_ORIGINAL = os.path.join(DIR_BASE, 'tests', 'original')
+PATH_DB = os.path.join(DIR_ORIGINAL, 'states.db')
+
+
+def clean():
+    if os.path.isdir(DIR_ORIGINAL):
+        shutil.rmtree(DIR_ORIGINAL)
+
+
+class TestDbMaintenance(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_ORIGINAL)
+
+    def tearDown(self):
+        clean()
+
+    def fill(self) -> state_container.StateContainer:
+        container = state_container.StateContainer(PATH_DB)
+        container.add_states({f'item {i}': 'abc'[i % 3] for i in range(6000)})
+        container.add_states({f'other {i}': 'c' for i in range(100)})
+        container.remove(tuple(f'item {i}' for i in range(0, 6000, 2)))
+        # frees whole pages
+        container.add_states({f'temp {i}': 'd' for i in range(2000)})
+        container.remove(tuple(f'temp {i}' for i in range(2000)))
+        return container
+
+    def test_report(self):
+        self.fill().close()
+        report = db_maintenance.health_report(PATH_DB)
+        self.assertEqual(report['auto_vacuum'], 'incremental')
+        self.assertEqual(report['size'],
+                         report['page_size'] * report['page_count'])
+        self.assertGreater(report['free_pages'], 0)
+        self.assertEqual(report['largest_states'],
+                         (('c', 1100), ('a', 1000), ('b', 1000)))
+        self.assertIsNone(report['last_maintenance'])
+        indexes = {index['index']: index for index in report['indexes']}
+        self.assertEqual(indexes['items_state']['table'],
+                         state_container.kTableItems)
+        if report['pages'] is not None:
+            self.assertGreaterEqual(report['fragmentation'], 0.0)
+            self.assertLessEqual(report['fragmentation'], 1.0)
+            self.assertGreater(indexes['items_state']['pages'], 1)
+        self.assertIn('largest states:\n  c: 1100',
+                      db_maintenance.format_report(report))
+
+    def test_maintain(self):
+        container = self.fill()
+        free_pages = db_maintenance.health_report(PATH_DB)['free_pages']
+        # runs beside the open connection of the project
+        run = db_maintenance.maintain(PATH_DB, check='full', vacuum_pages=10)
+        self.assertTrue(run['analyzed'])
+        # ANALYZE may take free pages for its statistics
+        self.assertGreater(run['vacuumed'], 0)
+        self.assertLessEqual(run['vacuumed'], free_pages)
+        self.assertEqual(run['integrity'], 'ok')
+
+        report = db_maintenance.health_report(PATH_DB)
+        self.assertEqual(report['free_pages'], 0)
+        self.assertEqual(report['last_maintenance'], run)
+        index = next(index for index in report['indexes']
+                     if index['index'] == 'items_state')
+        # estimated, ANALYZE reads a limited number of rows
+        self.assertAlmostEqual(index['rows'], 3100, delta=310)
+        self.assertGreater(index['rows_per_key'], 1)
+
+        # the project is still usable
+        container.transit(('other 0', ), 'c', 'a')
+        self.assertEqual(container.get_states(('other 0', )),
+                         (('other 0', 'a'), ))
+        container.close()
+
+    def test_vacuum_steps(self):
+        self.fill().close()
+        conn = sqlite3.connect(PATH_DB)
+        conn.execute('CREATE TABLE dummy (value blob);')
+        conn.executemany('INSERT INTO dummy VALUES (?);',
+                         ((bytes(1000), ) for _ in range(400)))
+        conn.commit()
+        conn.execute('DROP TABLE dummy;')
+        conn.commit()
+        free_pages = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+        conn.close()
+        self.assertGreater(free_pages, 100)
+
+        # each step frees vacuum_pages pages in one transaction
+        steps = []
+        connect = db_maintenance._connect
+
+        def trace(path: str, read_only: bool = False):
+            conn = connect(path, read_only=read_only)
+            conn.set_trace_callback(lambda sql: steps.append(sql) if
+                                    'incremental_vacuum' in sql else None)
+            return conn
+
+        db_maintenance._connect = trace
+        try:
+            run = db_maintenance.maintain(PATH_DB, vacuum_pages=10)
+        finally:
+            db_maintenance._connect = connect
+        self.assertGreater(run['vacuumed'], free_pages - 2)
+        self.assertEqual(len(steps), (run['vacuumed'] + 9) // 10)
+
+    def test_old_database(self):
+        # created without auto_vacuum, as by older versions
+        conn = sqlite3.connect(PATH_DB)
+        conn.execute('CREATE TABLE dummy (value text);')
+        conn.commit()
+        conn.close()
+        self.fill().close()
+        self.assertEqual(db_maintenance.health_report(PATH_DB)['auto_vacuum'],
+                         'none')
+
+        run = db_maintenance.maintain(PATH_DB)
+        self.assertEqual(run['vacuumed'], 0)
+        free_pages = db_maintenance.health_report(PATH_DB)['free_pages']
+        self.assertGreater(free_pages, 0)
+
+        run = db_maintenance.maintain(PATH_DB, full_vacuum=True)
+        self.assertEqual(run['vacuumed'], free_pages)
+        report = db_maintenance.health_report(PATH_DB)
+        self.assertEqual(report['auto_vacuum'], 'incremental')
+        self.assertEqual(report['free_pages'], 0)
+        self.assertEqual(
+            len(state_container.StateContainer(PATH_DB).get_states()), 3100)
+
+    def test_maintainer(self):
+        container = self.fill()
+        maintainer = db_maintenance.Maintainer(PATH_DB,
+                                               interval=3600,
+                                               idle=0.2,
+                                               poll=0.05)
+        maintainer.start()
+        self.assertTrue(maintainer.finished.wait(10))
+        self.assertIsNone(maintainer.error)
+        self.assertEqual(maintainer.result['integrity'], 'ok')
+        self.assertEqual(db_maintenance.health_report(PATH_DB)['free_pages'],
+                         0)
+
+        # not due again until requested
+        first = maintainer.result
+        container.remove(('other 0', ))
+        maintainer.finished.clear()
+        self.assertFalse(maintainer.finished.wait(1))
+        self.assertIs(maintainer.result, first)
+        maintainer.request()
+        self.assertTrue(maintainer.finished.wait(10))
+        self.assertIsNot(maintainer.result, first)
+        maintainer.stop()
+        container.close()
+
+    def test_main(self):
+        self.fill().close()
+        self.assertEqual(db_maintenance.main([PATH_DB, '--maintain']), 0)
+        self.assertIsNotNone(
+            db_maintenance.health_report(PATH_DB)['last_maintenance'])
+
+
+if __name__ == '__main__':
+    unittest.main()
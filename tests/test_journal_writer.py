@@ -0,0 +1,152 @@
+import unittest
+import sys
+import shutil
+import json
+import time
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import journal_writer
+import log_archive
+
+DIR_ORIGINAL = os.path.join(DIR_BASE, 'tests', 'original')
+DIR_REPLAY = os.path.join(DIR_BASE, 'tests', 'replay')
+
+
+def clean():
+    for path in (DIR_ORIGINAL, DIR_REPLAY):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class TestJournalWriter(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_ORIGINAL)
+        os.makedirs(DIR_REPLAY)
+        self.dir_log = os.path.join(DIR_ORIGINAL, 'logs')
+
+    def tearDown(self):
+        clean()
+
+    def open(self, path: str, journal: str):
+        return state_container.StateContainer(os.path.join(path, 'states.db'),
+                                              journal=journal)
+
+    def test_journal(self):
+        container = self.open(DIR_ORIGINAL, 'fsync')
+        container.add_states({'1': 'a', '2': 'a'})
+        container.transit(('1', ), 'a', 'b')
+        with self.assertRaises(AssertionError):
+            with container.transaction():
+                container.add_states({'3': 'a'})
+                container.transit(('2', ), 'b', 'c')
+        container.rename_state('a', 'd')
+
+        # the logs of committed actions are written, all in one file
+        self.assertEqual(os.listdir(self.dir_log),
+                         [os.path.basename(log_archive.get_journals(
+                             self.dir_log)[0])])
+        actions = tuple(a for _, a in log_archive.read_actions(self.dir_log))
+        self.assertEqual(
+            tuple((a['action'], a.get('doable', True)) for a in actions),
+            (('add', True), ('transit', True), ('add', False),
+             ('transit', False), ('rename', True)))
+        self.assertTrue(actions[2]['rolled_back'])
+
+        for logs in (None, log_archive.get_journals(self.dir_log)):
+            replay = state_container.StateContainer(
+                os.path.join(DIR_REPLAY, f'{logs is None}.db'))
+            if logs is None:
+                replay.replay(source=self.dir_log)
+            else:
+                replay.replay(logs)
+            self.assertEqual(replay.digest(), container.digest())
+        container.close()
+        container.close()
+
+    def test_async(self):
+        container = self.open(DIR_ORIGINAL, 'async')
+        for i in range(300):
+            container.add_states({str(i): 'a'})
+        container.close()
+        timestamps = tuple(t for t, _ in log_archive.read_actions(
+            self.dir_log))
+        self.assertEqual(len(timestamps), 300)
+        self.assertEqual(timestamps, tuple(sorted(set(timestamps))))
+
+    def test_archive(self):
+        container = self.open(DIR_ORIGINAL, 'flush')
+        container.add_states({'1': 'a'})
+        container.add_states({'2': 'a'})
+        self.assertEqual(container.archive_logs(), 2)
+        self.assertEqual(log_archive.get_journals(self.dir_log), [])
+        container.transit(('1', '2'), 'a', 'b')
+        self.assertEqual(len(log_archive.get_journals(self.dir_log)), 1)
+        self.assertEqual(
+            tuple(a['action']
+                  for _, a in log_archive.read_actions(self.dir_log)),
+            ('add', 'add', 'transit'))
+
+        # a line cut by a crash while writing is skipped
+        path = log_archive.get_journals(self.dir_log)[0]
+        with open(path, 'a') as fs:
+            fs.write('{"time":"9999-01-01T00-00-00.000000","act')
+        self.assertEqual(len(log_archive.read_journal(path)), 1)
+        container.close()
+
+    def test_archive_split(self):
+        os.makedirs(self.dir_log)
+        writer = journal_writer.JournalWriter(self.dir_log)
+        writer.append({'action': 'a'})
+        writer.flush()
+        time.sleep(0.001)
+        loose = journal_writer._next_timestamp(None)
+        with open(os.path.join(self.dir_log, loose + log_archive.kLogExtension),
+                  'w') as fs:
+            json.dump({'action': 'b'}, fs)
+        time.sleep(0.001)
+        last = writer.append({'action': 'c'})
+        writer.flush()
+        path = log_archive.get_journals(self.dir_log)[0]
+        with open(path, 'r') as fs:
+            copy = fs.read()
+
+        def read():
+            return tuple(
+                a['action'] for _, a in log_archive.read_actions(self.dir_log))
+
+        # the journal is split by before, nothing after its first action is archived
+        self.assertEqual(log_archive.archive_logs(self.dir_log, before=last),
+                         0)
+        self.assertEqual(read(), ('a', 'b', 'c'))
+        self.assertEqual(log_archive.archive_logs(self.dir_log), 3)
+        self.assertEqual(read(), ('a', 'b', 'c'))
+
+        # the journal is left by an interrupted archiving and continued
+        with open(path, 'w') as fs:
+            fs.write(copy)
+        writer.append({'action': 'd'})
+        writer.close()
+        self.assertEqual(read(), ('a', 'b', 'c', 'd'))
+        self.assertEqual(log_archive.archive_logs(self.dir_log), 1)
+        self.assertEqual(read(), ('a', 'b', 'c', 'd'))
+        self.assertEqual(log_archive.get_journals(self.dir_log), [])
+
+    def test_error(self):
+        writer = journal_writer.JournalWriter(os.path.join(
+            DIR_ORIGINAL, 'missing'),
+                                              queue_size=1)
+        for i in range(3):
+            writer.append({'action': 'add', 'content': {str(i): 'a'}})
+        self.assertRaises(OSError, writer.flush)
+        self.assertRaises(OSError, writer.close)
+        self.assertRaises(AssertionError, journal_writer.JournalWriter,
+                          DIR_ORIGINAL, 'never')
+
+
+if __name__ == '__main__':
+    unittest.main()
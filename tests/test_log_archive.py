@@ -0,0 +1,78 @@
+import unittest
+import sys
+import shutil
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import log_archive
+
+DIR_ORIGINAL = os.path.join(DIR_BASE, 'tests', 'proj')
+DIR_REPLAY = os.path.join(DIR_BASE, 'tests', 'copy')
+
+
+def clean():
+    for path in (DIR_ORIGINAL, DIR_REPLAY):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class TestLogArchive(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_ORIGINAL)
+        os.makedirs(DIR_REPLAY)
+        self.dir_log = os.path.join(DIR_ORIGINAL, 'logs')
+        self.block_size = log_archive.kBlockSize
+        log_archive.kBlockSize = 2
+
+    def tearDown(self):
+        log_archive.kBlockSize = self.block_size
+        clean()
+
+    def test(self):
+        container = state_container.StateContainer(
+            os.path.join(DIR_ORIGINAL, 'states.db'))
+        for i in range(5):
+            container.add_states({str(i): 'a'})
+        logs = log_archive.get_loose_logs(self.dir_log)
+        self.assertEqual(len(logs), 5)
+        middle = log_archive.get_log_timestamp(logs[2])
+
+        # archive the older logs, then the rest
+        self.assertEqual(container.archive_logs(before=middle), 2)
+        self.assertEqual(len(log_archive.get_loose_logs(self.dir_log)), 3)
+        container.add_states({'5': 'a'})
+        self.assertEqual(container.archive_logs(), 4)
+        self.assertEqual(log_archive.get_loose_logs(self.dir_log), [])
+        self.assertEqual(len(log_archive.read_index(self.dir_log)), 3)
+        container.transit(('0', '1'), from_state='a', to_state='b')
+
+        actions = tuple(log_archive.read_actions(self.dir_log))
+        self.assertEqual(len(actions), 7)
+        self.assertEqual(tuple(t for t, _ in actions),
+                         tuple(sorted(t for t, _ in actions)))
+
+        # replay a range only
+        container_replay = state_container.StateContainer(
+            os.path.join(DIR_REPLAY, 'states.db'))
+        container_replay.replay(source=self.dir_log,
+                                since=middle,
+                                until=actions[-2][0])
+        self.assertEqual(set(n for n, _ in container_replay.get_states()),
+                         set(('2', '3', '4', '5')))
+
+        # replay everything
+        shutil.rmtree(DIR_REPLAY)
+        os.makedirs(DIR_REPLAY)
+        container_replay = state_container.StateContainer(
+            os.path.join(DIR_REPLAY, 'states.db'))
+        container_replay.replay(source=self.dir_log)
+        self.assertEqual(set(container_replay.get_states()),
+                         set(container.get_states()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import shutil
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+
+DIR_ORIGINAL = os.path.join(DIR_BASE, 'tests', 'proj')
+DIR_OFFLINE = os.path.join(DIR_BASE, 'tests', 'offline')
+DIR_REPLAY = os.path.join(DIR_BASE, 'tests', 'copy')
+
+
+def clean():
+    for path in (DIR_ORIGINAL, DIR_OFFLINE, DIR_REPLAY):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        clean()
+        for path in (DIR_ORIGINAL, DIR_OFFLINE, DIR_REPLAY):
+            os.makedirs(path)
+        self.container = state_container.StateContainer(
+            os.path.join(DIR_ORIGINAL, 'states.db'))
+        self.container.add_states({'1': 'a', '2': 'a', '3': 'a'})
+        self.path_offline = os.path.join(DIR_OFFLINE, 'states.db')
+        offline = state_container.StateContainer(self.path_offline)
+        offline.add_states({'1': 'a', '2': 'b', '4': 'c'})
+
+    def tearDown(self):
+        del self.container
+        clean()
+
+    def test_policies(self):
+        # nothing is changed for report
+        result = self.container.merge(self.path_offline, policy='report')
+        self.assertEqual(result['added'], 1)
+        self.assertEqual(result['changed'], 0)
+        self.assertEqual(result['conflicts'], (('2', 'a', 'b'), ))
+        self.assertEqual(self.container.consult(('1', '2', '3', '4')),
+                         ('a', 'a', 'a', None))
+
+        result = self.container.merge(self.path_offline, policy='ours')
+        self.assertEqual((result['added'], result['changed']), (1, 0))
+        self.assertEqual(result['conflicts'], (('2', 'a', 'b'), ))
+        self.assertEqual(self.container.consult(('1', '2', '3', '4')),
+                         ('a', 'a', 'a', 'c'))
+        result = self.container.merge(self.path_offline, policy='ours')
+        self.assertEqual((result['added'], result['changed']), (0, 0))
+        self.assertEqual(self.container.consult(('1', '2', '3', '4')),
+                         ('a', 'a', 'a', 'c'))
+
+        result = self.container.merge(self.path_offline,
+                                      policy='theirs',
+                                      remove_missing=True)
+        self.assertEqual((result['changed'], result['removed']), (1, 1))
+        self.assertEqual(self.container.consult(('1', '2', '3', '4')),
+                         ('a', 'b', None, 'c'))
+
+    def test_transaction(self):
+        # merged in a transaction with other operations, it is undone with them
+        with self.container.transaction(undo_group='merge'):
+            self.container.add_states({'5': 'a'})
+            self.container.merge(self.path_offline, policy='theirs')
+            self.container.merge(self.path_offline, policy='theirs')
+        self.assertEqual(self.container.consult(('2', '4', '5')),
+                         ('b', 'c', 'a'))
+        self.container.undo()
+        self.assertEqual(self.container.consult(('2', '4', '5')),
+                         ('a', None, None))
+
+        # the other database is detached after a rollback too
+        with self.assertRaises(AssertionError):
+            with self.container.transaction():
+                self.container.merge(self.path_offline, policy='theirs')
+                self.container.add_states({'1': 'x'})
+        self.assertEqual(self.container.consult(('2', '4')), ('a', None))
+        self.container.merge(self.path_offline, policy='theirs')
+        self.assertEqual(self.container.consult(('2', '4')), ('b', 'c'))
+
+    def test_replay(self):
+        self.container.merge(self.path_offline,
+                             policy='theirs',
+                             remove_missing=True)
+        self.container.transit(('4', ), from_state='c', to_state='d')
+
+        dir_log = os.path.join(DIR_ORIGINAL, 'logs')
+        logs = sorted(
+            [os.path.join(dir_log, fn) for fn in os.listdir(dir_log)])
+        container_replay = state_container.StateContainer(
+            os.path.join(DIR_REPLAY, 'states.db'))
+        container_replay.replay(logs)
+        self.assertEqual(set(container_replay.get_states()),
+                         set(self.container.get_states()))
+
+
+if __name__ == '__main__':
+    unittest.main()
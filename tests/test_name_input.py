@@ -0,0 +1,53 @@
+import unittest
+import sys
+import shutil
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import name_input
+
+DIR_INPUT = os.path.join(DIR_BASE, 'tests', 'input')
+
+
+def clean():
+    if os.path.isdir(DIR_INPUT):
+        shutil.rmtree(DIR_INPUT)
+
+
+class TestNameInput(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_INPUT)
+
+    def tearDown(self):
+        clean()
+
+    def test_read_text(self):
+        self.assertEqual(name_input.read_text('a, b,,c\n\nb\n a ,d\n'),
+                         ('a', 'b', 'c', 'd'))
+        self.assertEqual(name_input.read_text('"x, y",z\n"say ""hi"""'),
+                         ('x, y', 'z', 'say "hi"'))
+        self.assertEqual(name_input.read_text('\n'), tuple())
+
+    def test_read_file(self):
+        path = os.path.join(DIR_INPUT, 'names.txt')
+        names = tuple(f'issue{i}' for i in range(10000)) + ('a,b', )
+        with open(path, 'w') as fs:
+            for name in names + names:
+                fs.write(name_input.quote(name) + '\n')
+        self.assertEqual(name_input.read_file(path), names)
+
+    def test_preview(self):
+        names = ('a', 'b,c', ' d', 'e')
+        self.assertEqual(name_input.preview(names), 'a,"b,c"," d",e')
+        self.assertEqual(name_input.read_text(name_input.preview(names)),
+                         names[:2] + ('d', 'e'))
+        self.assertEqual(name_input.preview(names, size=2),
+                         'a,"b,c",... (2 more)')
+        self.assertEqual(name_input.preview(tuple()), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
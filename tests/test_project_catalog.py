@@ -0,0 +1,70 @@
+import unittest
+import sys
+import shutil
+import os
+import datetime
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import project_catalog
+
+DIR_PROJECTS = os.path.join(DIR_BASE, 'tests', 'projects')
+PATH_CATALOG = os.path.join(DIR_PROJECTS, 'catalog.db')
+
+
+def clean():
+    if os.path.isdir(DIR_PROJECTS):
+        shutil.rmtree(DIR_PROJECTS)
+
+
+class TestProjectCatalog(unittest.TestCase):
+    def setUp(self):
+        clean()
+        for name in ('alpha', 'beta'):
+            os.makedirs(os.path.join(DIR_PROJECTS, name))
+
+    def tearDown(self):
+        clean()
+
+    def test(self):
+        alpha = state_container.StateContainer(os.path.join(
+            DIR_PROJECTS, 'alpha', 'states.db'),
+                                               catalog=PATH_CATALOG)
+        alpha.add_states({'1': 'a', '2': 'a', '3': 'b'})
+        alpha.transit(('3', ), from_state='b', to_state='a')
+        alpha.remove(('1', ))
+        self.assertEqual(alpha.count_states(), {'a': 2})
+        beta = state_container.StateContainer(os.path.join(
+            DIR_PROJECTS, 'beta', 'states.db'),
+                                              catalog=PATH_CATALOG)
+        beta.add_states({'1': 'a', '2': 'b', '3': 'c'})
+
+        catalog = project_catalog.ProjectCatalog(PATH_CATALOG)
+        projects = catalog.get_projects(order='items')
+        self.assertEqual(tuple(p['name'] for p in projects),
+                         ('beta', 'alpha'))
+        self.assertEqual(projects[1]['items'], 2)
+        self.assertEqual(projects[1]['states'], {'a': 2})
+        self.assertEqual(projects[0]['count_states'], 3)
+        self.assertEqual(
+            tuple(p['name'] for p in catalog.get_projects(search='ET')),
+            ('beta', ))
+
+        # the activity comes from the files of the project
+        os.utime(os.path.join(DIR_PROJECTS, 'alpha', 'states.db'), (0, 0))
+        os.utime(os.path.join(DIR_PROJECTS, 'alpha', 'logs'), (0, 0))
+        alpha.update_catalog()
+        self.assertEqual(
+            tuple(p['name'] for p in catalog.get_projects(order='activity')),
+            ('beta', 'alpha'))
+        self.assertEqual(
+            catalog.get_projects(search='alpha')[0]['last_activity'],
+            str(datetime.datetime.fromtimestamp(0)))
+        catalog.forget(('beta', ))
+        self.assertEqual(catalog.get_names(), ('alpha', ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import sys
+import shutil
+import os
+import io
+import contextlib
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import project_diff
+
+DIR_OLD = os.path.join(DIR_BASE, 'tests', 'old')
+DIR_NEW = os.path.join(DIR_BASE, 'tests', 'new')
+
+
+def clean():
+    for path in (DIR_OLD, DIR_NEW):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+class TestProjectDiff(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_OLD)
+        os.makedirs(DIR_NEW)
+        self.path_old = os.path.join(DIR_OLD, 'states.db')
+        self.path_new = os.path.join(DIR_NEW, 'states.db')
+        old = state_container.StateContainer(self.path_old)
+        old.add_states({'1': 'a', '2': 'a', '3': 'b', '5': 'c'})
+        new = state_container.StateContainer(self.path_new)
+        new.add_states({'2': 'a', '3': 'c', '4': 'a', '5': 'c', '6': 'd'})
+
+    def tearDown(self):
+        clean()
+
+    def test_diff(self):
+        self.assertEqual(
+            tuple(project_diff.diff(self.path_old, self.path_new)),
+            (('removed', '1', 'a', None), ('changed', '3', 'b', 'c'),
+             ('added', '4', None, 'a'), ('added', '6', None, 'd')))
+        self.assertEqual(
+            project_diff.count_deltas(self.path_old, self.path_new), {
+                'b': -1,
+                'c': 1,
+                'd': 1
+            })
+        self.assertEqual(
+            tuple(project_diff.diff(self.path_old, self.path_old)), ())
+
+    def test_cli(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = project_diff.main([self.path_old, self.path_new])
+        self.assertEqual(code, 1)
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            ['-\t1\ta', '~\t3\tb\tc', '+\t4\ta', '+\t6\td', '#\tb\t-1',
+             '#\tc\t+1', '#\td\t+1'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(
+                project_diff.main([self.path_old, self.path_old]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
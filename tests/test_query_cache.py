@@ -0,0 +1,83 @@
+import unittest
+import sys
+import shutil
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import query_cache
+
+DIR_PROJ = os.path.join(DIR_BASE, 'tests', 'proj')
+
+
+def clean():
+    if os.path.isdir(DIR_PROJ):
+        shutil.rmtree(DIR_PROJ)
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_PROJ)
+        self.path = os.path.join(DIR_PROJ, 'states.db')
+
+    def tearDown(self):
+        clean()
+
+    def test_cache(self):
+        self.assertEqual(query_cache.normalize(('b', 'a', 'b'), []),
+                         (('a', 'b'), None))
+        cache = query_cache.QueryCache(max_size=100)
+        cache.put('a', 1, 'result a', 50)
+        cache.put('b', 1, 'result b', 40)
+        self.assertEqual(cache.get('a', 1), 'result a')
+        self.assertIsNone(cache.get('b', 2))
+        self.assertIsNone(cache.get('b', 1))
+        cache.put('b', 1, 'result b', 40)
+        cache.put('c', 1, 'result c', 40)
+        cache.put('d', 1, 'result d', 200)
+        self.assertIsNone(cache.get('a', 1))
+        self.assertEqual(cache.get('c', 1), 'result c')
+        self.assertEqual(
+            cache.get_stats(), {
+                'hits': 2,
+                'misses': 3,
+                'invalidations': 1,
+                'evictions': 1,
+                'hit_rate': 0.4,
+                'entries': 2,
+                'size': 80,
+            })
+
+    def test_container(self):
+        container = state_container.StateContainer(self.path)
+        container.add_states({'1': 'a', '2': 'a', '3': 'b'})
+        pairs, counts = container.filter_states(names=('3', ),
+                                                states=('a', ))
+        self.assertEqual(sorted(pairs), [('1', 'a'), ('2', 'a'), ('3', 'b')])
+        self.assertEqual(counts, {'a': 2, 'b': 1})
+        self.assertIs(
+            container.filter_states(names=['3', '3'], states=('a', ))[0],
+            pairs)
+        self.assertEqual(container.get_cache_stats()['hits'], 1)
+
+        # changes of this and of another connection invalidate the results
+        container.transit(('3', ), 'b', 'a')
+        self.assertEqual(container.filter_states(states=('a', ))[1], {'a': 3})
+        other = state_container.StateContainer(self.path)
+        other.remove(('1', ))
+        self.assertEqual(container.filter_states(states=('a', ))[1], {'a': 2})
+        self.assertEqual(container.filter_states(states=('a', ))[1], {'a': 2})
+        with container.transaction():
+            container.remove(('2', ))
+            self.assertEqual(container.filter_states(states=('a', ))[1],
+                             {'a': 1})
+        self.assertEqual(container.filter_states(states=('a', ))[1], {'a': 1})
+        stats = container.get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -50,6 +50,7 @@ class TestReplay(unittest.TestCase):
         container_replay.replay(logs)
 
         self.assertEqual(container_replay.get_states(), container.get_states())
+        self.assertEqual(container_replay.digest(), container.digest())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+import unittest
+import sys
+import shutil
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import sharded_container
+
+DIR_SHARDED = os.path.join(DIR_BASE, 'tests', 'proj')
+DIR_SINGLE = os.path.join(DIR_BASE, 'tests', 'copy')
+
+
+def clean():
+    for path in (DIR_SHARDED, DIR_SINGLE):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+def run(container, path_other: str):
+    container.add_states({str(i): 'a' for i in range(100)})
+    container.add_states({'1': 'b', '200': 'b'}, forced=True)
+    container.transit(tuple(str(i) for i in range(10, 30)),
+                      from_state='a',
+                      to_state='c')
+    container.transit(('1', '10'), from_state='-', to_state='d', forced=True)
+    container.remove(tuple(str(i) for i in range(50, 60)))
+    container.rename_state('c', 'e')
+    container.rename_state('e', 'a')
+    container.undo()
+    container.undo()
+    container.redo()
+    container.merge(path_other, policy='theirs')
+    with container.transaction():
+        container.transit(('0', ), from_state='a', to_state='f')
+        container.remove(('2', ))
+
+
+class TestShardedContainer(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_SHARDED)
+        os.makedirs(DIR_SINGLE)
+        self.path_other = os.path.join(DIR_SINGLE, 'other', 'states.db')
+        os.makedirs(os.path.dirname(self.path_other))
+        state_container.StateContainer(self.path_other).add_states({
+            '3': 'g',
+            '300': 'g'
+        })
+
+    def tearDown(self):
+        clean()
+
+    def test(self):
+        sharded = sharded_container.ShardedContainer(os.path.join(
+            DIR_SHARDED, 'states.db'),
+                                                     shards=4)
+        single = state_container.StateContainer(
+            os.path.join(DIR_SINGLE, 'states.db'))
+        view = dict(sharded.get_states(states=('a', )))
+        seq = 0
+        run(sharded, self.path_other)
+        run(single, self.path_other)
+        self.assertFalse(
+            os.path.isdir(os.path.join(DIR_SHARDED, 'shards', 'logs')))
+        self.assertEqual(sharded.digest(), single.digest())
+        self.assertEqual(sharded.compute_digest(), single.digest())
+        self.assertEqual(sharded.count_states(), single.count_states())
+        self.assertEqual(sorted(sharded.get_states()),
+                         sorted(single.get_states()))
+        self.assertEqual(sharded.get_states(states=('b', 'd')),
+                         single.get_states(states=('b', 'd')))
+        self.assertEqual(sorted(sharded.get_states(names=('1', '2', '-'))),
+                         sorted(single.get_states(names=('1', '2', '-'))))
+        self.assertEqual(tuple(sharded.iter_states(page_size=7)),
+                         tuple(single.iter_states()))
+        names = ('0', '1', '55', '-')
+        self.assertEqual(sharded.consult(names), single.consult(names))
+        self.assertEqual(sharded.read_state('1'), 'd')
+        self.assertEqual(sharded.select_for_transition(names, 'f'),
+                         (('0', ), ('1', '55', '-')))
+        _, changed = sharded.refresh_view(view, seq, states=('a', ))
+        self.assertTrue(changed)
+        self.assertEqual(view, dict(single.get_states(states=('a', ))))
+
+        # wrong actions change nothing, a failing shard rolls back all of them
+        digest = sharded.digest()
+        with self.assertRaises(AssertionError):
+            sharded.transit(('0', '1'), from_state='a', to_state='x')
+        with self.assertRaises(AssertionError):
+            sharded.add_states({'0': 'x', '300': 'x'})
+
+        def fail(*_):
+            raise IOError('disk full')
+
+        sharded._shards[1]._write_changes = fail
+        with self.assertRaises(IOError):
+            sharded.add_states({str(i): 'x' for i in range(1000, 1100)})
+        del sharded._shards[1]._write_changes
+        self.assertEqual(sharded.digest(), digest)
+        self.assertEqual(sharded.compute_digest(), digest)
+
+        # one log per action, for both kinds of containers
+        path_replay = os.path.join(DIR_SINGLE, 'replay', 'states.db')
+        os.makedirs(os.path.dirname(path_replay))
+        replay = state_container.StateContainer(path_replay)
+        replay.replay(source=os.path.join(DIR_SHARDED, 'logs'))
+        self.assertEqual(replay.digest(), digest)
+        path_replay = os.path.join(DIR_SHARDED, 'replay', 'states.db')
+        os.makedirs(os.path.dirname(path_replay))
+        replay = sharded_container.ShardedContainer(path_replay, shards=3)
+        replay.replay(source=os.path.join(DIR_SINGLE, 'logs'))
+        self.assertEqual(replay.digest(), single.digest())
+        replay.close()
+        replay.close()
+
+        # the number of shards is kept
+        sharded.close()
+        reader = sharded_container.ShardedContainer(os.path.join(
+            DIR_SHARDED, 'states.db'),
+                                                    read_only=True,
+                                                    shards=2)
+        self.assertEqual(reader.digest(), digest)
+        self.assertEqual(len(reader._shards), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,17 +10,20 @@ sys.path.append(DIR_BASE)
 import state_container
 
 FILE = 'transitions.db'
+FILE_OTHER = 'transitions_other.db'
 
 
 class TestTransitions(unittest.TestCase):
     def setUp(self):
         os.chdir(os.path.join(DIR_BASE, 'tests'))
-        if os.path.isfile(FILE):
-            os.remove(FILE)
+        for path in (FILE, FILE_OTHER):
+            if os.path.isfile(path):
+                os.remove(path)
 
     def tearDown(self):
-        if os.path.isfile(FILE):
-            os.remove(FILE)
+        for path in (FILE, FILE_OTHER):
+            if os.path.isfile(path):
+                os.remove(path)
         if os.path.isdir('logs'):
             shutil.rmtree('logs')
 
@@ -183,6 +186,249 @@ class TestTransitions(unittest.TestCase):
             target.consult(['issue1', 'issue2', 'issue3', 'issue4', 'issue5']),
             (None, None, None, None, None))
 
+    def test_digest(self):
+        target = state_container.StateContainer(FILE)
+        other = state_container.StateContainer(FILE_OTHER)
+        self.assertEqual(target.digest(), other.digest())
+
+        target.add_states({'issue1': 'init', 'issue2': 'init'})
+        target.add_states({'issue3': 'done'})
+        other.add_states({'issue3': 'init', 'issue2': 'init'})
+        self.assertNotEqual(target.digest(), other.digest())
+        other.transit(('issue3', ), from_state='init', to_state='done')
+        other.add_states({'issue1': 'init', 'issue4': 'init'})
+        other.remove(('issue4', ))
+        self.assertEqual(target.digest(), other.digest())
+        self.assertEqual(target.digest(), target.compute_digest())
+        self.assertEqual(state_container.read_digest(FILE_OTHER),
+                         target.digest())
+
+        # the same names in other states
+        other.transit(('issue1', 'issue3'),
+                      from_state='*',
+                      to_state='swap',
+                      forced=True)
+        target.transit(('issue1', 'issue3'),
+                       from_state='*',
+                       to_state='swap',
+                       forced=True)
+        self.assertEqual(target.digest(), other.digest())
+        target.transit(('issue3', ), from_state='swap', to_state='init')
+        target.transit(('issue2', ), from_state='init', to_state='swap')
+        self.assertNotEqual(target.digest(), other.digest())
+        self.assertEqual(other.digest(), other.compute_digest())
+
+    def test_pages(self):
+        target = state_container.StateContainer(FILE)
+        content = {f'issue{i:03d}': f'state{i % 3}' for i in range(100)}
+        target.add_states(content)
+
+        self.assertEqual(target.get_states(limit=2),
+                         (('issue000', 'state0'), ('issue001', 'state1')))
+        self.assertEqual(target.get_states(after_name='issue097'),
+                         (('issue098', 'state2'), ('issue099', 'state0')))
+        self.assertEqual(
+            target.get_states(states=('state1', ),
+                              names=('issue000', ),
+                              after_name='issue000',
+                              limit=2),
+            (('issue001', 'state1'), ('issue004', 'state1')))
+        self.assertEqual(tuple(target.iter_states(page_size=7)),
+                         tuple(sorted(content.items())))
+        self.assertEqual(
+            tuple(target.iter_states(states=('state2', ), page_size=3)),
+            tuple((n, s) for n, s in sorted(content.items())
+                  if s == 'state2'))
+        self.assertEqual(tuple(target.iter_states(after_name='issue099')),
+                         ())
+
+    def test_rename(self):
+        target = state_container.StateContainer(FILE)
+        target.add_states({'issue1': 'todo', 'issue2': 'todo'})
+        target.add_states({'issue3': 'done'})
+        target.rename_state('todo', 'todo week2')
+        self.assertEqual(target.consult(['issue1', 'issue2', 'issue3']),
+                         ('todo week2', 'todo week2', 'done'))
+        self.assertEqual(target.count_states(), {
+            'todo week2': 2,
+            'done': 1
+        })
+        self.assertEqual(target.digest(), target.compute_digest())
+
+        # renaming to an existing state joins both
+        target.rename_state('done', 'todo week2')
+        self.assertEqual(target.count_states(), {'todo week2': 3})
+        self.assertEqual(target.digest(), target.compute_digest())
+        triggered = False
+        try:
+            target.rename_state('done', 'failed')
+        except Exception:
+            triggered = True
+        self.assertTrue(triggered)
+
+    def test_migration(self):
+        conn = sqlite3.connect(FILE)
+        conn.execute('CREATE TABLE states (name text, state text);')
+        conn.executemany('INSERT INTO states VALUES (?, ?);',
+                         (('issue1', 'done'), ('issue2', 'init'),
+                          ('issue3', 'done')))
+        conn.commit()
+        conn.close()
+
+        target = state_container.StateContainer(FILE)
+        self.assertEqual(target.consult(['issue1', 'issue2', 'issue3']),
+                         ('done', 'init', 'done'))
+        self.assertEqual(target.count_states(), {'done': 2, 'init': 1})
+        self.assertEqual(target.digest(), target.compute_digest())
+        self.assertEqual(set(target.get_states(states=('done', ))),
+                         set((('issue1', 'done'), ('issue3', 'done'))))
+
+    def test_interrupted_migration(self):
+        conn = sqlite3.connect(FILE)
+        conn.execute('CREATE TABLE states (name text, state text);')
+        conn.execute('INSERT INTO states VALUES ("issue1", "done");')
+        conn.commit()
+        conn.close()
+
+        rebuild = state_container.StateContainer._rebuild_stats
+
+        def interrupt(_):
+            raise KeyboardInterrupt()
+
+        state_container.StateContainer._rebuild_stats = interrupt
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                state_container.StateContainer(FILE)
+        finally:
+            state_container.StateContainer._rebuild_stats = rebuild
+
+        target = state_container.StateContainer(FILE)
+        target.add_states({'issue2': 'init'})
+        self.assertEqual(set(target.get_states()),
+                         set((('issue1', 'done'), ('issue2', 'init'))))
+
+    def test_stale_changes(self):
+        window_a = state_container.StateContainer(FILE)
+        window_b = state_container.StateContainer(FILE)
+        window_a.add_states({'x': 'a', 'y': 'a'})
+        window_a.transit(('x', ), from_state='a', to_state='b')
+        # window b consulted x before window a changed it
+        window_b._write_changes((('x', 'a', 'c'), ), action='transit')
+        self.assertEqual(window_a.count_states(), {'a': 1, 'c': 1})
+        self.assertEqual(set(window_a.get_states()),
+                         set((('x', 'c'), ('y', 'a'))))
+        self.assertEqual(window_a.digest(), window_a.compute_digest())
+        window_b.undo()
+        self.assertEqual(window_a.consult(('x', 'y')), ('b', 'a'))
+        self.assertEqual(window_a.digest(), window_a.compute_digest())
+
+    def test_change_log(self):
+        target = state_container.StateContainer(FILE)
+        viewer = state_container.StateContainer(FILE)
+        version = viewer.data_version()
+        seq = viewer.change_sequence()
+        self.assertEqual(viewer.changes_since(seq), (seq, ()))
+
+        target.add_states({'issue1': 'init', 'issue2': 'init'})
+        target.transit(('issue1', ), from_state='init', to_state='done')
+        target.rename_state('init', 'todo')
+        target.remove(('issue1', ))
+        self.assertNotEqual(viewer.data_version(), version)
+        seq, changes = viewer.changes_since(seq)
+        self.assertEqual(changes,
+                         (('issue1', None, 'init'), ('issue2', None, 'init'),
+                          ('issue1', 'init', 'done'), (None, 'init', 'todo'),
+                          ('issue1', 'done', None)))
+        self.assertEqual(seq, viewer.change_sequence())
+        self.assertEqual(viewer.changes_since(seq), (seq, ()))
+
+        # too many changes or changes dropped from the log
+        target.add_states({'issue3': 'init', 'issue4': 'init'})
+        self.assertEqual(viewer.changes_since(seq, limit=1), (seq + 2, None))
+        size = state_container.kChangeLogSize
+        state_container.kChangeLogSize = 1
+        try:
+            target.add_states({'issue5': 'init'})
+        finally:
+            state_container.kChangeLogSize = size
+        self.assertEqual(viewer.changes_since(seq), (seq + 3, None))
+        self.assertEqual(viewer.changes_since(seq + 2),
+                         (seq + 3, (('issue5', None, 'init'), )))
+
+    def test_refresh_view(self):
+        target = state_container.StateContainer(FILE)
+        viewer = state_container.StateContainer(FILE)
+        target.add_states({'issue1': 'init', 'issue2': 'done'})
+
+        views = []
+        for names, states in ((None, None), (('issue3', ), ('init', )),
+                              (None, ('todo', ))):
+            seq = viewer.change_sequence()
+            view = dict(viewer.get_states(names=names, states=states))
+            views.append([view, seq, names, states])
+
+        target.add_states({'issue3': 'done', 'issue4': 'init'})
+        target.transit(('issue1', ), from_state='init', to_state='done')
+        target.rename_state('init', 'todo')
+        target.remove(('issue2', ))
+        for item in views:
+            view, seq, names, states = item
+            original = dict(view)
+            patched = dict()
+            item[1], changed = viewer.refresh_view(view,
+                                                   seq,
+                                                   names,
+                                                   states,
+                                                   patched=patched)
+            self.assertTrue(changed)
+            for name in set(original) | set(view):
+                if original.get(name) != view.get(name):
+                    self.assertEqual(patched.pop(name),
+                                     (original.get(name), view.get(name)))
+            self.assertEqual(patched, dict())
+            self.assertEqual(
+                set(view.items()),
+                set(viewer.get_states(names=names, states=states)))
+            self.assertEqual(viewer.refresh_view(view, item[1], names, states),
+                             (item[1], False))
+
+    def test_read_only(self):
+        target = state_container.StateContainer(FILE)
+        target.add_states({'issue1': 'init', 'issue2': 'done'})
+        shutil.rmtree('logs')
+
+        reader = state_container.StateContainer(FILE,
+                                                read_only=True,
+                                                mmap_size=1 << 20)
+        self.assertFalse(os.path.isdir('logs'))
+        self.assertEqual(reader.consult(['issue1', 'issue2', 'issue3']),
+                         ('init', 'done', None))
+        self.assertEqual(reader.digest(), target.digest())
+        triggered = False
+        try:
+            reader.add_states({'issue3': 'init'})
+        except Exception:
+            triggered = True
+        self.assertTrue(triggered)
+        self.assertEqual(target.consult(['issue3']), (None, ))
+
+        # the writer is not blocked by the reader
+        os.mkdir('logs')
+        version = reader.data_version()
+        self.assertEqual(len(tuple(reader.iter_states(page_size=1))), 2)
+        target.transit(('issue1', ), from_state='init', to_state='done')
+        self.assertNotEqual(reader.data_version(), version)
+        self.assertEqual(reader.count_states(), {'done': 2})
+
+        # the database should be initialized before
+        triggered = False
+        try:
+            state_container.StateContainer(FILE_OTHER, read_only=True)
+        except Exception:
+            triggered = True
+        self.assertTrue(triggered)
+        self.assertFalse(os.path.isfile(FILE_OTHER))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import sys
+import shutil
+import os
+import csv
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+import transition_analytics
+
+DIR_PROJ = os.path.join(DIR_BASE, 'tests', 'proj')
+
+
+def clean():
+    if os.path.isdir(DIR_PROJ):
+        shutil.rmtree(DIR_PROJ)
+
+
+class TestTransitionAnalytics(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_PROJ)
+        self.path = os.path.join(DIR_PROJ, 'states.db')
+
+    def tearDown(self):
+        clean()
+
+    def test(self):
+        container = state_container.StateContainer(self.path)
+        container.add_states({'a': 'todo', 'b': 'todo', 'c': 'todo'})
+        container.transit(('a', 'b'), from_state='todo', to_state='doing')
+        analytics = transition_analytics.TransitionAnalytics(self.path)
+        self.assertEqual(analytics.update(), 2)
+        self.assertEqual(analytics.get_flow(), {
+            ('', 'todo'): 3,
+            ('todo', 'doing'): 2
+        })
+
+        # only the new actions are processed
+        self.assertEqual(analytics.update(), 0)
+        container.rename_state('doing', 'review')
+        container.remove(('c', ))
+        container.archive_logs()
+        container.transit(('a', ), from_state='review', to_state='done')
+        container.undo()
+        self.assertEqual(analytics.update(), 4)
+        self.assertEqual(
+            analytics.get_flow(), {
+                ('', 'todo'): 3,
+                ('todo', 'doing'): 2,
+                ('doing', 'review'): 2,
+                ('todo', ''): 1,
+                ('review', 'done'): 1,
+                ('done', 'review'): 1,
+            })
+
+        # the results are kept in the database
+        analytics = transition_analytics.TransitionAnalytics(self.path)
+        self.assertEqual(analytics.update(), 0)
+        times = analytics.get_time_in_states()
+        self.assertEqual(
+            set(times), {('a', 'todo'), ('a', 'doing'), ('a', 'review'),
+                         ('a', 'done'), ('b', 'todo'), ('b', 'doing'),
+                         ('b', 'review'), ('c', 'todo')})
+        self.assertTrue(all(t >= 0.0 for t in times.values()))
+        self.assertEqual(
+            set(analytics.get_time_in_states(names=('c', )).values()),
+            {times[('c', 'todo')]})
+
+        analytics.export_csv(os.path.join(DIR_PROJ, 'analytics'))
+        with open(os.path.join(DIR_PROJ, 'analytics.flow.csv'), 'r') as fs:
+            rows = tuple(csv.reader(fs))
+        self.assertEqual(rows[0], ['from_state', 'to_state', 'count'])
+        self.assertEqual(len(rows), 7)
+        with open(os.path.join(DIR_PROJ, 'analytics.time.csv'), 'r') as fs:
+            self.assertEqual(len(tuple(csv.reader(fs))), 9)
+
+
+    def test_chunked(self):
+        container = state_container.StateContainer(self.path)
+        names = tuple(str(i) for i in range(10))
+        container.run_chunked('add', {'content': {n: 'todo' for n in names}},
+                              chunk_size=3)
+
+        # the process dies in the second chunk of the transit
+        transit = container.transit
+        calls = []
+
+        def crash(**kwargs):
+            calls.append(kwargs)
+            assert len(calls) < 2, 'crash'
+            return transit(**kwargs)
+
+        container.transit = crash
+        self.assertRaises(AssertionError,
+                          container.run_chunked,
+                          'transit', {
+                              'names': names,
+                              'from_state': 'todo',
+                              'to_state': 'done'
+                          },
+                          chunk_size=3)
+        del container.transit
+        container.remove(('9', ))
+
+        # the following actions wait until the chunked operation is finished
+        analytics = transition_analytics.TransitionAnalytics(self.path)
+        self.assertEqual(analytics.update(), 1)
+        self.assertEqual(analytics.get_flow(), {('', 'todo'): 10})
+        container.cancel_chunked(
+            container.get_unfinished_chunked()[0]['chunked_id'])
+        self.assertEqual(analytics.update(), 3)
+        self.assertEqual(analytics.get_flow(), {
+            ('', 'todo'): 10,
+            ('todo', 'done'): 3,
+            ('todo', ''): 1
+        })
+        self.assertEqual(
+            {n for n, s in analytics.get_time_in_states() if s == 'done'},
+            {'0', '1', '2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import sys
+import shutil
+import os
+
+DIR_BASE = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(DIR_BASE)
+
+import state_container
+
+DIR_ORIGINAL = os.path.join(DIR_BASE, 'tests', 'proj')
+DIR_REPLAY = os.path.join(DIR_BASE, 'tests', 'copy')
+
+
+def clean():
+    for path in (DIR_ORIGINAL, DIR_REPLAY):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+def failed(callback) -> bool:
+    try:
+        callback()
+    except Exception:
+        return True
+    return False
+
+
+class TestUndo(unittest.TestCase):
+    def setUp(self):
+        clean()
+        os.makedirs(DIR_ORIGINAL)
+        os.makedirs(DIR_REPLAY)
+        self.container = state_container.StateContainer(
+            os.path.join(DIR_ORIGINAL, 'states.db'))
+
+    def tearDown(self):
+        del self.container
+        clean()
+
+    def test_undo_redo(self):
+        container = self.container
+        container.add_states({'1': 'a', '2': 'a', '3': 'a'})
+        history = [set(container.get_states())]
+        container.add_states({'3': 'b', '4': 'b'}, forced=True)
+        history.append(set(container.get_states()))
+        container.transit(('3', '4'), from_state='b', to_state='c')
+        history.append(set(container.get_states()))
+        container.rename_state('a', 'd')
+        history.append(set(container.get_states()))
+        container.rename_state('d', 'c')
+        history.append(set(container.get_states()))
+        container.remove(('1', '4'))
+        history.append(set(container.get_states()))
+
+        for states in history[-2::-1]:
+            container.undo()
+            self.assertEqual(set(container.get_states()), states)
+            self.assertEqual(container.digest(), container.compute_digest())
+        container.undo()
+        self.assertEqual(container.get_states(), ())
+        self.assertTrue(failed(container.undo))
+
+        for states in history[:3]:
+            container.redo()
+            self.assertEqual(set(container.get_states()), states)
+        # another operation drops the undone ones
+        container.remove(('1', ))
+        self.assertTrue(failed(container.redo))
+        container.undo()
+        self.assertEqual(set(container.get_states()), history[2])
+
+    def test_replay(self):
+        container = self.container
+        container.add_states({'1': 'a', '2': 'a'})
+        container.transit(('1', ), from_state='a', to_state='b')
+        container.undo()
+        container.redo()
+        container.undo()
+        container.rename_state('a', 'c')
+
+        dir_log = os.path.join(DIR_ORIGINAL, 'logs')
+        logs = sorted(
+            [os.path.join(dir_log, fn) for fn in os.listdir(dir_log)])
+        container_replay = state_container.StateContainer(
+            os.path.join(DIR_REPLAY, 'states.db'))
+        container_replay.replay(logs)
+        self.assertEqual(container_replay.digest(), container.digest())
+        self.assertEqual(set(container_replay.get_states()),
+                         set((('1', 'c'), ('2', 'c'))))
+
+    def test_replay_range(self):
+        container = self.container
+        container.add_states({'x': 'a', 'y': 'a'})
+        container.transit(('x', ), from_state='a', to_state='c')
+        dir_log = os.path.join(DIR_ORIGINAL, 'logs')
+        count = len(os.listdir(dir_log))
+        container.undo()
+
+        # the target has another last operation than the source
+        container_replay = state_container.StateContainer(
+            os.path.join(DIR_REPLAY, 'states.db'))
+        container_replay.add_states({'x': 'c', 'y': 'a'})
+        container_replay.transit(('y', ), from_state='a', to_state='b')
+        logs = sorted(
+            [os.path.join(dir_log, fn) for fn in os.listdir(dir_log)])
+        container_replay.replay(logs[count:])
+        self.assertEqual(set(container_replay.get_states()),
+                         set((('x', 'a'), ('y', 'b'))))
+        self.assertEqual(container_replay.digest(),
+                         container_replay.compute_digest())
+        container_replay.undo()
+        self.assertEqual(set(container_replay.get_states()),
+                         set((('x', 'c'), ('y', 'b'))))
+
+
+    def test_group(self):
+        container = self.container
+        with container.transaction(undo_group='group'):
+            container.add_states({'1': 'a', '2': 'a'})
+            container.transit(('1', ), from_state='a', to_state='b')
+            container.rename_state('b', 'c')
+            container.rename_state('a', 'd')
+        states = set(container.get_states())
+        container.undo()
+        self.assertEqual(container.get_states(), tuple())
+        container.redo()
+        self.assertEqual(set(container.get_states()), states)
+        self.assertEqual(container.digest(), container.compute_digest())
+
+        # the logged undo is replayed in the same order
+        container.undo()
+        container_replay = state_container.StateContainer(
+            os.path.join(DIR_REPLAY, 'states.db'))
+        container_replay.replay(source=os.path.join(DIR_ORIGINAL, 'logs'))
+        self.assertEqual(container_replay.get_states(), tuple())
+
+
+if __name__ == '__main__':
+    unittest.main()
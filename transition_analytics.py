@@ -0,0 +1,309 @@
+import os
+import csv
+import sqlite3
+import datetime
+
+import log_archive
+import state_container
+
+# The name of the table for the count of transitions from one state to another.
+kTableFlow = 'analytics_flow'
+# The name of the table for the seconds each name spent in each state, closed intervals only.
+kTableDwell = 'analytics_dwell'
+# The name of the table for the current state of each name and since when it has it.
+kTableCurrent = 'analytics_current'
+# The name of the table for the checkpoint, the timestamp of the last processed action.
+kTableCheckpoint = 'analytics_checkpoint'
+# The state used in the flow for names which are not available, before add and after remove.
+kNoState = ''
+
+
+def parse_timestamp(timestamp: str) -> datetime.datetime:
+    '''
+    Get the datetime from a timestamp in the names of log files.
+
+    Attributes:
+        timestamp: the timestamp like "2021-01-12T20-01-02.123456".
+    Returns:
+        The datetime.
+    '''
+    for pattern in ('%Y-%m-%dT%H-%M-%S.%f', '%Y-%m-%dT%H-%M-%S'):
+        try:
+            return datetime.datetime.strptime(timestamp, pattern)
+        except ValueError:
+            pass
+    raise ValueError(f'wrong timestamp {timestamp}')
+
+
+class TransitionAnalytics(object):
+    '''
+    The flow between states and the time in states, computed from the logs of one project.
+    The results are stored in the project database and updated incrementally:
+    each update only reads the actions after the last checkpoint.
+
+    Attributes:
+        path: path for the *.db file of the project, the logs are beside it.
+    '''
+    def __init__(self, path: str):
+        '''
+        Constructor, it initilizes the tables when they are not available.
+
+        Attributes:
+            path: path for the *.db file of the project, the logs are beside it.
+        '''
+        self._log_dir = os.path.join(os.path.dirname(os.path.realpath(path)),
+                                     'logs')
+        self._conn = sqlite3.connect(path)
+        cursor = self._conn.cursor()
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {kTableFlow} (from_state text, '
+            'to_state text, count integer, PRIMARY KEY (from_state, to_state));'
+        )
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {kTableDwell} (name text, state text, '
+            'seconds real, PRIMARY KEY (name, state));')
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {kTableCurrent} (name text PRIMARY KEY, '
+            'state text, since text);')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {kTableCurrent}_state ON '
+                       f'{kTableCurrent} (state);')
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {kTableCheckpoint} '
+                       '(id integer PRIMARY KEY, timestamp text);')
+        self._conn.commit()
+
+    def __del__(self):
+        '''
+        Destructor, it just closes the connection.
+        '''
+        if hasattr(self, '_conn'):
+            self._conn.close()
+
+    def get_checkpoint(self) -> str:
+        '''
+        Get the timestamp of the last processed action.
+
+        Returns:
+            The timestamp, None when nothing is processed.
+        '''
+        row = self._conn.cursor().execute(
+            f'SELECT timestamp FROM {kTableCheckpoint} WHERE id=0;').fetchone()
+        return row[0] if row is not None else None
+
+    def _is_unfinished(self, chunked_id: str) -> bool:
+        '''
+        Check whether one chunked operation is still running or interrupted, its end is not logged yet.
+        '''
+        cursor = self._conn.cursor()
+        if cursor.execute(
+                'SELECT count(*) FROM sqlite_master WHERE type="table" AND name=?;',
+            (state_container.kTableCheckpoints, )).fetchone()[0] == 0:
+            return False
+        return cursor.execute(
+            f'SELECT count(*) FROM {state_container.kTableCheckpoints} '
+            'WHERE id=?;', (chunked_id, )).fetchone()[0] > 0
+
+    def _expand_chunked(self, timestamp: str, action: dict) -> dict:
+        '''
+        Get one chunked operation as the operation on all its names, until the item it was stopped at,
+        as in the replay.
+
+        Attributes:
+            timestamp: the time of the chunked operation.
+            action: the logged chunked operation.
+        Returns:
+            The action of the operation.
+        '''
+        operation = action['operation']
+        parameters = action['parameters']
+        # the stop is logged after the chunked operation
+        for _, stop in log_archive.read_actions(self._log_dir, since=timestamp):
+            if stop['action'] == 'stop_chunked' and stop.get(
+                    'doable', True) and stop['chunked_id'] == action['chunked_id']:
+                parameters = state_container._get_chunk(
+                    operation, parameters,
+                    state_container._get_chunked_names(
+                        operation, parameters)[:stop['done']])
+                break
+        return dict(parameters, action=operation)
+
+    def _get_changes(self, action: dict) -> list:
+        '''
+        Get the changes of names by one logged action, compared with the current states here.
+
+        Attributes:
+            action: one logged action.
+        Returns:
+            An array of (name, original state, new state), None for names not available.
+        '''
+        cursor = self._conn.cursor()
+        kind = action['action']
+        if kind == 'add':
+            targets = dict(action['content'])
+        elif kind == 'transit':
+            targets = {name: action['to_state'] for name in action['names']}
+        elif kind == 'remove':
+            targets = {name: None for name in action['names']}
+        elif kind == 'rename':
+            targets = {
+                name: action['to_state']
+                for name, in cursor.execute(
+                    f'SELECT name FROM {kTableCurrent} WHERE state=?;', (
+                        action['from_state'], ))
+            }
+        elif kind in ('merge', 'undo', 'redo'):
+            targets = dict()
+            for name, old_state, state in action['changes']:
+                if name is not None:
+                    targets[name] = state
+                    continue
+                targets.update((n, state) for n, in cursor.execute(
+                    f'SELECT name FROM {kTableCurrent} WHERE state=?;', (
+                        old_state, )) if n not in targets)
+        else:
+            return tuple()
+
+        changes = []
+        for name, state in targets.items():
+            row = cursor.execute(
+                f'SELECT state FROM {kTableCurrent} WHERE name=?;',
+                (name, )).fetchone()
+            old_state = row[0] if row is not None else None
+            if old_state != state and (state is not None or kind != 'transit'):
+                changes.append((name, old_state, state))
+        return changes
+
+    def _apply(self, timestamp: str, changes: list):
+        '''
+        Count the transitions and close the time intervals of the changes at one time.
+
+        Attributes:
+            timestamp: the time of the action.
+            changes: an array of (name, original state, new state).
+        '''
+        cursor = self._conn.cursor()
+        now = parse_timestamp(timestamp)
+        for name, old_state, state in changes:
+            cursor.execute(
+                f'INSERT OR IGNORE INTO {kTableFlow} VALUES (?, ?, 0);',
+                (old_state or kNoState, state or kNoState))
+            cursor.execute(
+                f'UPDATE {kTableFlow} SET count=count+1 '
+                'WHERE from_state=? AND to_state=?;',
+                (old_state or kNoState, state or kNoState))
+            if old_state is not None:
+                since, = cursor.execute(
+                    f'SELECT since FROM {kTableCurrent} WHERE name=?;',
+                    (name, )).fetchone()
+                seconds = (now - parse_timestamp(since)).total_seconds()
+                cursor.execute(
+                    f'INSERT OR IGNORE INTO {kTableDwell} VALUES (?, ?, 0);',
+                    (name, old_state))
+                cursor.execute(
+                    f'UPDATE {kTableDwell} SET seconds=seconds+? '
+                    'WHERE name=? AND state=?;', (seconds, name, old_state))
+            if state is None:
+                cursor.execute(f'DELETE FROM {kTableCurrent} WHERE name=?;',
+                               (name, ))
+            else:
+                cursor.execute(
+                    f'INSERT OR REPLACE INTO {kTableCurrent} VALUES (?, ?, ?);',
+                    (name, state, timestamp))
+
+    def update(self) -> int:
+        '''
+        Process the logged actions after the checkpoint, archived or not, in one transaction.
+        It stops before a chunked operation which is not finished, the following actions are processed after it.
+
+        Returns:
+            The number of processed actions.
+        '''
+        checkpoint = self.get_checkpoint()
+        count = 0
+        # the logs before the checkpoint are skipped by their filenames and by the index of the archive
+        try:
+            for timestamp, action in log_archive.read_actions(
+                    self._log_dir, since=checkpoint):
+                if checkpoint is not None and timestamp <= checkpoint:
+                    continue
+                if action['action'] == 'chunked':
+                    if self._is_unfinished(action['chunked_id']):
+                        break
+                    action = dict(self._expand_chunked(timestamp, action),
+                                  doable=action.get('doable', True))
+                if action.get('doable', True):
+                    self._apply(timestamp, self._get_changes(action))
+                self._conn.cursor().execute(
+                    f'INSERT OR REPLACE INTO {kTableCheckpoint} '
+                    'VALUES (0, ?);', (timestamp, ))
+                count += 1
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+        return count
+
+    def get_flow(self) -> dict:
+        '''
+        Get the count of transitions between states.
+
+        Returns:
+            A dict with (from state, to state) as key and count as value;
+                kNoState stands for not available, before add or after remove.
+        '''
+        return {(f, t): c
+                for f, t, c in self._conn.cursor().execute(
+                    f'SELECT from_state, to_state, count FROM {kTableFlow};')}
+
+    def get_time_in_states(self,
+                           names: list = None,
+                           states: list = None,
+                           until=None) -> dict:
+        '''
+        Get the seconds each name spent in each state, the current states count until the given time.
+
+        Attributes:
+            names: when it is given, only these names are included.
+            states: when it is given, only these states are included.
+            until: datetime or timestamp for the current states, by default the checkpoint.
+        Returns:
+            A dict with (name, state) as key and seconds as value.
+        '''
+        until = log_archive.to_timestamp(until) or self.get_checkpoint()
+        cursor = self._conn.cursor()
+        result = {(n, s): t
+                  for n, s, t in cursor.execute(
+                      f'SELECT name, state, seconds FROM {kTableDwell};')}
+        if until is not None:
+            now = parse_timestamp(until)
+            for name, state, since in cursor.execute(
+                    f'SELECT name, state, since FROM {kTableCurrent};'):
+                seconds = max(
+                    0.0, (now - parse_timestamp(since)).total_seconds())
+                result[(name, state)] = result.get((name, state), 0.0) + seconds
+        names = set(names) if names is not None else None
+        states = set(states) if states is not None else None
+        return {(n, s): t
+                for (n, s), t in result.items()
+                if (names is None or n in names) and (
+                    states is None or s in states)}
+
+    def export_csv(self, filename: str, until=None):
+        '''
+        Export the flow to <filename>.flow.csv and the time in states to <filename>.time.csv.
+
+        Attributes:
+            filename: path and filename without extension.
+            until: datetime or timestamp for the current states, by default the checkpoint.
+        '''
+        with open(filename + '.flow.csv', 'w', newline='') as fs:
+            writer = csv.writer(fs)
+            writer.writerow(('from_state', 'to_state', 'count'))
+            for (from_state, to_state), count in sorted(
+                    self.get_flow().items()):
+                writer.writerow((from_state, to_state, count))
+        with open(filename + '.time.csv', 'w', newline='') as fs:
+            writer = csv.writer(fs)
+            writer.writerow(('name', 'state', 'seconds'))
+            for (name, state), seconds in sorted(
+                    self.get_time_in_states(until=until).items()):
+                writer.writerow((name, state, seconds))